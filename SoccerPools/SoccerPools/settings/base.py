@@ -243,6 +243,15 @@ CACHES = {
     }
 }
 
+# Sorted sets of the live leaderboards, an empty value disables them
+LEADERBOARD_REDIS_URL = 'redis://redis:6379/2'
+
+# API-Football, the url can point to the api_football_standin server for benchmarks
+API_FOOTBALL_URL = config('API_FOOTBALL_URL', default='https://v3.football.api-sports.io')
+# Requests per minute and per day allowed by our plan
+API_FOOTBALL_REQUESTS_PER_MINUTE = config('API_FOOTBALL_REQUESTS_PER_MINUTE', default=300, cast=int)
+API_FOOTBALL_REQUESTS_PER_DAY = config('API_FOOTBALL_REQUESTS_PER_DAY', default=7500, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import aiohttp
+import requests
+from time import monotonic, sleep
+from decouple import config
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .quota import NORMAL_PRIORITY, consume_quota
+
+TIMEZONE = 'America/Argentina/Ushuaia'
+# (connect, read) seconds
+API_FOOTBALL_TIMEOUT = (3.05, 15)
+API_FOOTBALL_POOL_SIZE = 10
+API_FOOTBALL_RETRIES = 3
+API_FOOTBALL_BACKOFF_FACTOR = 0.5
+API_FOOTBALL_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class TokenBucket:
+    """
+        Thread-safe token bucket. acquire blocks until a token is available, tokens are
+        refilled at rate_per_minute and up to capacity can be spent in a burst
+    """
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or max(1, rate_per_minute // 10)
+        self.tokens = self.capacity
+        self.updated_at = monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return the seconds the caller has to wait before using it"""
+        with self.lock:
+            current = monotonic()
+            self.tokens = min(self.capacity, self.tokens + (current - self.updated_at) * self.rate)
+            self.updated_at = current
+            # Tokens can go negative, every waiting caller reserves its own slot
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            sleep(wait)
+
+
+_session = None
+_rate_limiter = None
+_lock = threading.Lock()
+
+def get_session():
+    """
+        Return the process-wide session of API-Football. It keeps the connections alive
+        between requests and retries connection errors with exponential backoff, the
+        429 / 5xx responses are retried by api_football_get so every attempt goes through
+        the quota ledger and the rate limiter
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            retry = Retry(
+                total=API_FOOTBALL_RETRIES,
+                backoff_factor=API_FOOTBALL_BACKOFF_FACTOR,
+                status=0,
+                allowed_methods=('GET',),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=API_FOOTBALL_POOL_SIZE, max_retries=retry
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers['x-apisports-key'] = config('API_FOOTBALL_KEY')
+            _session = session
+    return _session
+
+
+def get_rate_limiter():
+    global _rate_limiter
+    with _lock:
+        if _rate_limiter is None:
+            _rate_limiter = TokenBucket(rate_per_minute=settings.API_FOOTBALL_REQUESTS_PER_MINUTE)
+    return _rate_limiter
+
+
+def api_football_get(path, params=None, priority=NORMAL_PRIORITY):
+    """
+        GET an API-Football endpoint, e.g. api_football_get('fixtures', {'ids': '1-2'}),
+        counting it in the quota ledger and waiting for the rate limiter first. 429 / 5xx
+        responses and rateLimit errors are retried with exponential backoff, or the
+        Retry-After header when there is one, and every attempt is counted and rate limited.
+        Raises QuotaExceeded if the priority has no budget left
+
+        Return:
+        requests.Response
+    """
+    for attempt in range(API_FOOTBALL_RETRIES + 1):
+        consume_quota(priority)
+        get_rate_limiter().acquire()
+        backoff = API_FOOTBALL_BACKOFF_FACTOR * 2 ** attempt
+        is_last_attempt = attempt == API_FOOTBALL_RETRIES
+
+        response = get_session().get(
+            f'{settings.API_FOOTBALL_URL}/{path}', params=params, timeout=API_FOOTBALL_TIMEOUT
+        )
+        if is_last_attempt:
+            return response
+        if response.status_code in API_FOOTBALL_RETRY_STATUSES:
+            retry_after = response.headers.get('Retry-After', '')
+            sleep(int(retry_after) if retry_after.isdigit() else backoff)
+            continue
+        try:
+            response_obj = response.json()
+        except ValueError:
+            return response
+        if is_rate_limited(response_obj):
+            sleep(backoff)
+            continue
+        return response
+
+
+def create_async_session(concurrency):
+    """
+        Return an aiohttp session for api_football_get_async with at most concurrency open
+        connections. It has to be created and closed inside the running event loop
+    """
+    connect_timeout, read_timeout = API_FOOTBALL_TIMEOUT
+    return aiohttp.ClientSession(
+        headers={'x-apisports-key': config('API_FOOTBALL_KEY')},
+        timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+        connector=aiohttp.TCPConnector(limit=concurrency),
+    )
+
+
+def is_rate_limited(response_obj):
+    """API-Football answers a rate limit with a 200 and a rateLimit error in the body"""
+    errors = response_obj.get('errors') if isinstance(response_obj, dict) else None
+    return isinstance(errors, dict) and 'rateLimit' in errors
+
+
+async def api_football_get_async(session, path, params=None, priority=NORMAL_PRIORITY):
+    """
+        Async version of api_football_get. It waits for the same process-wide rate limiter
+        without blocking the event loop, and retries connection errors, 429 / 5xx responses
+        and rateLimit errors with exponential backoff, or the Retry-After header when there
+        is one. Every attempt is counted in the quota ledger
+
+        Return:
+        (status, response_obj)
+    """
+    for attempt in range(API_FOOTBALL_RETRIES + 1):
+        consume_quota(priority)
+        await asyncio.sleep(get_rate_limiter().reserve())
+        backoff = API_FOOTBALL_BACKOFF_FACTOR * 2 ** attempt
+        is_last_attempt = attempt == API_FOOTBALL_RETRIES
+
+        try:
+            async with session.get(f'{settings.API_FOOTBALL_URL}/{path}', params=params) as response:
+                if response.status in API_FOOTBALL_RETRY_STATUSES and not is_last_attempt:
+                    retry_after = response.headers.get('Retry-After', '')
+                    await asyncio.sleep(int(retry_after) if retry_after.isdigit() else backoff)
+                    continue
+                response_obj = await response.json(content_type=None)
+            if is_rate_limited(response_obj) and not is_last_attempt:
+                await asyncio.sleep(backoff)
+                continue
+            return response.status, response_obj
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if is_last_attempt:
+                raise
+            await asyncio.sleep(backoff)
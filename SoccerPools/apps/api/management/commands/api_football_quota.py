@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.api.quota import get_quota_usage
+
+class Command(BaseCommand):
+    """Print the API-Football requests used in the current minute and day by every process"""
+    def handle(self, *args, **options):
+        usage = get_quota_usage()
+
+        self.stdout.write(f'This minute: {usage["minute"]}/{settings.API_FOOTBALL_REQUESTS_PER_MINUTE}')
+        self.stdout.write(f'Today: {usage["day"]}/{settings.API_FOOTBALL_REQUESTS_PER_DAY}')
+        self.stdout.write(f'Deferred today: {usage["deferred"]}')
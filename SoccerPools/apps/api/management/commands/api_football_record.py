@@ -0,0 +1,31 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from apps.api.client import api_football_get
+from apps.api.standin import save_record
+
+class Command(BaseCommand):
+    """
+        Save a real API-Football response to replay it with api_football_standin, e.g.
+        api_football_record fixtures league=128 season=2024
+    """
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Endpoint, e.g. fixtures or fixtures/rounds')
+        parser.add_argument('params', type=str, nargs='*', help='Query params as key=value')
+        parser.add_argument('--records-dir', type=str, default='api_football_records')
+
+    def handle(self, *args, **options):
+        try:
+            params = dict(param.split('=', 1) for param in options.get('params'))
+        except ValueError:
+            raise CommandError('Params must be key=value')
+
+        path = options.get('path')
+        response = api_football_get(path, params=params)
+        response_obj = json.loads(response.text)
+        if response_obj.get('errors'):
+            raise CommandError(f'API-Football errors: {response_obj.get("errors")}')
+
+        n_files = save_record(options.get('records_dir'), path, params, response_obj)
+        self.stdout.write(self.style.SUCCESS(
+            f'{response_obj.get("results")} results of /{path} saved in {n_files} records'
+        ))
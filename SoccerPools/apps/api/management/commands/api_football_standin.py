@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from apps.api.standin import RATE_LIMIT_STATUS, create_standin_server
+
+class Command(BaseCommand):
+    """
+        Serve the responses recorded with api_football_record as a local API-Football.
+        Point API_FOOTBALL_URL to it, e.g. API_FOOTBALL_URL=http://127.0.0.1:8001
+    """
+    def add_arguments(self, parser):
+        parser.add_argument('--records-dir', type=str, default='api_football_records')
+        parser.add_argument('--host', type=str, default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--latency-ms', type=int, default=0, help='Latency added to every request')
+        parser.add_argument('--requests-per-minute', type=int, help='Answer rate limit errors over it')
+        parser.add_argument(
+            '--rate-limit-status', type=int, choices=(200, 429), default=RATE_LIMIT_STATUS,
+            help='Status of the rate limit errors, API-Football answers them with a 200'
+        )
+        parser.add_argument(
+            '--status-step', type=float, help='Seconds between the status transitions of the fixtures'
+        )
+
+    def handle(self, *args, **options):
+        server = create_standin_server(
+            records_dir=options.get('records_dir'),
+            host=options.get('host'),
+            port=options.get('port'),
+            latency=options.get('latency_ms') / 1000,
+            requests_per_minute=options.get('requests_per_minute'),
+            status_step=options.get('status_step'),
+            rate_limit_status=options.get('rate_limit_status'),
+        )
+        host, port = server.server_address
+        self.stdout.write(self.style.SUCCESS(f'API-Football stand-in serving on http://{host}:{port}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
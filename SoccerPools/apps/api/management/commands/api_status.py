@@ -1,13 +1,8 @@
-import requests
-from decouple import config
 from django.core.management.base import BaseCommand
+from apps.api.client import api_football_get
 
 class Command(BaseCommand):
     def handle(self, *args, **options):
-        url = 'https://v3.football.api-sports.io/status'
-        headers = {
-            'x-apisports-key': config('API_FOOTBALL_KEY')
-        }
-        response = requests.get(url, headers=headers)
+        response = api_football_get('status')
 
         print(response.text)
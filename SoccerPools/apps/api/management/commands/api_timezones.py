@@ -1,15 +1,10 @@
-import requests
 import json
-from decouple import config
 from django.core.management.base import BaseCommand
+from apps.api.client import api_football_get
 
 class Command(BaseCommand):
     def handle(self, *args, **options):
-        url = 'https://v3.football.api-sports.io/timezone'
-        headers = {
-            'x-apisports-key': config('API_FOOTBALL_KEY')
-        }
-        response = requests.get(url, headers=headers)
+        response = api_football_get('timezone')
         response_obj = json.loads(response.text)
         print(f'Results: {response_obj.get("results")}')
         timezones = response_obj.get('response')
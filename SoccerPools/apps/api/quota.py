@@ -0,0 +1,89 @@
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache import cache
+
+# Every API-Football request is counted in the default cache (Redis), so the budget is
+# shared by every worker and management command that uses the same key
+LOW_PRIORITY = 0
+NORMAL_PRIORITY = 1
+HIGH_PRIORITY = 2
+# Share of the per-minute and per-day budgets each priority can use. What is left over
+# is kept for the live match finalization
+PRIORITY_BUDGET_SHARE = {
+    LOW_PRIORITY: 0.7,
+    NORMAL_PRIORITY: 0.9,
+    HIGH_PRIORITY: 1,
+}
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def _quota_keys():
+    current = datetime.now(timezone.utc)
+    return (
+        f'api_football:quota:minute:{current:%Y%m%d%H%M}',
+        f'api_football:quota:day:{current:%Y%m%d}',
+        f'api_football:quota:deferred:{current:%Y%m%d}',
+    )
+
+
+def _incr(key, value, timeout):
+    # incr fails on a missing key
+    cache.add(key, 0, timeout=timeout)
+    return cache.incr(key, value)
+
+
+def get_quota_limits(priority):
+    """
+        Return:
+        (per-minute limit, per-day limit) of the priority
+    """
+    share = PRIORITY_BUDGET_SHARE[priority]
+    return (
+        int(settings.API_FOOTBALL_REQUESTS_PER_MINUTE * share),
+        int(settings.API_FOOTBALL_REQUESTS_PER_DAY * share),
+    )
+
+
+def get_quota_usage():
+    """
+        Return:
+        {'minute': int, 'day': int, 'deferred': int} -> Requests used in the current minute
+        and day, and requests deferred today because their priority ran out of budget
+    """
+    minute_key, day_key, deferred_key = _quota_keys()
+    usage = cache.get_many([minute_key, day_key, deferred_key])
+    return {
+        'minute': usage.get(minute_key, 0),
+        'day': usage.get(day_key, 0),
+        'deferred': usage.get(deferred_key, 0),
+    }
+
+
+def has_quota(priority, requests=1):
+    """Whether the priority can still spend the received requests without consuming them"""
+    usage = get_quota_usage()
+    minute_limit, day_limit = get_quota_limits(priority)
+    return usage['minute'] + requests <= minute_limit and usage['day'] + requests <= day_limit
+
+
+def consume_quota(priority=NORMAL_PRIORITY, requests=1):
+    """
+        Count requests in the ledger, or raise QuotaExceeded if the priority already used
+        its share of the per-minute or per-day budget. The requests are counted first and
+        given back when they go over it, so concurrent callers never overspend
+    """
+    minute_key, day_key, deferred_key = _quota_keys()
+    minute_limit, day_limit = get_quota_limits(priority)
+
+    minute_usage = _incr(minute_key, requests, timeout=120)
+    day_usage = _incr(day_key, requests, timeout=60 * 60 * 48)
+    if minute_usage > minute_limit or day_usage > day_limit:
+        cache.decr(minute_key, requests)
+        cache.decr(day_key, requests)
+        _incr(deferred_key, requests, timeout=60 * 60 * 48)
+        raise QuotaExceeded(
+            f'API-Football quota exceeded for priority {priority}: '
+            f'{minute_usage}/{minute_limit} this minute, {day_usage}/{day_limit} today'
+        )
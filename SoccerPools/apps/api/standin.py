@@ -0,0 +1,174 @@
+import copy
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from time import monotonic, sleep
+from urllib.parse import parse_qsl, urlsplit
+
+# Params that do not change the recorded response
+IGNORED_PARAMS = ('timezone',)
+# (short, long) statuses a fixture goes through when the stand-in replays status transitions
+STATUS_TRANSITIONS = (
+    ('NS', 'Not Started'),
+    ('1H', 'First Half'),
+    ('HT', 'Halftime'),
+    ('2H', 'Second Half'),
+    ('FT', 'Match Finished'),
+)
+# Status of the rate limit errors, API-Football answers them with a 200
+RATE_LIMIT_STATUS = 200
+
+def record_path(records_dir, path, params):
+    """
+        File of a recorded response, <records_dir>/<path>/<sorted params>.json, e.g.
+        records/fixtures/league=128&season=2024.json
+    """
+    query = '&'.join(
+        f'{key}={value}' for key, value in sorted(params.items()) if key not in IGNORED_PARAMS
+    )
+    return Path(records_dir) / path.strip('/') / f'{query.replace("/", "_") or "index"}.json'
+
+
+def fixture_record_path(records_dir, fixture_id):
+    return Path(records_dir) / 'fixtures' / 'id' / f'{fixture_id}.json'
+
+
+def save_record(records_dir, path, params, response_obj):
+    """
+        Save an API-Football response to replay it with the stand-in server. The fixtures of
+        /fixtures responses are also saved one by one, so any ids=a-b-c request can be
+        answered from them
+    """
+    files = {record_path(records_dir, path, params): response_obj}
+    if path.strip('/') == 'fixtures':
+        for fixture_response in response_obj.get('response') or []:
+            fixture_id = fixture_response.get('fixture').get('id')
+            files[fixture_record_path(records_dir, fixture_id)] = fixture_response
+
+    for file_path, data in files.items():
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(json.dumps(data))
+    return len(files)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Replays the records of the server, see create_standin_server"""
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.strip('/')
+        params = dict(parse_qsl(url.query))
+        server = self.server
+
+        if server.latency:
+            sleep(server.latency)
+
+        if not server.take_request():
+            # API-Football answers a rate limit with a 200 and the error in the body
+            return self.send_json(server.rate_limit_status, {
+                'errors': {'rateLimit': 'Too many requests. Your rate limit is exceeded.'},
+                'response': [],
+            })
+
+        if path == 'fixtures' and 'ids' in params:
+            fixtures = [
+                server.load(fixture_record_path(server.records_dir, fixture_id))
+                for fixture_id in params['ids'].split('-')
+            ]
+            response_obj = {
+                'errors': [],
+                'results': len([fixture for fixture in fixtures if fixture]),
+                'response': [fixture for fixture in fixtures if fixture],
+            }
+        else:
+            response_obj = server.load(record_path(server.records_dir, path, params))
+            if response_obj is None:
+                return self.send_json(404, {
+                    'errors': {'record': f'No record for /{path} {params}'}, 'response': []
+                })
+
+        if path == 'fixtures':
+            response_obj = server.apply_status_transitions(response_obj)
+        self.send_json(200, response_obj)
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, records_dir, latency=0, requests_per_minute=None, status_step=None,
+        rate_limit_status=RATE_LIMIT_STATUS):
+        super().__init__(address, StandInHandler)
+        self.records_dir = records_dir
+        self.latency = latency
+        self.requests_per_minute = requests_per_minute
+        self.rate_limit_status = rate_limit_status
+        self.status_step = status_step
+        self.started_at = monotonic()
+        self.window_started_at = self.started_at
+        self.window_requests = 0
+        self.lock = threading.Lock()
+
+    def take_request(self):
+        """Count a request in the current minute, False once requests_per_minute is reached"""
+        if not self.requests_per_minute:
+            return True
+        with self.lock:
+            current = monotonic()
+            if current - self.window_started_at >= 60:
+                self.window_started_at = current
+                self.window_requests = 0
+            self.window_requests += 1
+            return self.window_requests <= self.requests_per_minute
+
+    def load(self, file_path):
+        try:
+            return json.loads(Path(file_path).read_text())
+        except FileNotFoundError:
+            return None
+
+    def apply_status_transitions(self, response_obj):
+        """
+            Move every fixture one STATUS_TRANSITIONS step forward each status_step seconds
+            since the server started. The recorded goals are only shown once it is finished
+        """
+        if not self.status_step:
+            return response_obj
+
+        step = min(int((monotonic() - self.started_at) / self.status_step), len(STATUS_TRANSITIONS) - 1)
+        short, long = STATUS_TRANSITIONS[step]
+        response_obj = copy.deepcopy(response_obj)
+        for fixture_response in response_obj.get('response') or []:
+            fixture_response['fixture']['status'] = {'short': short, 'long': long}
+            if short == 'NS':
+                fixture_response['goals'] = {'home': None, 'away': None}
+        return response_obj
+
+
+def create_standin_server(records_dir, host='127.0.0.1', port=8001, latency=0,
+    requests_per_minute=None, status_step=None, rate_limit_status=RATE_LIMIT_STATUS):
+    """
+        Return an HTTP server that answers API-Football requests with the responses saved by
+        save_record. latency is added to every request in seconds, requests over
+        requests_per_minute get a rateLimit error, with a 200 like API-Football or with
+        rate_limit_status, and, when status_step is set, the fixtures go from not started to
+        finished in status_step seconds steps
+    """
+    return StandInServer(
+        (host, port),
+        records_dir=records_dir,
+        latency=latency,
+        requests_per_minute=requests_per_minute,
+        status_step=status_step,
+        rate_limit_status=rate_limit_status,
+    )
@@ -1,3 +1,270 @@
-from django.test import TestCase
+import asyncio
+import tempfile
+import threading
+import requests
+from unittest.mock import Mock, patch
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from apps.api import client
+from apps.api.client import TokenBucket, api_football_get, api_football_get_async, get_session
+from apps.api.quota import (
+    HIGH_PRIORITY, LOW_PRIORITY, NORMAL_PRIORITY, QuotaExceeded, consume_quota, get_quota_usage, has_quota
+)
+from apps.api.standin import create_standin_server, save_record
+from apps.match.api_football import fetch_fixtures
 
-# Create your tests here.
+class TokenBucketTest(SimpleTestCase):
+    @patch('apps.api.client.sleep')
+    @patch('apps.api.client.monotonic')
+    def test_acquire_waits_when_empty(self, mock_monotonic, mock_sleep):
+        """Test that the burst is served right away and the next calls wait for the refill"""
+        mock_monotonic.return_value = 0
+        bucket = TokenBucket(rate_per_minute=60, capacity=2)
+
+        bucket.acquire()
+        bucket.acquire()
+        mock_sleep.assert_not_called()
+
+        bucket.acquire()
+        bucket.acquire()
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [1, 2])
+
+    @patch('apps.api.client.sleep')
+    @patch('apps.api.client.monotonic')
+    def test_acquire_refills(self, mock_monotonic, mock_sleep):
+        mock_monotonic.return_value = 0
+        bucket = TokenBucket(rate_per_minute=60, capacity=1)
+        bucket.acquire()
+
+        mock_monotonic.return_value = 5
+        bucket.acquire()
+
+        mock_sleep.assert_not_called()
+        # The refill is capped to the capacity
+        self.assertEqual(bucket.tokens, 0)
+
+
+@override_settings(API_FOOTBALL_REQUESTS_PER_MINUTE=10, API_FOOTBALL_REQUESTS_PER_DAY=100)
+class QuotaLedgerTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_priorities_budget(self):
+        """Test that low priority work stops first and live finalization can use the whole budget"""
+        for _ in range(7):
+            consume_quota(LOW_PRIORITY)
+
+        self.assertFalse(has_quota(LOW_PRIORITY))
+        with self.assertRaises(QuotaExceeded):
+            consume_quota(LOW_PRIORITY)
+        consume_quota(NORMAL_PRIORITY, requests=2)
+        with self.assertRaises(QuotaExceeded):
+            consume_quota(NORMAL_PRIORITY)
+        consume_quota(HIGH_PRIORITY)
+
+        self.assertEqual(get_quota_usage(), {'minute': 10, 'day': 10, 'deferred': 2})
+        with self.assertRaises(QuotaExceeded):
+            consume_quota(HIGH_PRIORITY)
+
+    def test_day_budget(self):
+        with override_settings(API_FOOTBALL_REQUESTS_PER_DAY=5):
+            consume_quota(HIGH_PRIORITY, requests=5)
+            self.assertFalse(has_quota(HIGH_PRIORITY))
+
+    @patch('apps.api.client.get_rate_limiter')
+    @patch('apps.api.client.get_session')
+    def test_api_football_get_counts_quota(self, mock_get_session, mock_get_rate_limiter):
+        """Test that requests are counted and refused without reaching the API once deferred"""
+        for _ in range(9):
+            api_football_get('status')
+
+        with self.assertRaises(QuotaExceeded):
+            api_football_get('status')
+        self.assertEqual(mock_get_session.return_value.get.call_count, 9)
+        self.assertEqual(get_quota_usage()['minute'], 9)
+
+
+class FakeResponse:
+    def __init__(self, status, headers=None, data=None):
+        self.status = status
+        self.headers = headers or {}
+        self.data = data or {'response': []}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def json(self, content_type):
+        return self.data
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    def get(self, url, params):
+        self.calls.append((url, params))
+        return self.responses.pop(0)
+
+
+class ApiFootballClientTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        client._session = None
+        client._rate_limiter = None
+
+    @patch('apps.api.client.config', return_value='api-key')
+    def test_session_is_shared(self, mock_config):
+        """Test that every call reuses one session that only retries connection errors"""
+        session = get_session()
+
+        self.assertIs(get_session(), session)
+        self.assertEqual(session.headers['x-apisports-key'], 'api-key')
+        adapter = session.get_adapter(settings.API_FOOTBALL_URL)
+        self.assertEqual(adapter.max_retries.total, 3)
+        self.assertFalse(adapter.max_retries.is_retry('GET', 429))
+
+    @patch('apps.api.client.get_rate_limiter')
+    @patch('apps.api.client.get_session')
+    def test_api_football_get(self, mock_get_session, mock_get_rate_limiter):
+        """Test that requests wait for the rate limiter and have a timeout"""
+        api_football_get('fixtures', params={'ids': '1-2'})
+
+        mock_get_rate_limiter.return_value.acquire.assert_called_once()
+        mock_get_session.return_value.get.assert_called_once_with(
+            f'{settings.API_FOOTBALL_URL}/fixtures',
+            params={'ids': '1-2'},
+            timeout=client.API_FOOTBALL_TIMEOUT,
+        )
+
+    @patch('apps.api.client.sleep')
+    @patch('apps.api.client.get_rate_limiter')
+    @patch('apps.api.client.get_session')
+    def test_api_football_get_retries(self, mock_get_session, mock_get_rate_limiter, mock_sleep):
+        """Test that 429 responses and rateLimit errors are retried, counting every attempt"""
+        rate_limited = Mock(status_code=200, headers={})
+        rate_limited.json.return_value = {'errors': {'rateLimit': 'Too many requests.'}}
+        ok = Mock(status_code=200, headers={})
+        ok.json.return_value = {'errors': [], 'response': []}
+        mock_get_session.return_value.get.side_effect = [
+            Mock(status_code=429, headers={'Retry-After': '2'}), rate_limited, ok
+        ]
+
+        response = api_football_get('fixtures', params={'ids': '1'})
+
+        self.assertIs(response, ok)
+        self.assertEqual(mock_get_rate_limiter.return_value.acquire.call_count, 3)
+        self.assertEqual(get_quota_usage()['minute'], 3)
+        self.assertEqual(mock_sleep.call_args_list[0].args[0], 2)
+
+    @patch('apps.api.client.asyncio.sleep')
+    @patch('apps.api.client.get_rate_limiter')
+    def test_api_football_get_async_retries(self, mock_get_rate_limiter, mock_sleep):
+        """Test that 429 responses are retried after the Retry-After seconds"""
+        mock_get_rate_limiter.return_value.reserve.return_value = 0
+
+        session = FakeSession([FakeResponse(429, {'Retry-After': '2'}), FakeResponse(200)])
+
+        result = asyncio.run(api_football_get_async(session, 'fixtures', params={'ids': '1'}))
+
+        self.assertEqual(result, (200, {'response': []}))
+        self.assertEqual(len(session.calls), 2)
+        self.assertIn(2, [call.args[0] for call in mock_sleep.call_args_list])
+
+    @patch('apps.api.client.asyncio.sleep')
+    @patch('apps.api.client.get_rate_limiter')
+    def test_api_football_get_async_retries_rate_limit_errors(self, mock_get_rate_limiter, mock_sleep):
+        """Test that the 200 responses with a rateLimit error are retried"""
+        mock_get_rate_limiter.return_value.reserve.return_value = 0
+        rate_limited = {'errors': {'rateLimit': 'Too many requests.'}, 'response': []}
+        session = FakeSession([FakeResponse(200, data=rate_limited), FakeResponse(200)])
+
+        result = asyncio.run(api_football_get_async(session, 'fixtures', params={'ids': '1'}))
+
+        self.assertEqual(result, (200, {'response': []}))
+        self.assertEqual(len(session.calls), 2)
+
+
+class StandInServerTest(SimpleTestCase):
+    def setUp(self):
+        records_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(records_dir.cleanup)
+        self.records_dir = records_dir.name
+        save_record(self.records_dir, 'fixtures', {'league': '128', 'season': '2024'}, {
+            'errors': [],
+            'results': 2,
+            'response': [
+                {'fixture': {'id': 1, 'status': {'short': 'FT', 'long': 'Match Finished'}}, 'goals': {'home': 2, 'away': 1}},
+                {'fixture': {'id': 2, 'status': {'short': 'FT', 'long': 'Match Finished'}}, 'goals': {'home': 0, 'away': 0}},
+            ],
+        })
+        cache.clear()
+
+    def start_server(self, **kwargs):
+        server = create_standin_server(records_dir=self.records_dir, port=0, **kwargs)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        host, port = server.server_address
+        return server, f'http://{host}:{port}'
+
+    def tearDown(self):
+        client._session = None
+        client._rate_limiter = None
+
+    def test_replay_fixtures_by_ids(self):
+        """Test that the fetcher gets the recorded fixtures from the stand-in"""
+        server, url = self.start_server()
+
+        with override_settings(API_FOOTBALL_URL=url):
+            fixtures = fetch_fixtures([1, 2, 3])
+
+        self.assertEqual(sorted(fixtures), [1, 2])
+        self.assertEqual(fixtures[1]['goals'], {'home': 2, 'away': 1})
+
+    def test_replay_recorded_request(self):
+        server, url = self.start_server()
+
+        with override_settings(API_FOOTBALL_URL=url):
+            response = api_football_get('fixtures', params={'season': 2024, 'league': 128, 'timezone': 'UTC'})
+            missing_response = api_football_get('teams', params={'league': 128})
+
+        self.assertEqual(response.json()['results'], 2)
+        self.assertEqual(missing_response.status_code, 404)
+
+    def test_rate_limit(self):
+        """Test that the rate limit errors come with a 200 like in API-Football"""
+        server, url = self.start_server(requests_per_minute=1)
+
+        responses = [requests.get(f'{url}/fixtures', params={'ids': '1'}) for _ in range(2)]
+
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+        self.assertEqual(responses[0].json()['errors'], [])
+        self.assertIn('rateLimit', responses[1].json()['errors'])
+
+    def test_rate_limit_status(self):
+        server, url = self.start_server(requests_per_minute=1, rate_limit_status=429)
+
+        responses = [requests.get(f'{url}/fixtures', params={'ids': '1'}) for _ in range(2)]
+
+        self.assertEqual([response.status_code for response in responses], [200, 429])
+        self.assertIn('rateLimit', responses[1].json()['errors'])
+
+    def test_status_transitions(self):
+        """Test that the fixtures start not started and finish after every status step"""
+        server, url = self.start_server(status_step=60)
+
+        not_started = requests.get(f'{url}/fixtures', params={'ids': '1'}).json()['response'][0]
+        server.started_at -= 60 * 10
+        finished = requests.get(f'{url}/fixtures', params={'ids': '1'}).json()['response'][0]
+
+        self.assertEqual(not_started['fixture']['status']['short'], 'NS')
+        self.assertEqual(not_started['goals'], {'home': None, 'away': None})
+        self.assertEqual(finished['fixture']['status']['short'], 'FT')
+        self.assertEqual(finished['goals'], {'home': 2, 'away': 1})
@@ -79,6 +79,7 @@ class AppUser(AbstractBaseUser, PermissionsMixin):
         BetRound = apps.get_model('bet', 'BetRound')
         BetLeague = apps.get_model('bet', 'BetLeague')
         MatchResult = apps.get_model('match', 'MatchResult')
+        from apps.bet.leaderboards import remove_bet_rounds_on_commit
         with transaction.atomic():
             self.is_active = False
             self.save()
@@ -87,6 +88,7 @@ class AppUser(AbstractBaseUser, PermissionsMixin):
             bet_rounds = BetRound.objects.filter(bet_league__in=bet_leagues, state=True)
             match_results = MatchResult.objects.filter(bet_round__in=bet_rounds, state=True)
 
+            remove_bet_rounds_on_commit(bet_rounds)
             match_results.update(state=False)
             bet_rounds.update(state=False)
             bet_leagues.update(state=False)
@@ -1,7 +1,10 @@
 from django.contrib import admin
+from django.http import Http404, StreamingHttpResponse
+from django.urls import path
 from import_export import resources
 from import_export.admin import ImportExportModelAdmin
 from .models import BetRound, BetLeague
+from .exports import EXPORT_FORMATS, stream_leaderboard
 
 class BetLeagueResources(resources.ModelResource):
     class Meta:
@@ -42,6 +45,32 @@ class BetRoundAdmin(ImportExportModelAdmin, admin.ModelAdmin):
     get_round.admin_order_field = 'round__name'
     get_round.short_description = 'Round'
 
+    def get_urls(self):
+        urls = [
+            path(
+                'export_leaderboard/<slug:round_slug>/',
+                self.admin_site.admin_view(self.export_leaderboard_view),
+                name='bet_betround_export_leaderboard',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def export_leaderboard_view(self, request, round_slug):
+        """
+            Stream the full leaderboard of a round as CSV, or JSON lines with ?file_format=jsonl,
+            without loading it in memory
+        """
+        export_format = request.GET.get('file_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise Http404(f'Unknown export format {export_format}')
+
+        _, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            stream_leaderboard(round_slug, export_format), content_type=content_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="{round_slug}-leaderboard.{export_format}"'
+        return response
+
 
 admin.site.register(BetLeague, BetLeagueAdmin)
 admin.site.register(BetRound, BetRoundAdmin)
@@ -0,0 +1,63 @@
+import csv
+import json
+from .models import BetRound
+
+LEADERBOARD_EXPORT_FIELDS = ('rank', 'position', 'username', 'points', 'exact_results')
+EXPORT_CHUNK_SIZE = 2000
+
+class _Echo:
+    """File-like object that hands back what the csv writer writes instead of storing it"""
+    def write(self, value):
+        return value
+
+
+def get_leaderboard_rows(round_slug):
+    """
+        Return an iterator over the leaderboard of a round as tuples of
+        LEADERBOARD_EXPORT_FIELDS. Rows are fetched in chunks through a server-side cursor,
+        so memory does not grow with the size of the leaderboard. The export covers the
+        whole leaderboard, so rank and position are numbered while iterating
+    """
+    rows = BetRound.objects.with_matches_points(round_slug=round_slug).values_list(
+        'bet_league__user__username', 'matches_points', 'exact_results_count',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return _rank_rows(rows)
+
+
+def _rank_rows(rows):
+    rank = 0
+    previous_score = None
+    for position, (username, points, exact_results) in enumerate(rows, start=1):
+        # Users tied on points and exact results share the rank, the position is unique
+        if (points, exact_results) != previous_score:
+            rank = position
+            previous_score = (points, exact_results)
+        yield rank, position, username, points, exact_results
+
+
+def _stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(LEADERBOARD_EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _stream_jsonl(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(LEADERBOARD_EXPORT_FIELDS, row))) + '\n'
+
+
+# format -> (stream function, content type)
+EXPORT_FORMATS = {
+    'csv': (_stream_csv, 'text/csv'),
+    'jsonl': (_stream_jsonl, 'application/x-ndjson'),
+}
+
+def stream_leaderboard(round_slug, export_format):
+    """
+        Return a generator of the lines of the leaderboard export of a round. The round is
+        looked up before returning, so a missing round raises Http404 instead of breaking
+        the stream
+    """
+    stream, _ = EXPORT_FORMATS[export_format]
+    return stream(get_leaderboard_rows(round_slug))
@@ -0,0 +1,287 @@
+import logging
+import redis
+from uuid import uuid4
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from .models import BetRound
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_BATCH_SIZE = 1000
+
+# The composite score packs (points, exact results, id) in the 53 bits a sorted set score
+# can hold without losing precision. The id is stored inverted so that, for the same
+# points and exact results, the lowest id gets the highest score like in the DB ordering
+ID_BITS = 32
+EXACT_RESULTS_BITS = 10
+POINTS_BITS = 53 - ID_BITS - EXACT_RESULTS_BITS
+MAX_ID = (1 << ID_BITS) - 1
+
+_redis_client = None
+
+def get_redis_client():
+    """Return the client of the leaderboards Redis, or None if the leaderboards are disabled"""
+    global _redis_client
+    if not settings.LEADERBOARD_REDIS_URL:
+        return None
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(
+            settings.LEADERBOARD_REDIS_URL,
+            socket_connect_timeout=0.5,
+            socket_timeout=1,
+        )
+    return _redis_client
+
+
+def leaderboard_key(round_id):
+    """
+        Sorted set of the BetRounds of a round. The leaderboard of a league is the one of
+        its general round
+    """
+    return f'leaderboard:round:{round_id}'
+
+
+def encode_score(points, exact_results, bet_round_id):
+    return (
+        (min(points, (1 << POINTS_BITS) - 1) << (ID_BITS + EXACT_RESULTS_BITS)) |
+        (min(exact_results, (1 << EXACT_RESULTS_BITS) - 1) << ID_BITS) |
+        (MAX_ID - bet_round_id)
+    )
+
+
+def decode_score(score):
+    """
+        Return:
+        (points, exact_results, bet_round_id)
+    """
+    score = int(score)
+    return (
+        score >> (ID_BITS + EXACT_RESULTS_BITS),
+        (score >> ID_BITS) & ((1 << EXACT_RESULTS_BITS) - 1),
+        MAX_ID - (score & MAX_ID),
+    )
+
+
+def rebuild_round_leaderboards(round_ids):
+    """
+        Rebuild the sorted sets of the received rounds from the stored BetRound totals.
+        Every set is written to a temporary key of its own rebuild and renamed, so readers
+        never see a partial leaderboard, overlapping rebuilds do not mix their members and
+        the removed BetRounds are dropped
+    """
+    client = get_redis_client()
+    if client is None:
+        return
+
+    for round_id in round_ids:
+        key = leaderboard_key(round_id)
+        tmp_key = f'{key}:rebuild:{uuid4().hex}'
+        bet_rounds = BetRound.objects.filter(round_id=round_id, state=True).values_list(
+            'id', 'total_points', 'total_exact_results'
+        )
+
+        pipe = client.pipeline(transaction=False)
+        mapping = {}
+        for bet_round_id, total_points, total_exact_results in bet_rounds.iterator(
+            chunk_size=LEADERBOARD_BATCH_SIZE
+        ):
+            mapping[bet_round_id] = encode_score(total_points, total_exact_results, bet_round_id)
+            if len(mapping) == LEADERBOARD_BATCH_SIZE:
+                pipe.zadd(tmp_key, mapping)
+                mapping = {}
+        if mapping:
+            pipe.zadd(tmp_key, mapping)
+
+        # RENAME fails on a missing key, an empty round simply has no leaderboard
+        pipe.exists(tmp_key)
+        try:
+            *_, has_members = pipe.execute()
+            if has_members:
+                client.rename(tmp_key, key)
+            else:
+                client.delete(key)
+        except redis.RedisError:
+            client.delete(tmp_key)
+            raise
+
+
+def sync_round_leaderboards_on_commit(round_ids):
+    """
+        Rebuild the leaderboards of the received rounds once the standings transaction is
+        committed. Redis errors are logged and do not break the caller, the leaderboards can
+        be rebuilt afterwards with the rebuild_leaderboards command
+    """
+    round_ids = list(round_ids)
+    if not round_ids or get_redis_client() is None:
+        return
+
+    def sync():
+        try:
+            rebuild_round_leaderboards(round_ids=round_ids)
+        except redis.RedisError:
+            logger.exception('Could not sync the leaderboards of rounds %s', round_ids)
+
+    transaction.on_commit(sync)
+
+
+def update_leaderboard_members(bet_rounds):
+    """
+        Write the current totals of the received BetRounds to the leaderboards of their
+        rounds, ZADD replaces the score of the members that are already there. Rounds
+        without a leaderboard yet are built whole, from every BetRound of the round
+    """
+    client = get_redis_client()
+    if client is None:
+        return
+
+    mappings = defaultdict(dict)
+    for bet_round_id, round_id, total_points, total_exact_results in bet_rounds.filter(
+        state=True
+    ).values_list('id', 'round_id', 'total_points', 'total_exact_results').iterator(
+        chunk_size=LEADERBOARD_BATCH_SIZE
+    ):
+        mappings[round_id][bet_round_id] = encode_score(total_points, total_exact_results, bet_round_id)
+
+    missing_round_ids = []
+    for round_id, mapping in mappings.items():
+        key = leaderboard_key(round_id)
+        if not client.exists(key):
+            missing_round_ids.append(round_id)
+            continue
+        members = list(mapping.items())
+        pipe = client.pipeline(transaction=False)
+        for start in range(0, len(members), LEADERBOARD_BATCH_SIZE):
+            pipe.zadd(key, dict(members[start:start + LEADERBOARD_BATCH_SIZE]))
+        pipe.execute()
+
+    rebuild_round_leaderboards(round_ids=missing_round_ids)
+
+
+def update_leaderboard_members_on_commit(bet_rounds):
+    """
+        Update the leaderboards with the BetRounds of the received queryset once the
+        standings transaction is committed, so only the members whose totals changed are
+        written. Redis errors are logged like in sync_round_leaderboards_on_commit
+    """
+    if get_redis_client() is None:
+        return
+
+    def update():
+        try:
+            update_leaderboard_members(bet_rounds)
+        except redis.RedisError:
+            logger.exception('Could not update the leaderboards with the changed BetRounds')
+
+    transaction.on_commit(update)
+
+
+def add_bet_rounds_on_commit(bet_rounds):
+    """
+        Add new BetRounds with their current totals to the leaderboards of their rounds.
+        Rounds without a leaderboard are skipped, creating it with only the new members
+        would hide the rest of the players
+    """
+    client = get_redis_client()
+    if client is None or not bet_rounds:
+        return
+
+    mappings = defaultdict(dict)
+    for bet_round in bet_rounds:
+        mappings[bet_round.round_id][bet_round.id] = encode_score(
+            bet_round.total_points, bet_round.total_exact_results, bet_round.id
+        )
+
+    def add():
+        try:
+            for round_id, mapping in mappings.items():
+                key = leaderboard_key(round_id)
+                if client.exists(key):
+                    client.zadd(key, mapping)
+        except redis.RedisError:
+            logger.exception('Could not add BetRounds to the leaderboards of rounds %s', list(mappings))
+
+    transaction.on_commit(add)
+
+
+def remove_bet_rounds_on_commit(bet_rounds):
+    """Remove BetRounds from the leaderboards of their rounds"""
+    client = get_redis_client()
+    if client is None:
+        return
+
+    members = defaultdict(list)
+    for bet_round_id, round_id in bet_rounds.values_list('id', 'round_id'):
+        members[round_id].append(bet_round_id)
+    if not members:
+        return
+
+    def remove():
+        try:
+            pipe = client.pipeline(transaction=False)
+            for round_id, bet_round_ids in members.items():
+                pipe.zrem(leaderboard_key(round_id), *bet_round_ids)
+            pipe.execute()
+        except redis.RedisError:
+            logger.exception('Could not remove BetRounds from the leaderboards of rounds %s', list(members))
+
+    transaction.on_commit(remove)
+
+
+def has_leaderboard(round_id):
+    client = get_redis_client()
+    return client is not None and bool(client.exists(leaderboard_key(round_id)))
+
+
+def get_leaderboard_page(round_id, page_size, after_score=None, before_score=None):
+    """
+        Return a page of the leaderboard of a round as a list of (bet_round_id, score), from
+        the highest score to the lowest.
+        after_score gives the page that follows that score, before_score the page that
+        precedes it. Both are exclusive bounds, so every page costs O(log n + page_size)
+        however deep it is
+    """
+    client = get_redis_client()
+    key = leaderboard_key(round_id)
+
+    if before_score is not None:
+        entries = client.zrangebyscore(
+            key, f'({before_score}', '+inf', start=0, num=page_size, withscores=True
+        )
+        entries.reverse()
+    else:
+        entries = client.zrevrangebyscore(
+            key, f'({after_score}' if after_score is not None else '+inf', '-inf',
+            start=0, num=page_size, withscores=True
+        )
+
+    return [(int(member), int(score)) for member, score in entries]
+
+
+def get_leaderboard_ranks(round_id, entries):
+    """
+        Return the (rank, position) of every (bet_round_id, score) entry of a consecutive
+        leaderboard page. Users tied on points and exact results share the rank, which is
+        the number of higher scores outside their group plus one, so a page is ranked with
+        one ZREVRANK and one ZCOUNT per group of tied users
+    """
+    if not entries:
+        return []
+
+    key = leaderboard_key(round_id)
+    # Highest score the group of a score can have, the one of an id 0
+    group_tops = list(dict.fromkeys(score | MAX_ID for _, score in entries))
+
+    pipe = get_redis_client().pipeline(transaction=False)
+    pipe.zrevrank(key, entries[0][0])
+    for group_top in group_tops:
+        pipe.zcount(key, f'({group_top}', '+inf')
+    first_position, *higher_counts = pipe.execute()
+    # The first member could have been removed in between
+    first_position = first_position or 0
+
+    group_ranks = {group_top: count + 1 for group_top, count in zip(group_tops, higher_counts)}
+    return [
+        (group_ranks[score | MAX_ID], first_position + 1 + i)
+        for i, (_, score) in enumerate(entries)
+    ]
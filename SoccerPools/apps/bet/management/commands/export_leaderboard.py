@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.http import Http404
+from apps.bet.exports import EXPORT_FORMATS, stream_leaderboard
+
+class Command(BaseCommand):
+    """Write the full leaderboard of a round as CSV or JSON lines, row by row"""
+    def add_arguments(self, parser):
+        parser.add_argument('round_slug', type=str, help='Round slug')
+        parser.add_argument('--format', choices=EXPORT_FORMATS.keys(), default='csv')
+        parser.add_argument('--output', type=str, help='File path, stdout by default')
+
+    def handle(self, *args, **options):
+        round_slug = options.get('round_slug')
+        try:
+            lines = stream_leaderboard(round_slug, options.get('format'))
+        except Http404:
+            raise CommandError(f'Round {round_slug} does not exist')
+        output = options.get('output')
+
+        if output:
+            with open(output, 'w', newline='') as file:
+                file.writelines(lines)
+            self.stdout.write(self.style.SUCCESS(f'Leaderboard exported to {output}'))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
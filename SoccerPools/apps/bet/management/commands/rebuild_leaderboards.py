@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.shortcuts import get_object_or_404
+from apps.league.models import League
+from apps.bet.leaderboards import get_redis_client, rebuild_round_leaderboards
+
+class Command(BaseCommand):
+    """Rebuild the Redis leaderboards of the rounds of a league from the stored standings"""
+    def add_arguments(self, parser):
+        parser.add_argument('league_id', type=int, help='League ID')
+
+    def handle(self, *args, **options):
+        if get_redis_client() is None:
+            raise CommandError('Leaderboards are disabled, LEADERBOARD_REDIS_URL is not set')
+
+        league_id = options.get('league_id')
+        league = get_object_or_404(League, state=True, api_league_id=league_id)
+        round_ids = list(league.rounds.filter(state=True).values_list('id', flat=True))
+
+        rebuild_round_leaderboards(round_ids=round_ids)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Leaderboards rebuilt for {len(round_ids)} rounds of {league}')
+        )
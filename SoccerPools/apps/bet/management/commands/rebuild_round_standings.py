@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.shortcuts import get_object_or_404
+from django.db import transaction
+from apps.league.models import League
+from apps.bet.services import (
+    lock_round_standings, update_league_standings, update_round_standings
+)
+
+class Command(BaseCommand):
+    """Recalculate the stored round and season standings of a league"""
+    def add_arguments(self, parser):
+        parser.add_argument('league_id', type=int, help='League ID')
+
+    def handle(self, *args, **options):
+        league_id = options.get('league_id')
+        league = get_object_or_404(League, state=True, api_league_id=league_id)
+        round_ids = list(
+            league.rounds.filter(state=True, is_general_round=False).values_list('id', flat=True)
+        )
+
+        with transaction.atomic():
+            lock_round_standings(round_ids=round_ids)
+            update_round_standings(round_ids=round_ids)
+            update_league_standings(league_ids=[league.id])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Standings rebuilt for {len(round_ids)} rounds of {league}')
+        )
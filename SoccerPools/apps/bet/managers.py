@@ -1,77 +1,28 @@
-from django.db.models import (
-    Sum, IntegerField, F, Q, ExpressionWrapper, Value, Manager, Count
-)
+from django.db.models import F, Manager
 from django.shortcuts import get_object_or_404
-from django.db.models.functions import Coalesce
 from apps.league.models import Round
 
 class BetRoundManager(Manager):
     def with_matches_points(self, round_slug):
         """
             Filters the bet rounds based on the received round_slug, and makes an annotation 
-            for the bet round points
+            for the bet round points read from the stored standings. Ranks are set on the
+            rows of a page by apps.bet.services.rank_leaderboard_rows
 
             Returns the queryset ordered by matches_points desc
         """
-        round = get_object_or_404(Round, slug=round_slug)
+        get_object_or_404(Round, slug=round_slug)
         bet_rounds = self.filter(
             round__slug=round_slug, 
             state=True
         )
 
-        if round.is_general_round:
-            bet_rounds = bet_rounds.annotate(
-                matches_points=ExpressionWrapper(
-                    Coalesce(
-                        Sum(
-                            'bet_league__bet_rounds__match_results__points',
-                            filter=(
-                                Q(round__is_general_round=True) &
-                                Q(bet_league__bet_rounds__round__league=F('round__league'))
-                            )
-                        ), Value(0),
-                        output_field=IntegerField()
-                    ), output_field=IntegerField()
-                ),
-                exact_results_count=ExpressionWrapper(
-                    Coalesce(
-                        Count(
-                            'bet_league__bet_rounds__match_results__is_exact',
-                            filter=(
-                                Q(bet_league__bet_rounds__match_results__is_exact=True) &
-                                Q(bet_league__bet_rounds__round__league=F('round__league'))
-                            )
-                        ), Value(0),
-                        output_field=IntegerField()
-                    ), output_field=IntegerField()
-                )
-            )
-        else:
-            bet_rounds = bet_rounds.annotate(
-                matches_points=ExpressionWrapper(
-                    Coalesce(
-                        Sum(
-                            'match_results__points',
-                            filter=(
-                                Q(round__is_general_round=False) 
-                            )
-                        ), Value(0),
-                        output_field=IntegerField()
-                    ), output_field=IntegerField()
-                ),
-                exact_results_count=ExpressionWrapper(
-                    Coalesce(
-                        Count(
-                            'match_results__is_exact',
-                            filter=(
-                                Q(match_results__is_exact=True)
-                            )
-                        ), Value(0),
-                        output_field=IntegerField()
-                    ), output_field=IntegerField()
-                )
-            )
-            
+        # Standings are stored on the BetRound by update_round_standings, general rounds hold
+        # the season totals of their BetLeague
+        bet_rounds = bet_rounds.annotate(
+            matches_points=F('total_points'),
+            exact_results_count=F('total_exact_results'),
+        )
 
         return bet_rounds.order_by('-matches_points', '-exact_results_count', 'id')
     
@@ -94,12 +45,8 @@ class BetLeagueManager(Manager):
         return bet_league
     
     def deactivate_last_visited_bet_league(self, user):
-        bet_league_user_last_visited = self.filter(
+        self.filter(
             state=True,
             user=user,
             is_last_visited_league=True
-        )
-        if bet_league_user_last_visited.exists():
-            bet_league_user_last_visited = bet_league_user_last_visited.first()
-            bet_league_user_last_visited.is_last_visited_league = False
-            bet_league_user_last_visited.save()
\ No newline at end of file
+        ).update(is_last_visited_league=False)
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.9 on 2026-10-18 08:06
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Count, F, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
+
+
+def backfill_round_standings(apps, schema_editor):
+    BetRound = apps.get_model('bet', 'BetRound')
+    MatchResult = apps.get_model('match', 'MatchResult')
+
+    round_match_results = MatchResult.objects.filter(
+        bet_round=OuterRef('pk')
+    ).order_by().values('bet_round')
+    BetRound.objects.filter(round__is_general_round=False).update(
+        total_points=Coalesce(
+            Subquery(round_match_results.annotate(total=Sum('points')).values('total')), Value(0)
+        ),
+        total_exact_results=Coalesce(
+            Subquery(
+                round_match_results.filter(is_exact=True).annotate(total=Count('id')).values('total')
+            ),
+            Value(0)
+        ),
+    )
+
+    round_ids = BetRound.objects.filter(
+        round__is_general_round=False
+    ).values_list('round_id', flat=True).distinct()
+    for round_id in round_ids:
+        ranked_bet_rounds = BetRound.objects.filter(round_id=round_id, state=True).annotate(
+            position=Window(
+                expression=RowNumber(),
+                order_by=[F('total_points').desc(), F('total_exact_results').desc(), F('id').asc()]
+            )
+        ).values_list('id', 'position')
+        BetRound.objects.bulk_update(
+            [BetRound(id=bet_round_id, rank=position) for bet_round_id, position in ranked_bet_rounds],
+            ['rank'],
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bet', '0012_alter_betround_bet_league'),
+        ('league', '0019_league_order_display'),
+        ('match', '0015_add_paid_bet_round_fk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='betround',
+            name='rank',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='betround',
+            name='total_exact_results',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='betround',
+            name='total_points',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='betround',
+            index=models.Index(fields=['round', '-total_points', '-total_exact_results', 'id'], name='betround_standings_idx'),
+        ),
+        migrations.RunPython(backfill_round_standings, migrations.RunPython.noop),
+    ]
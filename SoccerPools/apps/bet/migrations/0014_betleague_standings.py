@@ -0,0 +1,72 @@
+# Generated by Django 5.2.9 on 2026-10-18 08:08
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, F, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
+
+
+def backfill_league_standings(apps, schema_editor):
+    BetLeague = apps.get_model('bet', 'BetLeague')
+    BetRound = apps.get_model('bet', 'BetRound')
+
+    league_bet_rounds = BetRound.objects.filter(
+        bet_league=OuterRef('pk'), round__is_general_round=False, state=True
+    ).order_by().values('bet_league')
+    BetLeague.objects.filter(state=True).update(
+        total_points=Coalesce(
+            Subquery(league_bet_rounds.annotate(total=Sum('total_points')).values('total')), Value(0)
+        ),
+        total_exact_results=Coalesce(
+            Subquery(league_bet_rounds.annotate(total=Sum('total_exact_results')).values('total')),
+            Value(0)
+        ),
+    )
+
+    bet_league = BetLeague.objects.filter(pk=OuterRef('bet_league'))
+    general_bet_rounds = BetRound.objects.filter(round__is_general_round=True, state=True)
+    general_bet_rounds.update(
+        total_points=Coalesce(Subquery(bet_league.values('total_points')), Value(0)),
+        total_exact_results=Coalesce(Subquery(bet_league.values('total_exact_results')), Value(0)),
+    )
+
+    round_ids = general_bet_rounds.values_list('round_id', flat=True).distinct()
+    for round_id in round_ids:
+        ranked_bet_rounds = BetRound.objects.filter(round_id=round_id, state=True).annotate(
+            position=Window(
+                expression=RowNumber(),
+                order_by=[F('total_points').desc(), F('total_exact_results').desc(), F('id').asc()]
+            )
+        ).values_list('id', 'position')
+        BetRound.objects.bulk_update(
+            [BetRound(id=bet_round_id, rank=position) for bet_round_id, position in ranked_bet_rounds],
+            ['rank'],
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bet', '0013_betround_standings'),
+        ('league', '0019_league_order_display'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='betleague',
+            name='total_exact_results',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='betleague',
+            name='total_points',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='betleague',
+            index=models.Index(fields=['league', '-total_points', '-total_exact_results', 'id'], name='betleague_standings_idx'),
+        ),
+        migrations.RunPython(backfill_league_standings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bet', '0014_betleague_standings'),
+        ('league', '0019_league_order_display'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BetLeagueStanding',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('state', models.BooleanField(default=True)),
+                ('creation_date', models.DateField(auto_now_add=True, null=True)),
+                ('updating_date', models.DateField(auto_now=True, null=True)),
+                ('rank', models.PositiveIntegerField()),
+                ('total_points', models.PositiveIntegerField(default=0)),
+                ('bet_league', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='bet.betleague')),
+                ('round', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bet_league_standings', to='league.round')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('bet_league', 'round'), name='betleaguestanding_bet_league_round_unique')],
+            },
+        ),
+    ]
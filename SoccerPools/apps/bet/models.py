@@ -24,9 +24,20 @@ class BetLeague(AbstractBetModel):
     user = models.ForeignKey(AppUser, related_name='bet_leagues', on_delete=models.CASCADE)
     league = models.ForeignKey(League, related_name='bet_leagues', on_delete=models.CASCADE)
     is_last_visited_league = models.BooleanField(default=False)
+    # Season totals kept up to date by apps.bet.services.update_round_standings
+    total_points = models.PositiveIntegerField(default=0)
+    total_exact_results = models.PositiveIntegerField(default=0)
 
     objects = BetLeagueManager()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['league', '-total_points', '-total_exact_results', 'id'],
+                name='betleague_standings_idx',
+            ),
+        ]
+
     def __str__(self):
         return f'{self.user.username} - {self.league.name}'
     
@@ -45,49 +56,31 @@ class BetRound(AbstractBetModel):
     bet_league = models.ForeignKey(
         BetLeague, related_name='bet_rounds', on_delete=models.CASCADE, null=True, blank=True
     )
+    # Standings kept up to date by apps.bet.services.update_round_standings, general rounds
+    # mirror the season totals of their BetLeague
+    total_points = models.PositiveIntegerField(default=0)
+    total_exact_results = models.PositiveIntegerField(default=0)
+    rank = models.PositiveIntegerField(null=True, blank=True)
 
     objects = BetRoundManager()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['round', '-total_points', '-total_exact_results', 'id'],
+                name='betround_standings_idx',
+            ),
+        ]
+
     @property
     def points(self):
-        if self.round.is_general_round:
-            if self.bet_league:
-                match_points = BetRound.objects.filter(
-                    state=True,
-                    bet_league__user=self.bet_league.user,
-                    round__league=self.round.league,
-                    round__is_general_round=False
-                ).aggregate(total_points=models.Sum(
-                    'match_results__points'
-                ))['total_points'] or 0
-            else:
-                match_points = 0
-        else:
-            match_points = self.match_results.aggregate(
-                total_points=models.Sum('points')
-            )['total_points'] or 0
-
-        return match_points
+        """Stored points of the bet round, the league season total for general rounds"""
+        return self.total_points
     
     @property
     def exact_results(self):
-        if self.round.is_general_round:
-            if self.bet_league:
-                exact_results = BetRound.objects.filter(
-                    state=True,
-                    bet_league__user=self.bet_league.user,
-                    round__league=self.round.league,
-                    round__is_general_round=False
-                ).aggregate(total_exact=models.Count(
-                    'match_results',
-                    filter=models.Q(match_results__is_exact=True, match_results__state=True)
-                ))['total_exact'] or 0
-            else:
-                exact_results = 0
-        else:
-            exact_results = self.match_results.filter(is_exact=True, state=True).count()
-            
-        return exact_results
+        """Stored exact results of the bet round, the league season total for general rounds"""
+        return self.total_exact_results
     
     def get_user(self):
         return self.bet_league.user
@@ -95,3 +88,24 @@ class BetRound(AbstractBetModel):
     def __str__(self):
         bet_league_user_username = self.bet_league.get_user_username() if self.bet_league else '-'
         return f'{bet_league_user_username} - {self.round.name}'
+
+
+class BetLeagueStanding(BaseModel):
+    """
+        Season rank and points of a BetLeague at the close of a round, written by
+        apps.bet.services.snapshot_league_standings
+    """
+    bet_league = models.ForeignKey(BetLeague, related_name='standings', on_delete=models.CASCADE)
+    round = models.ForeignKey(Round, related_name='bet_league_standings', on_delete=models.CASCADE)
+    rank = models.PositiveIntegerField()
+    total_points = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['bet_league', 'round'], name='betleaguestanding_bet_league_round_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.bet_league} - {self.round.name}: {self.rank}'
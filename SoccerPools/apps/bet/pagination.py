@@ -1,5 +1,165 @@
-from rest_framework.pagination import CursorPagination
+from base64 import b64decode, b64encode
+from urllib import parse
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .leaderboards import (
+    decode_score, encode_score, get_leaderboard_page, get_leaderboard_ranks, has_leaderboard
+)
+from .models import BetRound
+from .services import (
+    leaderboard_ahead_of, leaderboard_behind, number_leaderboard_rows, rank_leaderboard_rows
+)
 
-class BetRoundLeadersCursorPagination(CursorPagination):
+class LeaderboardScoreCursorPagination(BasePagination):
+    """
+        Cursor of the leaderboard pages. It holds the composite score (points, exact results,
+        id) of the first or last BetRound of the current page, encoded like the Redis
+        leaderboards, so a cursor works on both the Redis and the Postgres pages and a
+        client keeps scrolling when one of them takes over
+    """
     page_size = 25
-    ordering = ('-matches_points', '-exact_results_count', 'id')
\ No newline at end of file
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def set_page_links(self, reverse, score, has_more, first_score, last_score):
+        if reverse:
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = score is not None
+        self.first_score = first_score
+        self.last_score = last_score
+
+    def decode_cursor(self, request):
+        """
+            Return:
+            (reverse, score) -> (False, None) for the first page
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return False, None
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            return bool(int(tokens['r'][0])), int(tokens['s'][0])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, reverse, score):
+        querystring = parse.urlencode({'r': int(reverse), 's': score}, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or self.last_score is None:
+            return None
+        return self.encode_cursor(reverse=False, score=self.last_score)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first_score is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(reverse=True, score=self.first_score)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class BetRoundLeadersCursorPagination(LeaderboardScoreCursorPagination):
+    """
+        Pages through BetRound.objects.with_matches_points seeking from the cursor score on
+        the standings index, so a page costs the same however deep it is. The rows of the
+        page are ranked by rank_leaderboard_rows, from the stored ranks for the leaderboard
+        of a whole round
+    """
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        reverse, score = self.decode_cursor(request)
+
+        page_queryset = queryset
+        if score is not None:
+            points, exact_results, bet_round_id = decode_score(score)
+            if reverse:
+                page_queryset = queryset.filter(
+                    leaderboard_ahead_of(points, exact_results, bet_round_id)
+                ).reverse()
+            else:
+                page_queryset = queryset.filter(
+                    leaderboard_behind(points, exact_results, bet_round_id)
+                )
+
+        rows = list(page_queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.set_page_links(
+            reverse, score, has_more,
+            first_score=self.get_score(rows[0]) if rows else None,
+            last_score=self.get_score(rows[-1]) if rows else None,
+        )
+        if score is None:
+            return number_leaderboard_rows(rows)
+        whole_round = view is not None and view.kwargs.get('tournament_id') == 0
+        return rank_leaderboard_rows(queryset, rows, whole_round=whole_round)
+
+    def get_score(self, bet_round):
+        return encode_score(bet_round.total_points, bet_round.total_exact_results, bet_round.id)
+
+
+class BetRoundLeadersRedisPagination(LeaderboardScoreCursorPagination):
+    """
+        Same pages as BetRoundLeadersCursorPagination, served from the Redis leaderboard of
+        the round. Every page is a range query by score with a flat latency however deep
+        the page is
+    """
+
+    def paginate_leaderboard(self, round_id, request):
+        """
+            Return the BetRounds of the requested page in leaderboard order, or None if the
+            round has no leaderboard in Redis
+        """
+        if not has_leaderboard(round_id):
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        reverse, score = self.decode_cursor(request)
+
+        entries = get_leaderboard_page(
+            round_id=round_id,
+            page_size=self.page_size + 1,
+            after_score=None if reverse else score,
+            before_score=score if reverse else None,
+        )
+        has_more = len(entries) > self.page_size
+        if has_more:
+            entries = entries[1:] if reverse else entries[:self.page_size]
+
+        self.set_page_links(
+            reverse, score, has_more,
+            first_score=entries[0][1] if entries else None,
+            last_score=entries[-1][1] if entries else None,
+        )
+
+        bet_rounds = BetRound.objects.filter(
+            id__in=[bet_round_id for bet_round_id, _ in entries]
+        ).select_related('bet_league__user').in_bulk()
+
+        page = []
+        for (bet_round_id, _), (rank, position) in zip(entries, get_leaderboard_ranks(round_id, entries)):
+            if bet_round_id in bet_rounds:
+                bet_round = bet_rounds[bet_round_id]
+                bet_round.leaderboard_rank = rank
+                bet_round.leaderboard_position = position
+                page.append(bet_round)
+        return page
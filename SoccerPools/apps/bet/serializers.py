@@ -7,15 +7,26 @@ class BetRoundSerializer(serializers.ModelSerializer):
         fields = ('id', 'round', 'operation_code')
 
     def to_representation(self, instance):
-        return {
+        """
+            Leaderboard querysets come from BetRound.objects.with_matches_points with
+            select_related('bet_league__user'), so every row is serialized from the loaded
+            instance without extra queries, with the rank and position set by the
+            leaderboard paginators
+        """
+        data = {
             'id': instance.id,
             'username': instance.bet_league.get_user_username() if instance.bet_league else '',
             'profile_image': instance.bet_league.get_user_profile_image() if instance.bet_league else '',
-            'points': instance.points,
-            'exact_results': instance.exact_results,
+            'points': getattr(instance, 'matches_points', instance.points),
+            'exact_results': getattr(instance, 'exact_results_count', instance.exact_results),
             'operation_code': instance.operation_code,
-            'round_id': instance.round.id
+            'round_id': instance.round_id
         }
+        # Tied users share the rank, the position is unique
+        if hasattr(instance, 'leaderboard_rank'):
+            data['rank'] = instance.leaderboard_rank
+            data['position'] = instance.leaderboard_position
+        return data
     
 
 class BetRoundCreateSerializer(serializers.ModelSerializer):
@@ -1,19 +1,360 @@
-from .models import BetLeague
+from collections import defaultdict
+from django.db import connection
+from django.db.models import OuterRef, Q, Subquery, Sum, Count, F, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
+from apps.league.models import Round
+from apps.match.models import MatchResult
+from .models import BetLeague, BetLeagueStanding, BetRound
+from .leaderboards import sync_round_leaderboards_on_commit, update_leaderboard_members_on_commit
+
+STANDINGS_BATCH_SIZE = 1000
 
 def update_top_three_bet_league_winners(league, first_user, second_user, third_user):
-    first_bet_league = BetLeague.objects.filter(
-        league=league, user=first_user
-    ).first()
-    second_bet_league = BetLeague.objects.filter(
-        league=league, user=second_user
-    ).first()
-    third_bet_league = BetLeague.objects.filter(
-        league=league, user=third_user
-    ).first()
-
-    first_bet_league.winner_first = True
-    second_bet_league.winner_second = True
-    third_bet_league.winner_third = True
-    first_bet_league.save()
-    second_bet_league.save()
-    third_bet_league.save()
\ No newline at end of file
+    bet_leagues = BetLeague.objects.filter(league=league)
+    bet_leagues.filter(user=first_user).update(winner_first=True)
+    bet_leagues.filter(user=second_user).update(winner_second=True)
+    bet_leagues.filter(user=third_user).update(winner_third=True)
+
+
+def lock_round_standings(round_ids):
+    """
+        Lock the received rounds and the general rounds of their leagues until the end of the
+        current transaction, so the standings of a round, and the season standings its deltas
+        move, are rewritten by one transaction at a time. The rows are locked in id order so
+        concurrent callers cannot deadlock
+    """
+    league_ids = Round.objects.filter(id__in=round_ids).values('league_id')
+    list(Round.objects.select_for_update().filter(
+        Q(id__in=round_ids) | Q(league_id__in=league_ids, is_general_round=True)
+    ).order_by('id').values_list('id', flat=True))
+
+
+def _update_round_ranks(round_ids):
+    """
+        Write the leaderboard position of the BetRounds of the rounds whose rank changed, with
+        a single UPDATE ranked in the database
+    """
+    round_ids = list(round_ids)
+    if not round_ids:
+        return
+
+    table = BetRound._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+                UPDATE {table} SET rank = ranked.position
+                FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY round_id
+                        ORDER BY total_points DESC, total_exact_results DESC, id ASC
+                    ) AS position
+                    FROM {table}
+                    WHERE state = %s AND round_id IN ({', '.join(['%s'] * len(round_ids))})
+                ) AS ranked
+                WHERE {table}.id = ranked.id AND {table}.rank IS DISTINCT FROM ranked.position
+            """,
+            [True, *round_ids]
+        )
+
+
+def update_league_standings(league_ids):
+    """
+        Recalculate the season totals of every BetLeague of the received leagues from their
+        stored round totals, and copy them to the general round BetRounds. This rewrites the
+        whole league, the standings are kept up to date with deltas and this is only used to
+        rebuild them
+    """
+    league_bet_rounds = BetRound.objects.filter(
+        bet_league=OuterRef('pk'),
+        round__is_general_round=False,
+        state=True
+    ).order_by().values('bet_league')
+
+    BetLeague.objects.filter(league_id__in=league_ids, state=True).update(
+        total_points=Coalesce(
+            Subquery(league_bet_rounds.annotate(total=Sum('total_points')).values('total')),
+            Value(0)
+        ),
+        total_exact_results=Coalesce(
+            Subquery(league_bet_rounds.annotate(total=Sum('total_exact_results')).values('total')),
+            Value(0)
+        ),
+    )
+
+    bet_league = BetLeague.objects.filter(pk=OuterRef('bet_league'))
+    general_bet_rounds = BetRound.objects.filter(
+        round__league_id__in=league_ids,
+        round__is_general_round=True,
+        state=True
+    )
+    general_bet_rounds.update(
+        total_points=Coalesce(Subquery(bet_league.values('total_points')), Value(0)),
+        total_exact_results=Coalesce(Subquery(bet_league.values('total_exact_results')), Value(0)),
+    )
+
+    general_round_ids = set(general_bet_rounds.values_list('round_id', flat=True))
+    _update_round_ranks(round_ids=general_round_ids)
+    sync_round_leaderboards_on_commit(round_ids=general_round_ids)
+
+
+def snapshot_league_standings(round):
+    """
+        Store the season rank and points of every BetLeague of the league of a closed round,
+        one BetLeagueStanding per BetLeague, ranked with the ordering of the live standings.
+        Closing the same round again replaces its rows
+    """
+    ranked_bet_leagues = BetLeague.objects.filter(
+        league_id=round.league_id,
+        state=True
+    ).annotate(
+        season_rank=Window(
+            expression=RowNumber(),
+            order_by=[F('total_points').desc(), F('total_exact_results').desc(), F('id').asc()]
+        )
+    ).values_list('id', 'season_rank', 'total_points')
+
+    standings = []
+    for bet_league_id, season_rank, total_points in ranked_bet_leagues.iterator(
+        chunk_size=STANDINGS_BATCH_SIZE
+    ):
+        standings.append(BetLeagueStanding(
+            bet_league_id=bet_league_id, round_id=round.id, rank=season_rank, total_points=total_points
+        ))
+
+        if len(standings) == STANDINGS_BATCH_SIZE:
+            _save_league_standings(standings)
+            standings = []
+
+    _save_league_standings(standings)
+
+
+def _save_league_standings(standings):
+    BetLeagueStanding.objects.bulk_create(
+        standings,
+        update_conflicts=True,
+        unique_fields=['bet_league', 'round'],
+        update_fields=['rank', 'total_points'],
+    )
+
+
+def update_round_standings(round_ids):
+    """
+        Recalculate the stored total_points and total_exact_results of the BetRounds of the
+        received rounds from their match results, and rewrite their ranks. Only the BetRounds
+        whose totals changed are written, their deltas are added to the season totals of
+        their BetLeagues and general round BetRounds, and to the Redis leaderboards, by
+        _add_standings_deltas
+    """
+    round_match_results = MatchResult.objects.filter(
+        bet_round=OuterRef('pk')
+    ).order_by().values('bet_round')
+
+    changed_bet_rounds = BetRound.objects.filter(
+        round_id__in=round_ids,
+        round__is_general_round=False,
+        state=True
+    ).annotate(
+        new_total_points=Coalesce(
+            Subquery(round_match_results.annotate(total=Sum('points')).values('total')),
+            Value(0)
+        ),
+        new_total_exact_results=Coalesce(
+            Subquery(
+                round_match_results.filter(is_exact=True).annotate(
+                    total=Count('id')
+                ).values('total')
+            ),
+            Value(0)
+        ),
+    ).exclude(
+        total_points=F('new_total_points'),
+        total_exact_results=F('new_total_exact_results'),
+    ).values_list(
+        'id', 'total_points', 'total_exact_results', 'new_total_points', 'new_total_exact_results'
+    )
+    bet_round_deltas = {
+        bet_round_id: (new_total_points - total_points, new_total_exact_results - total_exact_results)
+        for bet_round_id, total_points, total_exact_results, new_total_points, new_total_exact_results
+        in changed_bet_rounds
+    }
+
+    ranked_round_ids = set(
+        Round.objects.filter(id__in=round_ids, is_general_round=False).values_list('id', flat=True)
+    )
+    ranked_round_ids |= _add_standings_deltas(bet_round_deltas)
+    _update_round_ranks(round_ids=ranked_round_ids)
+
+
+def _add_standings_deltas(bet_round_deltas):
+    """
+        Add {bet_round_id: (points, exact_results)} deltas to the stored totals of the
+        BetRounds, of their BetLeagues and of the general round BetRounds of those BetLeagues.
+        BetRounds that move by the same delta are updated together, so the UPDATEs depend on
+        the distinct deltas and not on the number of BetRounds. Only the changed BetRounds
+        are written to the Redis leaderboards
+
+        Return:
+        Ids of the rounds and general rounds whose totals changed
+    """
+    bet_round_deltas = {
+        bet_round_id: delta for bet_round_id, delta in bet_round_deltas.items() if delta != (0, 0)
+    }
+    if not bet_round_deltas:
+        return set()
+
+    bet_round_ids_by_delta = defaultdict(list)
+    bet_league_deltas = defaultdict(lambda: (0, 0))
+    round_ids = set()
+    league_ids = set()
+    for bet_round_id, round_id, league_id, bet_league_id in BetRound.objects.filter(
+        id__in=bet_round_deltas
+    ).values_list('id', 'round_id', 'round__league_id', 'bet_league_id'):
+        points, exact_results = bet_round_deltas[bet_round_id]
+        bet_round_ids_by_delta[(points, exact_results)].append(bet_round_id)
+        if bet_league_id is not None:
+            # A BetLeague adds up the deltas of all its BetRounds
+            league_points, league_exact_results = bet_league_deltas[bet_league_id]
+            bet_league_deltas[bet_league_id] = (league_points + points, league_exact_results + exact_results)
+        round_ids.add(round_id)
+        league_ids.add(league_id)
+
+    bet_league_ids_by_delta = defaultdict(list)
+    for bet_league_id, delta in bet_league_deltas.items():
+        bet_league_ids_by_delta[delta].append(bet_league_id)
+
+    def add_totals(delta):
+        points, exact_results = delta
+        return {
+            'total_points': F('total_points') + points,
+            'total_exact_results': F('total_exact_results') + exact_results,
+        }
+
+    for delta, bet_round_ids in bet_round_ids_by_delta.items():
+        BetRound.objects.filter(id__in=bet_round_ids).update(**add_totals(delta))
+    for delta, bet_league_ids in bet_league_ids_by_delta.items():
+        if delta == (0, 0):
+            continue
+        BetLeague.objects.filter(id__in=bet_league_ids, state=True).update(**add_totals(delta))
+        BetRound.objects.filter(
+            bet_league_id__in=bet_league_ids, round__is_general_round=True, state=True
+        ).update(**add_totals(delta))
+
+    update_leaderboard_members_on_commit(BetRound.objects.filter(
+        Q(id__in=list(bet_round_deltas)) |
+        Q(bet_league_id__in=list(bet_league_deltas), round__is_general_round=True)
+    ))
+
+    round_ids |= set(Round.objects.filter(
+        league_id__in=league_ids, is_general_round=True
+    ).values_list('id', flat=True))
+    return round_ids
+
+
+def apply_standings_deltas(bet_round_deltas):
+    """
+        Add {bet_round_id: (points, exact_results)} deltas to the stored standings, see
+        _add_standings_deltas, and rewrite the ranks of the affected rounds
+    """
+    round_ids = _add_standings_deltas(bet_round_deltas)
+    _update_round_ranks(round_ids=round_ids)
+
+
+def leaderboard_ahead_of(points, exact_results, bet_round_id=None):
+    """
+        Q filter for the rows of a BetRound.objects.with_matches_points leaderboard ahead of
+        the received score, and of the received BetRound among the rows tied with it when
+        bet_round_id is passed
+    """
+    ahead = (
+        Q(matches_points__gt=points) |
+        Q(matches_points=points, exact_results_count__gt=exact_results)
+    )
+    if bet_round_id is not None:
+        ahead |= Q(matches_points=points, exact_results_count=exact_results, id__lt=bet_round_id)
+    return ahead
+
+
+def leaderboard_behind(points, exact_results, bet_round_id):
+    """Q filter for the rows of a leaderboard behind the received BetRound"""
+    return (
+        Q(matches_points__lt=points) |
+        Q(matches_points=points, exact_results_count__lt=exact_results) |
+        Q(matches_points=points, exact_results_count=exact_results, id__gt=bet_round_id)
+    )
+
+
+def rank_leaderboard_rows(bet_rounds, rows, whole_round=False):
+    """
+        Set leaderboard_rank and leaderboard_position on rows, consecutive rows of the
+        bet_rounds leaderboard. Only the first row is located, the rest are numbered in
+        Python. For the leaderboard of a whole round it is read from the stored ranks: its
+        position is its rank and the rank of its tied group is the stored rank of the first
+        member of the group. Otherwise, or while a new BetRound has no rank yet, from a
+        count of the rows ahead of it on the standings index. Users tied on points and exact
+        results share the rank, the position is unique
+
+        Return:
+        rows
+    """
+    if not rows:
+        return rows
+
+    first_row = rows[0]
+    position = rank = None
+    if whole_round:
+        position = first_row.rank
+        rank = bet_rounds.filter(
+            matches_points=first_row.total_points,
+            exact_results_count=first_row.total_exact_results,
+        ).order_by('id').values_list('rank', flat=True).first()
+    if position is None or rank is None:
+        position = bet_rounds.filter(
+            leaderboard_ahead_of(first_row.total_points, first_row.total_exact_results, first_row.id)
+        ).count() + 1
+        rank = bet_rounds.filter(
+            leaderboard_ahead_of(first_row.total_points, first_row.total_exact_results)
+        ).count() + 1
+
+    return number_leaderboard_rows(rows, rank=rank, position=position)
+
+
+def number_leaderboard_rows(rows, rank=1, position=1):
+    """
+        Set leaderboard_rank and leaderboard_position on rows, consecutive rows of a
+        leaderboard starting at the received rank and position, by default the top of it
+
+        Return:
+        rows
+    """
+    previous_score = None
+    for row_position, row in enumerate(rows, start=position):
+        score = (row.total_points, row.total_exact_results)
+        if previous_score is not None and score != previous_score:
+            rank = row_position
+        row.leaderboard_rank = rank
+        row.leaderboard_position = row_position
+        previous_score = score
+    return rows
+
+
+def get_leaderboard_position(bet_rounds, bet_round, neighbours, whole_round=False):
+    """
+        Locate bet_round in the bet_rounds leaderboard, a queryset built by
+        BetRound.objects.with_matches_points, and return the rows around it. The rows are
+        read seeking from the bet round along the leaderboard ordering, so the standings
+        index is used instead of paging from the top
+
+        Return:
+        rows -> Up to neighbours rows above bet_round, bet_round and up to neighbours rows
+        below it, in leaderboard order and ranked by rank_leaderboard_rows
+    """
+    points = bet_round.total_points
+    exact_results = bet_round.total_exact_results
+    bet_rounds_above = list(
+        bet_rounds.filter(leaderboard_ahead_of(points, exact_results, bet_round.id)).reverse()[:neighbours]
+    )[::-1]
+    bet_rounds_below = list(
+        bet_rounds.filter(leaderboard_behind(points, exact_results, bet_round.id))[:neighbours]
+    )
+    rows = bet_rounds_above + [bet_round] + bet_rounds_below
+    return rank_leaderboard_rows(bet_rounds, rows, whole_round=whole_round)
@@ -1,4 +1,11 @@
+import json
+import redis
+from io import StringIO
+from unittest.mock import patch
 from rest_framework.test import APITestCase
+from django.test import override_settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from rest_framework import status
 from django.db.models import Sum
 from django.core.exceptions import ValidationError
@@ -8,8 +15,11 @@ from apps.match.factories import MatchFactory, MatchResultFactory
 from apps.league.factories import LeagueFactory, RoundFactory, TeamFactory
 from apps.tournament.factories import TournamentFactory, TournamentUserFactory
 from apps.bet.factories import BetRoundFactory, BetLeagueFactory
+from apps.bet.services import update_round_standings, snapshot_league_standings
+from apps.bet.leaderboards import encode_score, decode_score, update_leaderboard_members
+from apps.bet.pagination import BetRoundLeadersCursorPagination, BetRoundLeadersRedisPagination
 from apps.league.models import League, Round
-from apps.bet.models import BetLeague, BetRound
+from apps.bet.models import BetLeague, BetLeagueStanding, BetRound
 from apps.match.models import MatchResult
 from apps.tournament.models import TournamentUser
 
@@ -65,6 +75,7 @@ class BetRoundResultsTest(APITestCase):
         self.match_result_10 = MatchResultFactory(bet_round=self.bet_round_4, match=self.match_4, points=0)
         self.match_result_11 = MatchResultFactory(bet_round=self.bet_round_4, match=self.match_5, points=3)
         self.match_result_12 = MatchResultFactory(bet_round=self.bet_round_4, match=self.match_6, points=1)
+        update_round_standings(round_ids=[self.round_1.id, self.round_2.id])
         self.client.force_authenticate(user=self.user_1)
 
     def test_bet_results_no_tournament(self):
@@ -76,6 +87,8 @@ class BetRoundResultsTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue(response.data[0].get('points') >= response.data[1].get('points'))
         self.assertEqual(len(response.data), BetRound.objects.filter(round__slug=round_slug).count())
+        self.assertEqual(response.data[0].get('id'), self.bet_round_2.id)
+        self.assertEqual(response.data[0].get('points'), 4)
 
     def test_bet_results_tournament(self):
         """
@@ -102,6 +115,39 @@ class BetRoundResultsTest(APITestCase):
             TournamentUser.objects.filter(tournament_user_state=TournamentUser.ACCEPTED).count()
         )
 
+    @override_settings(LEADERBOARD_REDIS_URL=None)
+    def test_bet_results_queries(self):
+        """Test that a leaderboard page runs a constant number of queries whatever its size"""
+        tournament = TournamentFactory(league=self.league, admin_tournament=self.user_1)
+        for bet_league in [self.bet_league_1, self.bet_league_2]:
+            TournamentUserFactory(
+                tournament=tournament,
+                user=bet_league.user,
+                tournament_user_state=TournamentUser.ACCEPTED,
+            )
+        # Round lookup and leaderboard query, plus the leaderboard Round lookup for v2
+        urls = [
+            (f'/api/bets/bet_results/{self.round_general.slug}/0/', 2),
+            (f'/api/bets/bet_results/{self.round_general.slug}/{tournament.id}/', 2),
+            (f'/api/bets/bet_results/v2/{self.round_general.slug}/0/', 3),
+            (f'/api/bets/bet_results/v2/{self.round_general.slug}/{tournament.id}/', 2),
+        ]
+        for url, n_queries in urls:
+            with self.assertNumQueries(n_queries):
+                self.client.get(url)
+
+        for i in range(10):
+            user = AppUserFactory(username=f'player_{i}')
+            bet_league = BetLeagueFactory(user=user, league=self.league)
+            BetRoundFactory(bet_league=bet_league, round=self.round_general)
+            TournamentUserFactory(
+                tournament=tournament, user=user, tournament_user_state=TournamentUser.ACCEPTED
+            )
+        for url, n_queries in urls:
+            with self.assertNumQueries(n_queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_bet_general_round(self):
         """
             Test that the endpoint returns the general bets ordered by their accumulated total points
@@ -130,7 +176,541 @@ class BetRoundResultsTest(APITestCase):
             self.assertEqual(response.data[i].get('points'), total_points)
 
 
+
+class RoundStandingsTest(APITestCase):
+    def setUp(self):
+        self.league = LeagueFactory()
+        self.round = RoundFactory(league=self.league)
+        self.team_1 = TeamFactory(leagues=[self.league])
+        self.team_2 = TeamFactory(leagues=[self.league])
+        self.team_3 = TeamFactory(leagues=[self.league])
+        self.team_4 = TeamFactory(leagues=[self.league])
+        self.match_1 = MatchFactory(round=self.round, team_1=self.team_1, team_2=self.team_2)
+        self.match_2 = MatchFactory(round=self.round, team_1=self.team_3, team_2=self.team_4)
+        self.bet_round_1 = BetRoundFactory(round=self.round)
+        self.bet_round_2 = BetRoundFactory(round=self.round)
+        self.bet_round_3 = BetRoundFactory(round=self.round)
+        MatchResultFactory(bet_round=self.bet_round_1, match=self.match_1, points=1)
+        MatchResultFactory(bet_round=self.bet_round_1, match=self.match_2, points=1)
+        MatchResultFactory(bet_round=self.bet_round_2, match=self.match_1, points=3, is_exact=True)
+        MatchResultFactory(bet_round=self.bet_round_2, match=self.match_2, points=0)
+        MatchResultFactory(bet_round=self.bet_round_3, match=self.match_1, points=0)
+        MatchResultFactory(bet_round=self.bet_round_3, match=self.match_2, points=0)
+
+    def test_update_round_standings(self):
+        """Test that the stored totals and ranks follow the leaderboard ordering"""
+        update_round_standings(round_ids=[self.round.id])
+
+        self.bet_round_1.refresh_from_db()
+        self.bet_round_2.refresh_from_db()
+        self.bet_round_3.refresh_from_db()
+        self.assertEqual(self.bet_round_1.total_points, 2)
+        self.assertEqual(self.bet_round_1.total_exact_results, 0)
+        self.assertEqual(self.bet_round_2.total_points, 3)
+        self.assertEqual(self.bet_round_2.total_exact_results, 1)
+        self.assertEqual(self.bet_round_3.total_points, 0)
+        self.assertEqual(self.bet_round_2.rank, 1)
+        self.assertEqual(self.bet_round_1.rank, 2)
+        self.assertEqual(self.bet_round_3.rank, 3)
+
+        leaders = BetRound.objects.with_matches_points(round_slug=self.round.slug)
+        self.assertEqual(
+            list(leaders.values_list('id', flat=True)),
+            [self.bet_round_2.id, self.bet_round_1.id, self.bet_round_3.id]
+        )
+
+    def test_update_round_standings_tie(self):
+        """Test that ties on points are broken by exact results and then by id"""
+        MatchResult.objects.filter(bet_round=self.bet_round_1, match=self.match_2).update(
+            points=3, is_exact=True
+        )
+        update_round_standings(round_ids=[self.round.id])
+
+        self.bet_round_1.refresh_from_db()
+        self.bet_round_2.refresh_from_db()
+        self.assertEqual(self.bet_round_1.total_points, 4)
+        self.assertEqual(self.bet_round_1.rank, 1)
+        self.assertEqual(self.bet_round_2.rank, 2)
+
+
+class LeagueStandingsTest(APITestCase):
+    def setUp(self):
+        self.league = LeagueFactory()
+        self.round_general = RoundFactory(league=self.league, is_general_round=True)
+        self.round_1 = RoundFactory(league=self.league)
+        self.round_2 = RoundFactory(league=self.league)
+        self.match_1 = MatchFactory(round=self.round_1)
+        self.match_2 = MatchFactory(round=self.round_2)
+        self.bet_league_1 = BetLeagueFactory(league=self.league)
+        self.bet_league_2 = BetLeagueFactory(league=self.league)
+        self.bet_round_general_1 = BetRoundFactory(bet_league=self.bet_league_1, round=self.round_general)
+        self.bet_round_general_2 = BetRoundFactory(bet_league=self.bet_league_2, round=self.round_general)
+        self.bet_round_1 = BetRoundFactory(bet_league=self.bet_league_1, round=self.round_1)
+        self.bet_round_2 = BetRoundFactory(bet_league=self.bet_league_1, round=self.round_2)
+        self.bet_round_3 = BetRoundFactory(bet_league=self.bet_league_2, round=self.round_1)
+        self.bet_round_4 = BetRoundFactory(bet_league=self.bet_league_2, round=self.round_2)
+        MatchResultFactory(bet_round=self.bet_round_1, match=self.match_1, points=1)
+        MatchResultFactory(bet_round=self.bet_round_2, match=self.match_2, points=1)
+        MatchResultFactory(bet_round=self.bet_round_3, match=self.match_1, points=3, is_exact=True)
+        MatchResultFactory(bet_round=self.bet_round_4, match=self.match_2, points=0)
+
+    def test_update_league_standings(self):
+        """
+            Test that scoring a round updates the season totals of the bet leagues and the 
+            general round standings
+        """
+        update_round_standings(round_ids=[self.round_1.id])
+
+        self.bet_league_1.refresh_from_db()
+        self.bet_league_2.refresh_from_db()
+        self.assertEqual(self.bet_league_1.total_points, 1)
+        self.assertEqual(self.bet_league_2.total_points, 3)
+        self.assertEqual(self.bet_league_2.total_exact_results, 1)
+
+        update_round_standings(round_ids=[self.round_2.id])
+
+        self.bet_league_1.refresh_from_db()
+        self.bet_round_general_1.refresh_from_db()
+        self.bet_round_general_2.refresh_from_db()
+        self.assertEqual(self.bet_league_1.total_points, 2)
+        self.assertEqual(self.bet_round_general_1.points, 2)
+        self.assertEqual(self.bet_round_general_2.points, 3)
+        self.assertEqual(self.bet_round_general_2.exact_results, 1)
+        self.assertEqual(self.bet_round_general_2.rank, 1)
+        self.assertEqual(self.bet_round_general_1.rank, 2)
+
+        leaders = BetRound.objects.with_matches_points(round_slug=self.round_general.slug)
+        self.assertEqual(
+            list(leaders.values_list('id', flat=True)),
+            [self.bet_round_general_2.id, self.bet_round_general_1.id]
+        )
+
+    def test_update_league_standings_deltas(self):
+        """
+            Test that the season totals only move by the changes of the scored rounds and
+            that deactivated bet rounds are left out
+        """
+        update_round_standings(round_ids=[self.round_1.id, self.round_2.id])
+        BetRound.objects.filter(id=self.bet_round_4.id).update(state=False)
+        MatchResult.objects.filter(bet_round=self.bet_round_4).update(points=3, is_exact=True)
+        MatchResult.objects.filter(bet_round=self.bet_round_2).update(points=3, is_exact=True)
+
+        # bet_round_1 and bet_round_3 did not change, only the ranks of round_1 are checked
+        with self.assertNumQueries(3):
+            update_round_standings(round_ids=[self.round_1.id])
+        update_round_standings(round_ids=[self.round_2.id])
+
+        self.bet_league_1.refresh_from_db()
+        self.bet_league_2.refresh_from_db()
+        self.bet_round_4.refresh_from_db()
+        self.assertEqual((self.bet_league_1.total_points, self.bet_league_1.total_exact_results), (4, 1))
+        self.assertEqual((self.bet_league_2.total_points, self.bet_league_2.total_exact_results), (3, 1))
+        self.assertEqual(self.bet_round_4.total_points, 0)
+
         
+class LeaderboardTest(APITestCase):
+    def setUp(self):
+        self.user = AppUserFactory()
+        self.round = RoundFactory()
+        self.bet_rounds = [BetRoundFactory(round=self.round) for _ in range(4)]
+        for bet_round, (total_points, total_exact_results) in zip(
+            self.bet_rounds, [(2, 0), (3, 1), (3, 1), (0, 0)]
+        ):
+            bet_round.total_points = total_points
+            bet_round.total_exact_results = total_exact_results
+            bet_round.save()
+        self.expected_ids = [
+            self.bet_rounds[1].id, self.bet_rounds[2].id, self.bet_rounds[0].id, self.bet_rounds[3].id
+        ]
+        self.url = f'/api/bets/bet_results/v2/{self.round.slug}/0/'
+        self.client.force_authenticate(user=self.user)
+
+    def get_leaderboard_page(self, round_id, page_size, after_score=None, before_score=None):
+        """In memory version of the sorted set range queries"""
+        entries = sorted(
+            (
+                (bet_round.id, encode_score(bet_round.total_points, bet_round.total_exact_results, bet_round.id))
+                for bet_round in self.bet_rounds
+            ),
+            key=lambda entry: entry[1],
+            reverse=True
+        )
+        if before_score is not None:
+            return [entry for entry in entries if entry[1] > before_score][-page_size:]
+        if after_score is not None:
+            entries = [entry for entry in entries if entry[1] < after_score]
+        return entries[:page_size]
+
+    def get_leaderboard_ranks(self, round_id, entries):
+        """In memory version of the ranks of a sorted set page"""
+        scores = [score for _, score in self.get_leaderboard_page(round_id, len(self.bet_rounds))]
+        return [
+            (
+                1 + sum(1 for other_score in scores if decode_score(other_score)[:2] > decode_score(score)[:2]),
+                scores.index(score) + 1
+            )
+            for _, score in entries
+        ]
+
+    def test_encode_score(self):
+        """Test that the composite score follows the leaderboard ordering and can be decoded"""
+        scores = {
+            bet_round.id: encode_score(bet_round.total_points, bet_round.total_exact_results, bet_round.id)
+            for bet_round in self.bet_rounds
+        }
+        self.assertEqual(sorted(scores, key=scores.get, reverse=True), self.expected_ids)
+        self.assertEqual(
+            list(BetRound.objects.with_matches_points(round_slug=self.round.slug).values_list('id', flat=True)),
+            self.expected_ids
+        )
+        self.assertEqual(decode_score(scores[self.bet_rounds[1].id]), (3, 1, self.bet_rounds[1].id))
+
+    @patch.object(BetRoundLeadersRedisPagination, 'page_size', 2)
+    @patch('apps.bet.pagination.has_leaderboard', return_value=True)
+    def test_bet_results_from_redis(self, mock_has_leaderboard):
+        """Test that the pages are served from the leaderboard and linked by their scores"""
+        with patch('apps.bet.pagination.get_leaderboard_page', side_effect=self.get_leaderboard_page), \
+            patch('apps.bet.pagination.get_leaderboard_ranks', side_effect=self.get_leaderboard_ranks):
+            first_page = self.client.get(self.url)
+            second_page = self.client.get(first_page.data['next'])
+            previous_page = self.client.get(second_page.data['previous'])
+
+        self.assertEqual(first_page.status_code, status.HTTP_200_OK)
+        self.assertEqual([bet['id'] for bet in first_page.data['results']], self.expected_ids[:2])
+        self.assertIsNone(first_page.data['previous'])
+        self.assertEqual([bet['id'] for bet in second_page.data['results']], self.expected_ids[2:])
+        self.assertIsNone(second_page.data['next'])
+        self.assertEqual(second_page.data['results'][0]['points'], 2)
+        self.assertEqual(
+            [(bet['rank'], bet['position']) for bet in first_page.data['results'] + second_page.data['results']],
+            [(1, 1), (1, 2), (3, 3), (4, 4)]
+        )
+        self.assertEqual([bet['id'] for bet in previous_page.data['results']], self.expected_ids[:2])
+        self.assertIsNone(previous_page.data['previous'])
+
+    @patch('apps.bet.leaderboards.get_redis_client')
+    def test_bet_results_redis_unavailable(self, mock_get_redis_client):
+        """Test that the leaderboard falls back to Postgres when Redis fails"""
+        mock_get_redis_client.return_value.exists.side_effect = redis.ConnectionError
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([bet['id'] for bet in response.data['results']], self.expected_ids)
+
+    @patch.object(BetRoundLeadersRedisPagination, 'page_size', 2)
+    @patch.object(BetRoundLeadersCursorPagination, 'page_size', 2)
+    def test_redis_cursor_on_postgres_fallback(self):
+        """Test that a cursor of a Redis page keeps paging when Postgres takes over"""
+        with patch('apps.bet.pagination.has_leaderboard', return_value=True), \
+            patch('apps.bet.pagination.get_leaderboard_page', side_effect=self.get_leaderboard_page), \
+            patch('apps.bet.pagination.get_leaderboard_ranks', side_effect=self.get_leaderboard_ranks):
+            first_page = self.client.get(self.url)
+
+        with patch('apps.bet.pagination.has_leaderboard', side_effect=redis.ConnectionError):
+            second_page = self.client.get(first_page.data['next'])
+
+        self.assertEqual(second_page.status_code, status.HTTP_200_OK)
+        self.assertEqual([bet['id'] for bet in second_page.data['results']], self.expected_ids[2:])
+
+    @patch('apps.bet.leaderboards.get_redis_client')
+    def test_update_leaderboard_members(self, mock_get_redis_client):
+        """Test that only the changed BetRounds are written to an existing leaderboard"""
+        client = mock_get_redis_client.return_value
+        client.exists.return_value = True
+        bet_round = self.bet_rounds[3]
+
+        update_leaderboard_members(BetRound.objects.filter(id=bet_round.id))
+
+        client.pipeline.return_value.zadd.assert_called_once_with(
+            f'leaderboard:round:{self.round.id}', {bet_round.id: encode_score(0, 0, bet_round.id)}
+        )
+        client.rename.assert_not_called()
+
+    @patch('apps.bet.leaderboards.get_redis_client')
+    def test_update_leaderboard_members_builds_missing_leaderboard(self, mock_get_redis_client):
+        """Test that a round without a leaderboard gets every BetRound under a unique temp key"""
+        client = mock_get_redis_client.return_value
+        client.exists.return_value = False
+        client.pipeline.return_value.execute.return_value = [1, True]
+
+        update_leaderboard_members(BetRound.objects.filter(id=self.bet_rounds[3].id))
+
+        (tmp_key, mapping), _ = client.pipeline.return_value.zadd.call_args
+        self.assertEqual(set(mapping), {bet_round.id for bet_round in self.bet_rounds})
+        self.assertRegex(tmp_key, rf'^leaderboard:round:{self.round.id}:rebuild:\w+$')
+        client.rename.assert_called_once_with(tmp_key, f'leaderboard:round:{self.round.id}')
+
+
+class LeaderboardPositionTest(APITestCase):
+    def setUp(self):
+        self.league = LeagueFactory()
+        self.round = RoundFactory(league=self.league)
+        self.match = MatchFactory(round=self.round)
+        self.users = [AppUserFactory(username=f'player_{i}') for i in range(7)]
+        self.bet_rounds = []
+        for user, points in zip(self.users, [3, 1, 0, 3, 1, 1, 0]):
+            bet_round = BetRoundFactory(
+                round=self.round, bet_league=BetLeagueFactory(user=user, league=self.league)
+            )
+            MatchResultFactory(
+                bet_round=bet_round, match=self.match, points=points, is_exact=points == 3
+            )
+            self.bet_rounds.append(bet_round)
+        update_round_standings(round_ids=[self.round.id])
+        self.leaderboard_ids = list(
+            BetRound.objects.with_matches_points(round_slug=self.round.slug).values_list('id', flat=True)
+        )
+
+    def test_position_in_round(self):
+        """Test that the user row and its neighbours have the ranks of the main leaderboard"""
+        self.client.force_authenticate(user=self.users[4])
+
+        response = self.client.get(
+            f'/api/bets/bet_results/position/{self.round.slug}/0/', {'neighbours': 2}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['position'], self.leaderboard_ids.index(self.bet_rounds[4].id) + 1)
+        self.assertEqual(response.data['rank'], 3)
+        self.assertEqual(response.data['points'], 1)
+
+        leaderboard = self.client.get(f'/api/bets/bet_results/{self.round.slug}/0/').data
+        self.assertEqual(
+            [(bet['rank'], bet['position'], bet['id']) for bet in response.data['results']],
+            [(bet['rank'], bet['position'], bet['id']) for bet in leaderboard[1:6]]
+        )
+        self.assertEqual([bet['rank'] for bet in response.data['results']], [1, 3, 3, 3, 6])
+
+    def test_position_at_the_top(self):
+        """Test that there are no rows above the leader"""
+        self.client.force_authenticate(user=self.users[0])
+
+        response = self.client.get(
+            f'/api/bets/bet_results/position/{self.round.slug}/0/', {'neighbours': 2}
+        )
+
+        self.assertEqual(response.data['position'], 1)
+        self.assertEqual(
+            [bet['id'] for bet in response.data['results']], self.leaderboard_ids[:3]
+        )
+        self.assertEqual([bet['rank'] for bet in response.data['results']], [1, 1, 3])
+
+    def test_position_in_tournament(self):
+        """Test that the rank is computed among the accepted tournament users"""
+        tournament = TournamentFactory(league=self.league, admin_tournament=self.users[0])
+        for user in [self.users[0], self.users[2], self.users[5]]:
+            TournamentUserFactory(
+                tournament=tournament, user=user, tournament_user_state=TournamentUser.ACCEPTED
+            )
+        self.client.force_authenticate(user=self.users[2])
+
+        response = self.client.get(
+            f'/api/bets/bet_results/position/{self.round.slug}/{tournament.id}/'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rank'], 3)
+        self.assertEqual(response.data['position'], 3)
+        self.assertEqual(
+            [(bet['rank'], bet['id']) for bet in response.data['results']],
+            [(1, self.bet_rounds[0].id), (2, self.bet_rounds[5].id), (3, self.bet_rounds[2].id)]
+        )
+
+    @override_settings(LEADERBOARD_REDIS_URL=None)
+    @patch.object(BetRoundLeadersCursorPagination, 'page_size', 2)
+    def test_ranks_across_cursor_pages(self):
+        """Test that every cursor page has the ranks of the whole leaderboard"""
+        self.client.force_authenticate(user=self.users[0])
+        url = f'/api/bets/bet_results/v2/{self.round.slug}/0/'
+
+        ranks = []
+        while url:
+            response = self.client.get(url)
+            ranks += [(bet['rank'], bet['position']) for bet in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(ranks, [(1, 1), (1, 2), (3, 3), (3, 4), (3, 5), (6, 6), (6, 7)])
+
+    @override_settings(LEADERBOARD_REDIS_URL=None)
+    @patch.object(BetRoundLeadersCursorPagination, 'page_size', 2)
+    def test_previous_cursor_pages(self):
+        """Test that the previous links walk back through the same pages"""
+        self.client.force_authenticate(user=self.users[0])
+        url = f'/api/bets/bet_results/v2/{self.round.slug}/0/'
+
+        pages = []
+        while url:
+            response = self.client.get(url)
+            pages.append([bet['id'] for bet in response.data['results']])
+            url = response.data['next']
+
+        url = response.data['previous']
+        for page in reversed(pages[:-1]):
+            response = self.client.get(url)
+            self.assertEqual([bet['id'] for bet in response.data['results']], page)
+            url = response.data['previous']
+
+    @override_settings(LEADERBOARD_REDIS_URL=None)
+    @patch.object(BetRoundLeadersCursorPagination, 'page_size', 2)
+    def test_cursor_page_reads_stored_ranks(self):
+        """Test that a deep page of a whole round is ranked without counting the rows ahead"""
+        self.client.force_authenticate(user=self.users[0])
+        url = self.client.get(f'/api/bets/bet_results/v2/{self.round.slug}/0/').data['next']
+
+        # Round lookups, page and rank of the tied group of its first row
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+
+        self.assertEqual(
+            [(bet['rank'], bet['position']) for bet in response.data['results']], [(3, 3), (3, 4)]
+        )
+
+    def test_position_user_not_in_round(self):
+        self.client.force_authenticate(user=AppUserFactory(username='spectator'))
+
+        response = self.client.get(f'/api/bets/bet_results/position/{self.round.slug}/0/')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_position_invalid_neighbours(self):
+        self.client.force_authenticate(user=self.users[0])
+
+        response = self.client.get(
+            f'/api/bets/bet_results/position/{self.round.slug}/0/', {'neighbours': 100}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RankHistoryTest(APITestCase):
+    def setUp(self):
+        self.league = LeagueFactory()
+        self.round_1 = RoundFactory(league=self.league)
+        self.round_2 = RoundFactory(league=self.league)
+        self.match_1 = MatchFactory(round=self.round_1)
+        self.match_2 = MatchFactory(round=self.round_2)
+        self.users = [AppUserFactory(username=f'player_{i}') for i in range(3)]
+        self.bet_leagues = [BetLeagueFactory(user=user, league=self.league) for user in self.users]
+        # Round 2 is played after the close of round 1
+        for bet_league, points in zip(self.bet_leagues, [3, 1, 0]):
+            MatchResultFactory(
+                bet_round=BetRoundFactory(bet_league=bet_league, round=self.round_1),
+                match=self.match_1,
+                points=points,
+            )
+            BetRoundFactory(bet_league=bet_league, round=self.round_2)
+        update_round_standings(round_ids=[self.round_1.id])
+        snapshot_league_standings(round=self.round_1)
+
+        for bet_league, points in zip(self.bet_leagues, [0, 3, 3]):
+            MatchResultFactory(
+                bet_round=bet_league.bet_rounds.get(round=self.round_2),
+                match=self.match_2,
+                points=points,
+            )
+        update_round_standings(round_ids=[self.round_2.id])
+        snapshot_league_standings(round=self.round_2)
+
+    def test_snapshot_league_standings(self):
+        """Test that every closed round stores the season rank and points once"""
+        snapshot_league_standings(round=self.round_2)
+
+        histories = [
+            [list(standing) for standing in BetLeagueStanding.objects.filter(
+                bet_league=bet_league
+            ).order_by('id').values_list('round_id', 'rank', 'total_points')]
+            for bet_league in self.bet_leagues
+        ]
+        # Tied BetLeagues are ranked by id like in the live standings
+        self.assertEqual(histories, [
+            [[self.round_1.id, 1, 3], [self.round_2.id, 2, 3]],
+            [[self.round_1.id, 2, 1], [self.round_2.id, 1, 4]],
+            [[self.round_1.id, 3, 0], [self.round_2.id, 3, 3]],
+        ])
+
+    def test_rank_history(self):
+        """Test that the rank history and its changes are read from the standings snapshots"""
+        self.client.force_authenticate(user=self.users[1])
+
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/bets/rank_history/{self.league.slug}/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['history'], [
+            {'round_id': self.round_1.id, 'rank': 2, 'points': 1, 'rank_change': None},
+            {'round_id': self.round_2.id, 'rank': 1, 'points': 4, 'rank_change': 1},
+        ])
+
+    def test_rank_history_not_joined(self):
+        self.client.force_authenticate(user=AppUserFactory(username='spectator'))
+
+        response = self.client.get(f'/api/bets/rank_history/{self.league.slug}/')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class LeaderboardExportTest(APITestCase):
+    def setUp(self):
+        self.league = LeagueFactory()
+        self.round = RoundFactory(league=self.league)
+        self.match = MatchFactory(round=self.round)
+        self.users = [AppUserFactory(username=f'player_{i}') for i in range(3)]
+        for user, points in zip(self.users, [1, 3, 1]):
+            MatchResultFactory(
+                bet_round=BetRoundFactory(
+                    bet_league=BetLeagueFactory(user=user, league=self.league), round=self.round
+                ),
+                match=self.match,
+                points=points,
+                is_exact=points == 3,
+            )
+        update_round_standings(round_ids=[self.round.id])
+
+    def test_export_leaderboard_csv(self):
+        """Test that the admin streams the ranked leaderboard as CSV"""
+        self.client.force_login(AppUser.objects.create_superuser(
+            username='admin',
+            email='admin@gmail.com',
+            name='Admin',
+            last_name='Admin',
+            password='123456789'
+        ))
+
+        response = self.client.get(f'/admin/bet/betround/export_leaderboard/{self.round.slug}/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(), [
+            'rank,position,username,points,exact_results',
+            '1,1,player_1,3,1',
+            '2,2,player_0,1,0',
+            '2,3,player_2,1,0',
+        ])
+
+    def test_export_leaderboard_requires_staff(self):
+        self.client.force_login(self.users[0])
+
+        response = self.client.get(f'/admin/bet/betround/export_leaderboard/{self.round.slug}/')
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+    def test_export_leaderboard_command_jsonl(self):
+        """Test that the command writes one JSON object per leaderboard row"""
+        out = StringIO()
+        call_command('export_leaderboard', self.round.slug, '--format', 'jsonl', stdout=out)
+
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(rows[0], {
+            'rank': 1, 'position': 1, 'username': 'player_1', 'points': 3, 'exact_results': 1
+        })
+        self.assertEqual([row['username'] for row in rows], ['player_1', 'player_0', 'player_2'])
+
+    def test_export_leaderboard_command_missing_round(self):
+        with self.assertRaisesMessage(CommandError, 'Round missing-round does not exist'):
+            call_command('export_leaderboard', 'missing-round', stdout=StringIO())
+
+
 class LeagueBetsMatchResultsCreateTest(APITestCase):
     @classmethod
     def setUpTestData(cls):
@@ -157,8 +737,9 @@ class LeagueBetsMatchResultsCreateTest(APITestCase):
 
     def test_league_bets_creation(self):
         """
-            Test that all the BetLeague, BetRound and MatchResult instances are created 
-            for the user based on the league, and coins are substracted from the user
+            Test that all the BetLeague and BetRound instances are created for the user
+            based on the league, and coins are substracted from the user. MatchResults are
+            only created when the predictions are submitted
         """
         self.client.force_authenticate(user=self.user)
         data = {
@@ -170,7 +751,7 @@ class LeagueBetsMatchResultsCreateTest(APITestCase):
         self.assertEqual(BetLeague.objects.count(), 1)
         self.assertEqual(BetRound.objects.count(), 2)
         self.assertEqual(BetRound.objects.first().bet_league, BetLeague.objects.first())
-        self.assertEqual(MatchResult.objects.count(), 6)
+        self.assertEqual(MatchResult.objects.count(), 0)
         self.user.refresh_from_db()
         self.assertEqual(self.user.coins, 500)
 
@@ -207,8 +788,8 @@ class LeagueBetsMatchResultsCreateTest(APITestCase):
 
     def test_finalized_round(self):
         """
-            Test that NO BetRound or MatchResult instances are created for a Round that
-            is on finalized round_state
+            Test that NO BetRound instances are created for a Round that is on finalized
+            round_state
         """
         self.round_3 = RoundFactory(league=self.league, round_state=Round.FINALIZED_ROUND)
         self.match_1 = MatchFactory(round=self.round_3, team_1=self.team_1, team_2=self.team_4)
@@ -224,7 +805,7 @@ class LeagueBetsMatchResultsCreateTest(APITestCase):
         self.assertEqual(BetLeague.objects.count(), 1)
         self.assertEqual(BetRound.objects.count(), 2)
         self.assertEqual(BetRound.objects.first().bet_league, BetLeague.objects.first())
-        self.assertEqual(MatchResult.objects.count(), 6)
+        self.assertEqual(MatchResult.objects.count(), 0)
 
     def test_no_enough_coins(self):
         """
@@ -261,3 +842,29 @@ class LeagueBetsMatchResultsCreateTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(BetLeague.objects.count(), 1)
         self.assertEqual(BetRound.objects.count(), 2)
+
+    def test_join_query_count(self):
+        """Test that joining a league runs the same statements however many rounds it has"""
+        other_league = LeagueFactory(name='Long League', slug='long-league', coins_cost=1000)
+        for _ in range(10):
+            league_round = RoundFactory(league=other_league)
+            MatchFactory.create_batch(3, round=league_round)
+        BetLeagueFactory(user=self.user, league=other_league, is_last_visited_league=True)
+        other_user = AppUserFactory(username='other_player', email='other@gmail.com', coins=1500)
+
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(9):
+            response = self.client.post(self.url, {'league_slug': self.league.slug}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.client.force_authenticate(user=other_user)
+        with self.assertNumQueries(9):
+            response = self.client.post(self.url, {'league_slug': other_league.slug}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['bet_rounds']), 10)
+        self.assertEqual(
+            list(BetLeague.objects.filter(user=self.user, is_last_visited_league=True).values_list(
+                'league_id', flat=True
+            )),
+            [self.league.id]
+        )
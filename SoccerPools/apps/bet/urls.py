@@ -4,5 +4,7 @@ from .views import *
 urlpatterns = [
     path('bet_results/<slug:round_slug>/<int:tournament_id>/', BetRoundResultsLegacyApiView.as_view(), name='bet_results_legacy'),
     path('bet_results/v2/<slug:round_slug>/<int:tournament_id>/', BetRoundResultsApiView.as_view(), name='bet_results'),
+    path('bet_results/position/<slug:round_slug>/<int:tournament_id>/', BetRoundPositionApiView.as_view(), name='bet_results_position'),
+    path('rank_history/<slug:league_slug>/', BetLeagueRankHistoryApiView.as_view(), name='rank_history'),
     path('league_bets_create/', LeagueBetRoundsMatchResultsCreateApiView.as_view(), name='league_bets_create'),
 ]
@@ -15,7 +15,7 @@ def generate_response_data(league_name, username, bet_league_id, bet_rounds):
             'user': username,
             'bet_league_id': bet_league_id,
             'bet_rounds': [
-                {'bet_round_id': bet_round.id, 'round_id': bet_round.round.id} 
+                {'bet_round_id': bet_round.id, 'round_id': bet_round.round_id} 
                 for bet_round in bet_rounds
             ]
         }
\ No newline at end of file
@@ -1,18 +1,20 @@
 import logging
+import redis
 from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 from django.db import transaction
-from django.db.models import Q, F
+from django.db.models import Case, Q, F, Value, When
 from django.shortcuts import get_object_or_404
 from apps.league.models import Round, League
-from apps.match.models import Match, MatchResult
 from apps.tournament.models import TournamentUser
 from .serializers import BetRoundSerializer
 from .models import BetRound, BetLeague
 from .utils import generate_response_data
-from .pagination import BetRoundLeadersCursorPagination
+from .services import get_leaderboard_position, number_leaderboard_rows
+from .leaderboards import add_bet_rounds_on_commit
+from .pagination import BetRoundLeadersCursorPagination, BetRoundLeadersRedisPagination
 
 logger = logging.getLogger(__name__)
 
@@ -24,19 +26,25 @@ class BetRoundResultsLegacyApiView(generics.ListAPIView):
     def get_queryset(self,):
         round_slug = self.kwargs.get('round_slug')
         tournament_id = self.kwargs.get('tournament_id')
-        bet_rounds = BetRound.objects.with_matches_points(round_slug=round_slug)
+        bet_rounds = BetRound.objects.with_matches_points(
+            round_slug=round_slug
+        ).select_related('bet_league__user')
 
         if tournament_id != 0:
-            tournament_users = TournamentUser.objects.filter(
+            user_ids = TournamentUser.objects.filter(
                 tournament__id=tournament_id,
                 tournament_user_state=TournamentUser.ACCEPTED
-            )
-            users = [tournament_user.user for tournament_user in tournament_users]
+            ).values_list('user_id', flat=True)
 
-            bet_rounds = bet_rounds.filter(bet_league__user__in=users)
+            bet_rounds = bet_rounds.filter(bet_league__user__in=user_ids)
 
         return bet_rounds
 
+    def list(self, request, *args, **kwargs):
+        """The whole leaderboard is returned, so it is numbered from the top"""
+        bet_rounds = number_leaderboard_rows(list(self.get_queryset()))
+        return Response(self.get_serializer(bet_rounds, many=True).data)
+
 class BetRoundResultsApiView(generics.ListAPIView):
     permission_classes = (permissions.IsAuthenticated,)
     pagination_class = BetRoundLeadersCursorPagination
@@ -47,7 +55,7 @@ class BetRoundResultsApiView(generics.ListAPIView):
         tournament_id = self.kwargs.get('tournament_id')
         bet_rounds = BetRound.objects.with_matches_points(
             round_slug=round_slug
-        ).select_related('bet_league__user', 'round')
+        ).select_related('bet_league__user')
 
         if tournament_id != 0:
             user_ids = TournamentUser.objects.filter(
@@ -59,10 +67,118 @@ class BetRoundResultsApiView(generics.ListAPIView):
 
         return bet_rounds
 
+    def list(self, request, *args, **kwargs):
+        """
+            The leaderboard of the whole round is served from Redis when it is available,
+            the tournament leaderboards and the Redis failures fall back to Postgres
+        """
+        if self.kwargs.get('tournament_id') == 0:
+            league_round = get_object_or_404(Round, slug=self.kwargs.get('round_slug'))
+            paginator = BetRoundLeadersRedisPagination()
+            try:
+                bet_rounds = paginator.paginate_leaderboard(league_round.id, request)
+            except redis.RedisError:
+                logger.warning('Leaderboard of round %s unavailable in Redis', league_round.id)
+                bet_rounds = None
+
+            if bet_rounds is not None:
+                serializer = self.get_serializer(bet_rounds, many=True)
+                return paginator.get_paginated_response(serializer.data)
+
+        return super().list(request, *args, **kwargs)
+
+
+class BetRoundPositionApiView(BetRoundResultsApiView):
+    """
+        Position of the user in the same leaderboard BetRoundResultsApiView pages through,
+        with the rows right above and below it
+
+        Query params:
+        neighbours -> Rows returned on each side of the user, 5 by default
+
+        Response:
+        rank (Integer): Rank of the user, shared with the users tied on points and exact results.
+        position (Integer): Position of the user in the leaderboard.
+        points (Integer): Points of the user.
+        exact_results (Integer): Exact results of the user.
+        results (List): The user row and its neighbours in leaderboard order, each one with its `rank` and `position`.
+    """
+    pagination_class = None
+    default_neighbours = 5
+    max_neighbours = BetRoundLeadersCursorPagination.page_size
+
+    def list(self, request, *args, **kwargs):
+        try:
+            neighbours = int(request.query_params.get('neighbours', self.default_neighbours))
+        except ValueError:
+            raise ValidationError({'neighbours': 'Must be an integer'})
+        if not 0 <= neighbours <= self.max_neighbours:
+            raise ValidationError({'neighbours': f'Must be between 0 and {self.max_neighbours}'})
+
+        bet_rounds = self.get_queryset()
+        bet_round = get_object_or_404(bet_rounds, bet_league__user=request.user)
+
+        # The stored rank is the position in the whole round, tournaments rank among their users
+        rows = get_leaderboard_position(
+            bet_rounds=bet_rounds,
+            bet_round=bet_round,
+            neighbours=neighbours,
+            whole_round=self.kwargs.get('tournament_id') == 0,
+        )
+
+        return Response({
+            'rank': bet_round.leaderboard_rank,
+            'position': bet_round.leaderboard_position,
+            'points': bet_round.points,
+            'exact_results': bet_round.exact_results,
+            'results': self.get_serializer(rows, many=True).data,
+        }, status=status.HTTP_200_OK)
+
+
+class BetLeagueRankHistoryApiView(APIView):
+    """
+        Season rank of the user at the close of every finalized round of a league
+
+        Response:
+        league (String): Name of the league.
+        history (List): `round_id`, `rank`, `points` and `rank_change` (positions gained since
+        the previous round, null for the first one) for each round in closing order.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, league_slug):
+        bet_league = get_object_or_404(
+            BetLeague.objects.select_related('league'),
+            state=True,
+            user=request.user,
+            league__slug=league_slug,
+        )
+
+        standings = bet_league.standings.filter(state=True).order_by('id').values_list(
+            'round_id', 'rank', 'total_points'
+        )
+
+        history = []
+        previous_rank = None
+        for round_id, rank, points in standings:
+            history.append({
+                'round_id': round_id,
+                'rank': rank,
+                'points': points,
+                'rank_change': None if previous_rank is None else previous_rank - rank,
+            })
+            previous_rank = rank
+
+        return Response({
+            'league': bet_league.league.name,
+            'history': history,
+        }, status=status.HTTP_200_OK)
+
 
 class LeagueBetRoundsMatchResultsCreateApiView(APIView):
     """
-        If enough coins, Creates BetLeague, BetRound and MatchResult instances for the League selected by the user
+        If enough coins, Creates BetLeague and BetRound instances for the League selected by the user,
+        the MatchResults are only created when the user submits the predictions
         If there is an existing BetLeague, returns it without new creations
 
         Payload:
@@ -80,29 +196,26 @@ class LeagueBetRoundsMatchResultsCreateApiView(APIView):
         league = get_object_or_404(League, slug=request.data['league_slug'])
         user = request.user
 
-        # Filter all the NON finalized rounds
-        rounds = Round.objects.filter(
-            Q(round_state=Round.NOT_STARTED_ROUND) | 
-            Q(round_state=Round.PENDING_ROUND),
-            state=True,
-            league=league,
-        )
-
-        # Deactivate if there is another bet_league instance with last_visited in True
-        BetLeague.objects.deactivate_last_visited_bet_league(user)
-
-        existing_user_bet_league = BetLeague.objects.filter(state=True, league=league, user=user)
+        existing_user_bet_league = BetLeague.objects.filter(state=True, league=league, user=user).first()
         # If the user does not have enough coins and there is no existing BetLeague instance for this league and user, raise a ValidationError
-        if (user.coins < league.coins_cost) and not existing_user_bet_league.exists():
+        if (user.coins < league.coins_cost) and existing_user_bet_league is None:
             logger.info('User %s has insufficient coins to join league %s', user.username, league.name)
             raise ValidationError({'coins': 'Your coins are insufficient for joining this league'})
         
         # If there is already a BetLeague instance for this league and user, set 
-        # is_last_visited_league to True and DO NOT CREATE ANY NEW BetLeague, BetRound or MatchResult 
-        if existing_user_bet_league.exists():
-            existing_user_bet_league = existing_user_bet_league.first()
-            existing_user_bet_league.is_last_visited_league = True
-            existing_user_bet_league.save()
+        # is_last_visited_league to True and DO NOT CREATE ANY NEW BetLeague or BetRound
+        if existing_user_bet_league is not None:
+            # Deactivate the other last visited bet_league in the same UPDATE
+            BetLeague.objects.filter(
+                Q(is_last_visited_league=True) | Q(id=existing_user_bet_league.id),
+                state=True,
+                user=user,
+            ).update(
+                is_last_visited_league=Case(
+                    When(id=existing_user_bet_league.id, then=Value(True)),
+                    default=Value(False),
+                )
+            )
 
             bet_rounds = BetRound.objects.filter(
                 state=True,
@@ -120,8 +233,12 @@ class LeagueBetRoundsMatchResultsCreateApiView(APIView):
             return Response(response_data, status=status.HTTP_200_OK)
 
 
-        # BetLeague, BetRound and MatchResult creation
+        # BetLeague and BetRound creation, a fixed number of statements however many rounds
+        # the league has
         with transaction.atomic():
+            # Deactivate if there is another bet_league instance with last_visited in True
+            BetLeague.objects.deactivate_last_visited_bet_league(user)
+
             # Create bet_league
             new_bet_league = BetLeague.objects.create(
                 user=user, 
@@ -130,21 +247,24 @@ class LeagueBetRoundsMatchResultsCreateApiView(APIView):
             )
 
             # Create bet rounds for the league rounds that are NOT finalized
+            rounds = Round.objects.filter(
+                Q(round_state=Round.NOT_STARTED_ROUND) | 
+                Q(round_state=Round.PENDING_ROUND),
+                state=True,
+                league=league,
+            )
             bet_rounds = [
                 BetRound(round=league_round, bet_league=new_bet_league) 
                 for league_round in rounds
             ]
             BetRound.objects.bulk_create(bet_rounds)
+            add_bet_rounds_on_commit(bet_rounds)
 
-            # Create match results for all the matches in all the bet rounds
-            for bet_round in bet_rounds:
-                matches = Match.objects.filter(round=bet_round.round, state=True)
-                match_results = [MatchResult(match=soccer_match, bet_round=bet_round) for soccer_match in matches]
-                MatchResult.objects.bulk_create(match_results)
+            # MatchResults are created when the user submits the predictions
 
             # Substract user coins
             user.coins = F('coins') - league.coins_cost
-            user.save()
+            user.save(update_fields=['coins'])
 
         response_data = generate_response_data(
             league_name=league.name,
@@ -1,7 +1,6 @@
-import requests
 import json
-from decouple import config
 from django.core.management.base import BaseCommand
+from apps.api.client import api_football_get
 from apps.league.models import League
 
 class Command(BaseCommand):
@@ -10,11 +9,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         league_id = options.get('league_id')
-        url = f'https://v3.football.api-sports.io/leagues?id={league_id}'
-        headers = {
-            'x-apisports-key': config('API_FOOTBALL_KEY')
-        }
-        response = requests.get(url, headers=headers)
+        response = api_football_get('leagues', params={'id': league_id})
         response_obj = json.loads(response.text)
 
         league_response = response_obj.get('response')[0]
@@ -1,9 +1,9 @@
-import requests
 import json
-from decouple import config
 from django.core.management.base import BaseCommand
 from django.shortcuts import get_object_or_404
-from apps.league.models import Team, League
+from apps.api.client import api_football_get
+from apps.league.models import League
+from apps.league.services import import_league_teams
 
 class Command(BaseCommand):
     def add_arguments(self, parser):
@@ -16,33 +16,11 @@ class Command(BaseCommand):
 
         league = get_object_or_404(League, api_league_id=league_id)
 
-        url = f'https://v3.football.api-sports.io/teams?league={league_id}&season={season}'
-        headers = {
-            'x-apisports-key': config('API_FOOTBALL_KEY')
-        }
-        response = requests.get(url, headers=headers)
+        response = api_football_get('teams', params={'league': league_id, 'season': season})
         response_obj = json.loads(response.text)
         print(f'Results: {response_obj.get("results")}')
 
-        number_created_records = 0
-        teams = response_obj.get('response')
-        for team in teams:
-            team_data = team.get('team')
-            id = team_data.get('id')
-            name = team_data.get('name')
-            code = team_data.get('code')
-            logo_url = team_data.get('logo')
-
-            team, was_created = Team.objects.get_or_create(
-                api_team_id=id,
-                defaults={
-                    'name': name,
-                    'acronym': code,
-                    'badge_url': logo_url
-                }
-            )
-            team.leagues.add(league)
-            number_created_records += 1 if was_created else 0
+        number_created_records = import_league_teams(league=league, team_responses=response_obj.get('response'))
 
         print(f'{number_created_records} created records')
         print(response.status_code)
@@ -1,7 +1,6 @@
-import requests
 import json
-from decouple import config
 from django.core.management.base import BaseCommand
+from apps.api.client import api_football_get
 
 class Command(BaseCommand):
     def add_arguments(self, parser):
@@ -9,11 +8,7 @@ class Command(BaseCommand):
     
     def handle(self, *args, **options):
         country = options.get('country')
-        url = f'https://v3.football.api-sports.io/leagues?country={country}'
-        headers = {
-            'x-apisports-key': config('API_FOOTBALL_KEY')
-        }
-        response = requests.get(url, headers=headers)
+        response = api_football_get('leagues', params={'country': country})
         response_obj = json.loads(response.text)
         print(f'Results: {response_obj.get("results")}')
         leagues = response_obj.get('response')
@@ -1,7 +1,6 @@
-import requests
 import json
-from decouple import config
 from django.core.management.base import BaseCommand
+from apps.api.client import api_football_get
 
 class Command(BaseCommand):
     def add_arguments(self, parser):
@@ -14,11 +13,7 @@ class Command(BaseCommand):
         season = options.get('season')
         only_current = options.get('only_current')
 
-        url = f'https://v3.football.api-sports.io/fixtures/rounds?league={league_id}&season={season}&current={only_current}'
-        headers = {
-            'x-apisports-key': config('API_FOOTBALL_KEY')
-        }
-        response = requests.get(url, headers=headers)
+        response = api_football_get('fixtures/rounds', params={'league': league_id, 'season': season, 'current': only_current})
         response_obj = json.loads(response.text)
         print(f'Results: {response_obj.get("results")}')
         print(response.text)
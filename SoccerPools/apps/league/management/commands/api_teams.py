@@ -1,8 +1,7 @@
-import requests
 import json
-from decouple import config
 from django.core.management.base import BaseCommand
 from django.shortcuts import get_object_or_404
+from apps.api.client import api_football_get
 from apps.league.models import Team, League
 
 class Command(BaseCommand):
@@ -14,11 +13,7 @@ class Command(BaseCommand):
         league_id = options.get('league_id')
         season = options.get('season')
 
-        url = f'https://v3.football.api-sports.io/teams?league={league_id}&season={season}'
-        headers = {
-            'x-apisports-key': config('API_FOOTBALL_KEY')
-        }
-        response = requests.get(url, headers=headers)
+        response = api_football_get('teams', params={'league': league_id, 'season': season})
         response_obj = json.loads(response.text)
         print(f'Results: {response_obj.get("results")}')
 
@@ -1,8 +1,11 @@
+from django.db import transaction
 from django.db.models import F
+from utils import generate_unique_field_values
 from apps.bet.models import BetRound
 from apps.app_user.models import CoinGrant
 from apps.bet.services import update_top_three_bet_league_winners
 from apps.notification.utils import send_push_winner
+from .models import Round, Team
 from .utils import get_coins_prizes
 
 def give_referral_earnings(referee_user, prize, competition_name):
@@ -66,4 +69,75 @@ def update_round_winners_prizes(round):
     # Send push notifications to the winners
     send_push_winner(first_user, competition_name, first_prize)
     send_push_winner(second_user, competition_name, second_prize)
-    send_push_winner(third_user, competition_name, third_prize)
\ No newline at end of file
+    send_push_winner(third_user, competition_name, third_prize)
+
+
+def import_league_teams(league, team_responses):
+    """
+        Create the teams of API-Football /teams responses that do not exist yet and link
+        every team of the responses to the league. Slugs are generated for the whole batch
+        at once, and teams and links are written with bulk_create
+
+        Returns the number of created teams
+    """
+    teams_data = {
+        team_response.get('team').get('id'): team_response.get('team') for team_response in team_responses
+    }
+    existing_teams = Team.objects.in_bulk(list(teams_data), field_name='api_team_id')
+    new_teams_data = [
+        team_data for api_team_id, team_data in teams_data.items() if api_team_id not in existing_teams
+    ]
+    slugs = generate_unique_field_values(
+        Team, 'slug', [team_data.get('name') for team_data in new_teams_data]
+    )
+    new_teams = [
+        Team(
+            api_team_id=team_data.get('id'),
+            name=team_data.get('name'),
+            slug=slug,
+            acronym=team_data.get('code'),
+            badge_url=team_data.get('logo'),
+        )
+        for team_data, slug in zip(new_teams_data, slugs)
+    ]
+
+    with transaction.atomic():
+        Team.objects.bulk_create(new_teams)
+        Team.leagues.through.objects.bulk_create(
+            [
+                Team.leagues.through(team_id=team.id, league_id=league.id)
+                for team in list(existing_teams.values()) + new_teams
+            ],
+            ignore_conflicts=True,
+        )
+
+    return len(new_teams)
+
+
+def import_league_rounds(league, api_round_names):
+    """
+        Create the rounds of the received API-Football round names that the league does not
+        have yet, numbered by their position, and its general round if the league has no
+        rounds. Slugs are generated for the whole batch at once and the rounds are written
+        with bulk_create
+
+        Returns the number of created rounds
+    """
+    existing_round_names = set(Round.objects.filter(league=league).values_list('api_round_name', flat=True))
+
+    new_rounds = []
+    # Create a general round if there is no existing rounds for the league
+    if not existing_round_names:
+        new_rounds.append(Round(league=league, number_round=0, name='General', is_general_round=True))
+    for i, api_round_name in enumerate(api_round_names, start=1):
+        if api_round_name not in existing_round_names:
+            new_rounds.append(
+                Round(league=league, api_round_name=api_round_name, name=f'Fecha {i}', number_round=i)
+            )
+
+    slugs = generate_unique_field_values(Round, 'slug', [round.name for round in new_rounds])
+    for round, slug in zip(new_rounds, slugs):
+        round.slug = slug
+    Round.objects.bulk_create(new_rounds)
+
+    return len(new_rounds)
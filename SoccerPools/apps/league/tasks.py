@@ -7,6 +7,7 @@ from django.core.mail import mail_admins
 from apps.match.models import Match
 from apps.notification.utils import send_push_finalized_league, send_push_finalized_round
 from apps.payment.tasks import finalize_paid_round_prizes
+from apps.bet.services import snapshot_league_standings
 from .models import Round, League
 from .services import update_round_winners_prizes
 
@@ -30,7 +31,7 @@ def check_upcoming_rounds():
 def finalize_pending_rounds():
     """
         Finalize all PENDING rounds where all its matches are not NOT_STARTED or PENDING, 
-        and distribute Coin Rewards
+        distribute Coin Rewards and snapshot the season standings of their leagues
     """
 
     pending_rounds = Round.objects.annotate(
@@ -43,17 +44,26 @@ def finalize_pending_rounds():
         )
     ).filter(state=True, round_state=Round.PENDING_ROUND, non_finalized_matches=0)
 
-    with transaction.atomic():
-        for pending_round in pending_rounds:
+    for pending_round in pending_rounds:
+        with transaction.atomic():
+            # The task runs from the match chords, check_match_result and beat. Only the run
+            # that moves the round out of PENDING pays its prizes
+            claimed = Round.objects.filter(
+                id=pending_round.id, round_state=Round.PENDING_ROUND
+            ).update(round_state=Round.FINALIZED_ROUND)
+            if not claimed:
+                continue
+
             update_round_winners_prizes(round=pending_round)
+            if not pending_round.is_general_round:
+                snapshot_league_standings(round=pending_round)
             send_push_finalized_round(round=pending_round)
             logger.info('Finalized round %s in league %s', pending_round.name, pending_round.get_league_name())
-            
-        pending_rounds.update(round_state=Round.FINALIZED_ROUND)
 
-    # Trigger paid round prize distribution for each finalized round
-    for pending_round in pending_rounds:
-        finalize_paid_round_prizes.delay(pending_round.id)
+            # Trigger paid round prize distribution once the round is committed as finalized
+            transaction.on_commit(
+                lambda round_id=pending_round.id: finalize_paid_round_prizes.delay(round_id)
+            )
 
 
 @shared_task
@@ -1,9 +1,75 @@
 from django.test import TestCase
-from apps.league.models import Round
-from apps.league.factories import RoundFactory, LeagueFactory
+from apps.league.models import Round, Team
+from apps.league.factories import RoundFactory, LeagueFactory, TeamFactory
+from apps.league.services import import_league_rounds, import_league_teams
+from utils import generate_unique_field_values
 
 class UpdateRoundWinnersPrizesTest(TestCase):
     def setUp(self):
         self.league = LeagueFactory()
         self.round = RoundFactory(round_state=Round.FINALIZED_ROUND, league=self.league)
         
+
+
+class ImportLeagueTest(TestCase):
+    def setUp(self):
+        self.league = LeagueFactory()
+
+    def test_generate_unique_field_values(self):
+        """Test that collisions with existing rows and inside the batch get a suffix"""
+        TeamFactory(name='River Plate', slug='river-plate')
+
+        slugs = generate_unique_field_values(Team, 'slug', ['River Plate', 'Boca Juniors', 'Boca Juniors'])
+
+        self.assertEqual(len(set(slugs)), 3)
+        self.assertTrue(slugs[0].startswith('river-plate-'))
+        self.assertEqual(slugs[1], 'boca-juniors')
+        self.assertTrue(slugs[2].startswith('boca-juniors-'))
+
+    def test_generate_unique_field_values_empty_slug(self):
+        """Test that values without a slug get a random one without reading every row"""
+        TeamFactory.create_batch(3)
+
+        with self.assertNumQueries(1):
+            slugs = generate_unique_field_values(Team, 'slug', ['???', '!!!'])
+
+        self.assertEqual(len(set(slugs)), 2)
+        self.assertTrue(all(slugs))
+
+    def test_import_league_teams(self):
+        """Test that 20 teams are created and linked with a constant number of queries"""
+        existing_team = TeamFactory(name='Existing', api_team_id=1)
+        team_responses = [
+            {'team': {'id': api_team_id, 'name': f'Team {api_team_id}', 'code': 'TEA', 'logo': None}}
+            for api_team_id in range(1, 21)
+        ]
+
+        with self.assertNumQueries(6):
+            n_created_teams = import_league_teams(league=self.league, team_responses=team_responses)
+
+        self.assertEqual(n_created_teams, 19)
+        self.assertEqual(self.league.teams.count(), 20)
+        self.assertIn(self.league, existing_team.leagues.all())
+        self.assertEqual(Team.objects.get(api_team_id=5).slug, 'team-5')
+
+        # A second import links nothing new
+        self.assertEqual(import_league_teams(league=self.league, team_responses=team_responses), 0)
+        self.assertEqual(self.league.teams.count(), 20)
+
+    def test_import_league_rounds(self):
+        """Test that 38 rounds and the general round are created with a constant number of queries"""
+        api_round_names = [f'Regular Season - {i}' for i in range(1, 39)]
+
+        with self.assertNumQueries(3):
+            n_created_rounds = import_league_rounds(league=self.league, api_round_names=api_round_names)
+
+        self.assertEqual(n_created_rounds, 39)
+        general_round = Round.objects.get(league=self.league, is_general_round=True)
+        self.assertEqual(general_round.number_round, 0)
+        round = Round.objects.get(league=self.league, api_round_name='Regular Season - 38')
+        self.assertEqual((round.name, round.number_round), ('Fecha 38', 38))
+
+        # Only the new round names are created
+        self.assertEqual(
+            import_league_rounds(league=self.league, api_round_names=api_round_names + ['Playoffs']), 1
+        )
@@ -1,3 +1,4 @@
+from unittest.mock import patch
 from django.test import TestCase
 from django.utils.timezone import now, timedelta
 from django.core import mail
@@ -5,6 +6,7 @@ from apps.app_user.factories import AppUserFactory
 from apps.league.factories import LeagueFactory, RoundFactory, TeamFactory
 from apps.match.factories import MatchFactory, MatchResultFactory
 from apps.bet.factories import BetRoundFactory, BetLeagueFactory
+from apps.bet.services import update_round_standings
 from apps.league.models import Round, League
 from apps.match.models import Match
 from apps.app_user.models import CoinGrant
@@ -100,6 +102,7 @@ class FinalizePendingRoundsTest(TestCase):
         self.match_result_2 = MatchResultFactory(match=self.match_3, bet_round=self.bet_round_2, points=2)
         self.match_result_3 = MatchResultFactory(match=self.match_3, bet_round=self.bet_round_3, points=1)
         self.match_result_4 = MatchResultFactory(match=self.match_3, bet_round=self.bet_round_4, points=0)
+        update_round_standings(round_ids=[self.round_2.id])
 
     def test_finalize_pending_rounds(self):
         """
@@ -145,6 +148,28 @@ class FinalizePendingRoundsTest(TestCase):
         self.assertEqual(self.user_3.coins, total_coins_user_3)
         self.assertEqual(self.user_4.coins, total_coins_user_4)
 
+        # The season standings are snapshotted at the close of the round
+        self.assertEqual(
+            list(self.bet_league_1.standings.values_list('round_id', 'rank', 'total_points')),
+            [(self.round_2.id, 1, 3)]
+        )
+        self.assertEqual(
+            list(self.bet_league_4.standings.values_list('round_id', 'rank', 'total_points')),
+            [(self.round_2.id, 4, 0)]
+        )
+
+    @patch('apps.league.tasks.finalize_paid_round_prizes')
+    def test_finalize_pending_rounds_twice(self, mock_finalize_paid_round_prizes):
+        """Test that a round finalized by overlapping runs pays its prizes once"""
+        with self.captureOnCommitCallbacks(execute=True):
+            finalize_pending_rounds()
+        with self.captureOnCommitCallbacks(execute=True):
+            finalize_pending_rounds()
+
+        self.user_1.refresh_from_db()
+        self.assertEqual(self.user_1.coins, self.coins + Round.DEFAULT_MIN_COINS_FIRST)
+        mock_finalize_paid_round_prizes.delay.assert_called_once_with(self.round_2.id)
+
 
 class CheckFinalizedLeaguesTest(TestCase):
     def setUp(self):
@@ -2,6 +2,7 @@ from import_export import resources
 from import_export.admin import ImportExportModelAdmin
 from django.contrib import admin
 from .models import Match, MatchResult
+from .services import correct_match_result
 
 class MatchResources(resources.ModelResource):
     class Meta:
@@ -45,6 +46,19 @@ class MatchResultAdmin(ImportExportModelAdmin, admin.ModelAdmin):
     list_display = ('get_round_name', 'get_user_username', 'get_team_1', 'goals_team_1', 'get_team_2', 'goals_team_2', 'original_result', 'get_league_name',)
     resource_class = MatchResultResources
 
+    def save_model(self, request, obj, form, change):
+        """Corrected official results only rescore the predictions whose points change"""
+        if not (change and obj.original_result and {'goals_team_1', 'goals_team_2'} & set(form.changed_data)):
+            return super().save_model(request, obj, form, change)
+
+        goals_team_1, goals_team_2 = obj.goals_team_1, obj.goals_team_2
+        obj.goals_team_1 = form.initial['goals_team_1']
+        obj.goals_team_2 = form.initial['goals_team_2']
+        super().save_model(request, obj, form, change)
+        match_results_count = correct_match_result(obj.match, goals_team_1, goals_team_2)
+        obj.goals_team_1, obj.goals_team_2 = goals_team_1, goals_team_2
+        self.message_user(request, f'{match_results_count} match results rescored')
+
     def get_team_1(self, obj):
         return obj.match.team_1.name
     get_team_1.admin_order_field = 'match__team_1__name'
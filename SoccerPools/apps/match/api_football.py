@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from collections import defaultdict
+from django.core.cache import cache
+from sentry_sdk import capture_message
+from apps.api.client import TIMEZONE, api_football_get_async, create_async_session
+from apps.api.quota import NORMAL_PRIORITY, QuotaExceeded
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of ids API-Football accepts in the ids parameter of /fixtures
+FIXTURE_IDS_CHUNK_SIZE = 20
+# Requests in flight at the same time
+FIXTURES_CONCURRENCY = 5
+
+# Seconds a fixture response is cached depending on its status.short. Finished fixtures
+# rarely change, live ones change every minute
+FINISHED_STATUSES = ('FT', 'AET', 'PEN')
+LIVE_STATUSES = ('1H', 'HT', '2H', 'ET', 'BT', 'P', 'SUSP', 'INT', 'LIVE')
+FINISHED_FIXTURE_CACHE_TIMEOUT = 60 * 60 * 6
+LIVE_FIXTURE_CACHE_TIMEOUT = 60
+FIXTURE_CACHE_TIMEOUT = 60 * 10
+FIXTURE_CACHE_HITS_KEY = 'fixtures:cache:hits'
+FIXTURE_CACHE_MISSES_KEY = 'fixtures:cache:misses'
+
+async def _fetch_fixtures_chunk(session, semaphore, ids, priority):
+    """
+        Return:
+        The fixture responses of the ids chunk, or an empty list if the request failed
+    """
+    async with semaphore:
+        try:
+            status, response_obj = await api_football_get_async(
+                session, 'fixtures', params={'timezone': TIMEZONE, 'ids': ids}, priority=priority
+            )
+        except QuotaExceeded as err:
+            logger.warning('Fixtures %s deferred: %s', ids, err)
+            return []
+        except Exception as err:
+            capture_message(f'Error getting api response for fixtures {ids}: {str(err)}', level="error")
+            return []
+
+    # API-Football returns an empty list when there are no errors
+    errors = response_obj.get('errors')
+    if errors:
+        logger.error('Error while fetching fixtures %s: %s %s', ids, status, response_obj)
+        return []
+    return response_obj.get('response') or []
+
+
+async def fetch_fixtures_async(api_match_ids, concurrency=FIXTURES_CONCURRENCY, priority=NORMAL_PRIORITY):
+    """
+        Fetch the fixtures of the received api_match_ids with one /fixtures request per
+        FIXTURE_IDS_CHUNK_SIZE ids, keeping up to concurrency requests in flight. Chunks that
+        fail, or that the quota ledger defers for the priority, are logged and skipped, so
+        their fixtures are missing from the result
+
+        Return:
+        {api_match_id: fixture response}
+    """
+    api_match_ids = list(dict.fromkeys(
+        api_match_id for api_match_id in api_match_ids if api_match_id
+    ))
+    ids_chunks = [
+        '-'.join(str(api_match_id) for api_match_id in api_match_ids[i:i + FIXTURE_IDS_CHUNK_SIZE])
+        for i in range(0, len(api_match_ids), FIXTURE_IDS_CHUNK_SIZE)
+    ]
+    if not ids_chunks:
+        return {}
+
+    semaphore = asyncio.Semaphore(concurrency)
+    async with create_async_session(concurrency) as session:
+        chunks_responses = await asyncio.gather(*(
+            _fetch_fixtures_chunk(session, semaphore, ids, priority) for ids in ids_chunks
+        ))
+
+    return {
+        fixture_response.get('fixture').get('id'): fixture_response
+        for fixture_responses in chunks_responses
+        for fixture_response in fixture_responses
+    }
+
+
+def fixture_cache_key(api_match_id):
+    return f'fixture:{api_match_id}'
+
+
+def get_fixture_cache_timeout(fixture_response):
+    short = fixture_response.get('fixture').get('status', {}).get('short')
+    if short in FINISHED_STATUSES:
+        return FINISHED_FIXTURE_CACHE_TIMEOUT
+    if short in LIVE_STATUSES:
+        return LIVE_FIXTURE_CACHE_TIMEOUT
+    return FIXTURE_CACHE_TIMEOUT
+
+
+def _count_fixture_cache(key, value):
+    if value:
+        # incr fails on a missing key
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, value)
+
+
+def get_fixture_cache_stats():
+    """
+        Return:
+        {'hits': int, 'misses': int} -> Every hit is an API-Football fixture we did not request
+    """
+    stats = cache.get_many([FIXTURE_CACHE_HITS_KEY, FIXTURE_CACHE_MISSES_KEY])
+    return {
+        'hits': stats.get(FIXTURE_CACHE_HITS_KEY, 0),
+        'misses': stats.get(FIXTURE_CACHE_MISSES_KEY, 0),
+    }
+
+
+def fetch_fixtures(api_match_ids, priority=NORMAL_PRIORITY):
+    """
+        Blocking entry point of fetch_fixtures_async for the Celery tasks. Fixtures are read
+        from the cache first and only the missing ones are requested, the responses are
+        cached with a timeout that depends on their status
+
+        Return:
+        {api_match_id: fixture response}
+    """
+    api_match_ids = list(dict.fromkeys(
+        api_match_id for api_match_id in api_match_ids if api_match_id
+    ))
+    cached = cache.get_many([fixture_cache_key(api_match_id) for api_match_id in api_match_ids])
+    fixtures = {
+        api_match_id: cached[fixture_cache_key(api_match_id)]
+        for api_match_id in api_match_ids if fixture_cache_key(api_match_id) in cached
+    }
+    missing_ids = [api_match_id for api_match_id in api_match_ids if api_match_id not in fixtures]
+    _count_fixture_cache(FIXTURE_CACHE_HITS_KEY, len(fixtures))
+    _count_fixture_cache(FIXTURE_CACHE_MISSES_KEY, len(missing_ids))
+    if not missing_ids:
+        return fixtures
+
+    fetched = asyncio.run(fetch_fixtures_async(missing_ids, priority=priority))
+    by_timeout = defaultdict(dict)
+    for api_match_id, fixture_response in fetched.items():
+        by_timeout[get_fixture_cache_timeout(fixture_response)][fixture_cache_key(api_match_id)] = fixture_response
+    for timeout, values in by_timeout.items():
+        cache.set_many(values, timeout)
+
+    fixtures.update(fetched)
+    return fixtures
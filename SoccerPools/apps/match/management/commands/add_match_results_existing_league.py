@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from apps.league.models import League
 from apps.match.models import Match, MatchResult
@@ -38,12 +39,19 @@ class Command(BaseCommand):
                 # If there is no match results it means a new match was added, so we create the match 
                 match_results_count = match_results.count()
                 if match_results_count == 0:
-                    bet_rounds = round.bet_rounds.all()
+                    # Free predictions are created when they are submitted, only the paid
+                    # BetRounds address their predictions by id
+                    bet_rounds = round.bet_rounds.filter(
+                        state=True,
+                        bet_league__user__paid_bet_rounds__round=round,
+                        bet_league__user__paid_bet_rounds__state=True,
+                    ).annotate(paid_bet_round_id=F('bet_league__user__paid_bet_rounds__id'))
                     for bet_round in bet_rounds:
                         print(f'Creating match results for round {round.name}, and match {match}')
                         match_result = MatchResult.objects.create(
                             match=match,
                             bet_round=bet_round,
+                            paid_bet_round_id=bet_round.paid_bet_round_id,
                         )
                         print(f'Match result created: {match_result}')
                         n_match_results_created += 1
@@ -1,11 +1,11 @@
-import requests
 import json
-from decouple import config
 from django.core.management.base import BaseCommand
-from django.http import Http404
 from django.shortcuts import get_object_or_404
-from apps.league.models import Round, Team, League
+from apps.api.client import TIMEZONE, api_football_get
+from apps.league.models import League
 from apps.match.models import Match
+from apps.match.services import sync_league_fixtures
+from apps.match.tasks import schedule_match_tasks
 
 class Command(BaseCommand):
     def add_arguments(self, parser):
@@ -14,57 +14,30 @@ class Command(BaseCommand):
         parser.add_argument('round', type=str, nargs='?')
     
     def handle(self, *args, **options):
-        TIMEZONE = 'America/Argentina/Ushuaia'
         league_id = options.get('league_id')
         season = options.get('season')
         round = options.get('round')
 
         league = get_object_or_404(League, state=True, api_league_id=league_id)
 
-        url = f'https://v3.football.api-sports.io/fixtures?league={league_id}&season={season}&timezone={TIMEZONE}'
+        params = {'league': league_id, 'season': season, 'timezone': TIMEZONE}
         print(round)
         if round:
-            url = url + f'&round={round}'
-            print(url)
-        headers = {
-            'x-apisports-key': config('API_FOOTBALL_KEY')
-        }
-        response = requests.get(url, headers=headers)
+            params['round'] = round
+        response = api_football_get('fixtures', params=params)
         response_obj = json.loads(response.text)
         print(f'Results: {response_obj.get("results")}')
 
-        matches = response_obj.get('response')
-        n_created_matches = 0
-        for match in matches:
-            fixture_data = match.get('fixture')
-            fixture_id = fixture_data.get('id')
-            start_date = fixture_data.get('date')
-            fixture_status = fixture_data.get('status')
-            long = fixture_status.get('long')
-            short = fixture_status.get('short')
-            round = match.get('league').get('round')
-            teams = match.get('teams')
-            home_id = teams.get('home').get('id')
-            away_id = teams.get('away').get('id')
+        summary = sync_league_fixtures(league=league, fixture_responses=response_obj.get('response'))
+        updated_not_started = [
+            match for match in summary['updated'] if match.match_state == Match.NOT_STARTED_MATCH
+        ]
+        for match in summary['created'] + updated_not_started:
+            schedule_match_tasks(match)
 
-            if short in ['TBD', 'NS']:
-                try:
-                    round = get_object_or_404(Round, state=True, league=league, api_round_name=round)
-                except Http404:
-                    print(f'Round {round} does not exist for league {league}')
-                    continue
-                team_1 = get_object_or_404(Team, state=True, leagues=league, api_team_id=home_id)
-                team_2 = get_object_or_404(Team, state=True, leagues=league, api_team_id=away_id)
-
-                new_match, was_created = Match.objects.get_or_create(
-                    round=round,
-                    team_1=team_1,
-                    team_2=team_2,
-                    api_match_id=fixture_id,
-                    defaults={
-                        'start_date': start_date
-                    }
-                )
-                n_created_matches += 1 if was_created else 0
-        
-        print(f'{n_created_matches} Matches created, league {league}')
\ No newline at end of file
+        for fixture_id, reason in summary['skipped']:
+            print(f'Fixture {fixture_id} skipped: {reason}')
+        print(
+            f'{len(summary["created"])} Matches created, {len(summary["updated"])} updated, '
+            f'{summary["unchanged"]} unchanged, league {league}'
+        )
@@ -1,7 +1,6 @@
-import requests
 import json
-from decouple import config
 from django.core.management.base import BaseCommand
+from apps.api.client import TIMEZONE, api_football_get
 
 class Command(BaseCommand):
     def add_arguments(self, parser):
@@ -10,19 +9,15 @@ class Command(BaseCommand):
         parser.add_argument('round', type=str, nargs='?')
     
     def handle(self, *args, **options):
-        TIMEZONE = 'America/Argentina/Ushuaia'
         league_id = options.get('league_id')
         season = options.get('season')
         round = options.get('round')
 
-        url = f'https://v3.football.api-sports.io/fixtures?league={league_id}&season={season}&timezone={TIMEZONE}'
+        params = {'league': league_id, 'season': season, 'timezone': TIMEZONE}
         print(round)
         if round:
-            url = f'{url}&round={round}'
-        headers = {
-            'x-apisports-key': config('API_FOOTBALL_KEY')
-        }
-        response = requests.get(url, headers=headers)
+            params['round'] = round
+        response = api_football_get('fixtures', params=params)
         response_obj = json.loads(response.text)
         print(f'Results: {response_obj.get("results")}')
 
@@ -0,0 +1,80 @@
+import random
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from apps.league.models import League, Round, Team
+from apps.match.models import Match, MatchResult
+from apps.match.services import score_match_results
+from apps.match.utils import get_match_result_points
+
+class Command(BaseCommand):
+    """
+        Compare the row by row scoring of a finalized match against the single UPDATE of
+        score_match_results. Every record created is rolled back at the end
+    """
+    def add_arguments(self, parser):
+        parser.add_argument('--predictions', type=int, default=100000)
+        parser.add_argument(
+            '--per-row-sample', type=int, default=5000,
+            help='Number of predictions scored row by row, the total time is extrapolated'
+        )
+
+    def handle(self, *args, **options):
+        n_predictions = options.get('predictions')
+        per_row_sample = min(options.get('per_row_sample'), n_predictions)
+
+        with transaction.atomic():
+            league = League.objects.create(name='Benchmark League')
+            round = Round.objects.create(name='Benchmark Round', league=league)
+            team_1 = Team.objects.create(name='Benchmark Home')
+            team_2 = Team.objects.create(name='Benchmark Away')
+            match = Match.objects.create(round=round, team_1=team_1, team_2=team_2)
+            original_match_result = MatchResult.objects.create(
+                match=match, original_result=True, goals_team_1=2, goals_team_2=1
+            )
+
+            goals_choices = [None, 0, 1, 2, 3]
+            MatchResult.objects.bulk_create([
+                MatchResult(
+                    match=match,
+                    goals_team_1=random.choice(goals_choices),
+                    goals_team_2=random.choice(goals_choices),
+                )
+                for _ in range(n_predictions)
+            ], batch_size=5000)
+            self.stdout.write(f'{n_predictions} predictions created')
+
+            # Row by row scoring, as finalize_matches used to do
+            match_results = MatchResult.objects.filter(
+                match=match, original_result=False
+            )[:per_row_sample]
+            start = perf_counter()
+            for match_result in match_results:
+                match_result.points = get_match_result_points(
+                    user_goals_team_1=match_result.goals_team_1,
+                    user_goals_team_2=match_result.goals_team_2,
+                    original_goals_team_1=original_match_result.goals_team_1,
+                    original_goals_team_2=original_match_result.goals_team_2
+                )
+                match_result.is_exact = match_result.points == 3
+                match_result.save()
+            per_row_seconds = perf_counter() - start
+            per_row_total_seconds = per_row_seconds / per_row_sample * n_predictions
+
+            # Set based scoring
+            start = perf_counter()
+            n_updated = score_match_results(original_match_results=[original_match_result])
+            set_based_seconds = perf_counter() - start
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f'Row by row: {per_row_seconds:.2f}s for {per_row_sample} predictions, '
+            f'~{per_row_total_seconds:.2f}s extrapolated to {n_predictions}'
+        )
+        self.stdout.write(
+            f'Single UPDATE: {set_based_seconds * 1000:.1f}ms for {n_updated} predictions'
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Speedup: x{per_row_total_seconds / set_based_seconds:.0f}')
+        )
@@ -0,0 +1,61 @@
+import numpy as np
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from apps.match.scoring import score_predictions
+from apps.match.utils import get_match_result_points
+
+class Command(BaseCommand):
+    """Compare the scalar get_match_result_points loop against the vectorized scoring engine"""
+    def add_arguments(self, parser):
+        parser.add_argument('--predictions', type=int, default=1000000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        n_predictions = options.get('predictions')
+        rng = np.random.default_rng(options.get('seed'))
+
+        predicted_goals_team_1 = rng.integers(0, 5, n_predictions, dtype=np.int16)
+        predicted_goals_team_2 = rng.integers(0, 5, n_predictions, dtype=np.int16)
+        original_goals_team_1 = rng.integers(0, 5, n_predictions, dtype=np.int16)
+        original_goals_team_2 = rng.integers(0, 5, n_predictions, dtype=np.int16)
+        null_mask = rng.random(n_predictions) < 0.1
+
+        # The scalar function receives the python values the ORM would give it
+        scalar_rows = list(zip(
+            [None if is_null else goals for goals, is_null in zip(predicted_goals_team_1.tolist(), null_mask)],
+            predicted_goals_team_2.tolist(),
+            original_goals_team_1.tolist(),
+            original_goals_team_2.tolist(),
+        ))
+
+        start = perf_counter()
+        scalar_points = [
+            get_match_result_points(
+                user_goals_team_1=user_goals_team_1,
+                user_goals_team_2=user_goals_team_2,
+                original_goals_team_1=goals_team_1,
+                original_goals_team_2=goals_team_2
+            )
+            for user_goals_team_1, user_goals_team_2, goals_team_1, goals_team_2 in scalar_rows
+        ]
+        scalar_seconds = perf_counter() - start
+
+        start = perf_counter()
+        points, _ = score_predictions(
+            predicted_goals_team_1=predicted_goals_team_1,
+            predicted_goals_team_2=predicted_goals_team_2,
+            original_goals_team_1=original_goals_team_1,
+            original_goals_team_2=original_goals_team_2,
+            null_mask=null_mask,
+        )
+        vectorized_seconds = perf_counter() - start
+
+        if not np.array_equal(points, np.array(scalar_points)):
+            self.stdout.write(self.style.ERROR('Vectorized points differ from the scalar function'))
+            return
+
+        self.stdout.write(f'Scalar loop: {scalar_seconds * 1000:.1f}ms for {n_predictions} predictions')
+        self.stdout.write(f'Vectorized: {vectorized_seconds * 1000:.1f}ms for {n_predictions} predictions')
+        self.stdout.write(
+            self.style.SUCCESS(f'Speedup: x{scalar_seconds / vectorized_seconds:.0f}, results identical')
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.shortcuts import get_object_or_404
+from apps.match.models import Match
+from apps.match.services import correct_match_result
+
+
+class Command(BaseCommand):
+    """
+        Command to correct the official result of a match. Only the match results whose
+        points change are rescored and the standings are updated with their deltas
+    """
+    def add_arguments(self, parser):
+        parser.add_argument('match_id', type=int)
+        parser.add_argument('goals_team_1', type=int)
+        parser.add_argument('goals_team_2', type=int)
+
+    def handle(self, *args, **options):
+        match = get_object_or_404(
+            Match.objects.select_related('round', 'team_1', 'team_2'), id=options['match_id'], state=True
+        )
+        match_results_count = correct_match_result(
+            match, goals_team_1=options['goals_team_1'], goals_team_2=options['goals_team_2']
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS('Successfully rescored "%s" match results' % match_results_count)
+        )
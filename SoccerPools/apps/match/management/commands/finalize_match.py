@@ -2,67 +2,62 @@ from sentry_sdk import capture_message
 from django.core.management.base import BaseCommand
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from apps.match.utils import get_match_result_points
+from apps.match.services import score_match_results
 from apps.match.models import MatchResult, Match
+from apps.bet.services import lock_round_standings, update_round_standings
 from apps.notification.utils import send_push_nots_match
 
 
 class Command(BaseCommand):
-    """Command to manually finalize a match and update all match results"""
+    """Command to manually finalize one or more matches and update all their match results"""
     def add_arguments(self, parser):
-        parser.add_argument('match_id', type=int)
-    
-    def handle(self, *args, **options):
-        # Get the Match based on the match_id provided
-        match_id = options['match_id']
-        match = get_object_or_404(Match, id=match_id, state=True)
+        parser.add_argument('match_ids', type=int, nargs='+')
 
-        # Get the original match result and all user match results
-        original_match_result = get_object_or_404(MatchResult, 
-            state=True, 
-            match=match,
-            original_result=True
-        )
-        user_match_results = MatchResult.objects.filter(
-            state=True,
-            match=match,
-            original_result=False
-        )
-
-        try:
-            # Send push notifications to inform about the finalized match
-            send_push_nots_match(
-                team_1_name=match.team_1.name, 
-                team_2_name=match.team_2.name, 
-                goals_home=original_match_result.goals_team_1, 
-                goals_away=original_match_result.goals_team_2, 
-                league=match.round.league
+    def handle(self, *args, **options):
+        original_match_results = []
+        for match_id in options['match_ids']:
+            # Get the Match based on the match_id provided
+            match = get_object_or_404(Match, id=match_id, state=True)
+
+            # Get the original match result
+            original_match_result = get_object_or_404(MatchResult,
+                state=True,
+                match=match,
+                original_result=True
             )
-        except Exception as err:
-            capture_message(f'Error sending push nots: {str(err)}', level="error")
+            original_match_results.append(original_match_result)
+
+            try:
+                # Send push notifications to inform about the finalized match
+                send_push_nots_match(
+                    team_1_name=match.team_1.name,
+                    team_2_name=match.team_2.name,
+                    goals_home=original_match_result.goals_team_1,
+                    goals_away=original_match_result.goals_team_2,
+                    league=match.round.league
+                )
+            except Exception as err:
+                capture_message(f'Error sending push nots: {str(err)}', level="error")
+
+        match_ids = [original.match_id for original in original_match_results]
+        with transaction.atomic():
+            # Lock the matches, then their rounds, in the same order as finalize_pending_match so
+            # the stored standings are not rewritten by a concurrent task
+            round_ids = set(
+                Match.objects.select_for_update().filter(id__in=match_ids)
+                .order_by('id').values_list('round_id', flat=True)
+            )
+            lock_round_standings(round_ids=round_ids)
 
-        match_results_count = 0
-        with transaction.atomic(): 
-            match_results_count += user_match_results.count()
+            # Update the points of all the user match results in a single query
+            match_results_count = score_match_results(original_match_results=original_match_results)
 
-            # Update the points for each user match result
-            for match_result in user_match_results:
-                match_result.points = get_match_result_points(
-                    user_goals_team_1=match_result.goals_team_1,
-                    user_goals_team_2=match_result.goals_team_2,
-                    original_goals_team_1=original_match_result.goals_team_1,
-                    original_goals_team_2=original_match_result.goals_team_2
-                )
-            MatchResult.objects.bulk_update(user_match_results, ['points'])
+            # Update the matches state to FINALIZED_MATCH
+            Match.objects.filter(id__in=match_ids).update(match_state=Match.FINALIZED_MATCH)
 
-            # Update the match state to FINALIZED_MATCH
-            match.match_state = Match.FINALIZED_MATCH
-            match.save()
+            # Refresh the stored standings of the matches rounds
+            update_round_standings(round_ids=round_ids)
 
         self.stdout.write(
             self.style.SUCCESS('Successfully updated "%s" match results' % match_results_count)
         )
-
-        
-
- 
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from apps.match.api_football import get_fixture_cache_stats
+
+class Command(BaseCommand):
+    """Print the hits and misses of the fixture response cache"""
+    def handle(self, *args, **options):
+        stats = get_fixture_cache_stats()
+        total = stats['hits'] + stats['misses']
+        hit_rate = stats['hits'] / total * 100 if total else 0
+
+        self.stdout.write(f'Hits: {stats["hits"]} - Misses: {stats["misses"]}')
+        self.stdout.write(self.style.SUCCESS(f'Hit rate: {hit_rate:.1f}%, {stats["hits"]} fixture requests saved'))
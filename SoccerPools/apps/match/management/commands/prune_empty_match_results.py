@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from apps.match.models import MatchResult
+
+PRUNE_BATCH_SIZE = 5000
+
+class Command(BaseCommand):
+    """
+        Delete the empty MatchResults that were created when users joined a league. A
+        prediction is only stored once it is submitted and a missing one scores 0 points,
+        the paid rounds predictions are kept because they are addressed by id
+    """
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report the rows without deleting them')
+
+    def handle(self, *args, **options):
+        empty_match_results = MatchResult.objects.filter(
+            original_result=False,
+            goals_team_1__isnull=True,
+            goals_team_2__isnull=True,
+            points=0,
+            paid_bet_round__isnull=True,
+        )
+
+        if options.get('dry_run'):
+            self.stdout.write(f'{empty_match_results.count()} empty match results to delete')
+            return
+
+        deleted_count = 0
+        while True:
+            ids = list(empty_match_results.values_list('id', flat=True)[:PRUNE_BATCH_SIZE])
+            if not ids:
+                break
+            deleted_count += MatchResult.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(
+            self.style.SUCCESS('Successfully deleted "%s" empty match results' % deleted_count)
+        )
@@ -0,0 +1,83 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.shortcuts import get_object_or_404
+from django.db import transaction
+from apps.league.models import League
+from apps.match.models import Match, MatchResult
+from apps.match.scoring import goals_to_array, score_predictions
+from apps.bet.services import lock_round_standings, update_round_standings
+
+class Command(BaseCommand):
+    """
+        Re-score every prediction of the finalized matches of a league and write back only
+        the match results whose points or exact flag changed
+    """
+    def add_arguments(self, parser):
+        parser.add_argument('league_id', type=int, help='League ID')
+        parser.add_argument('--dry-run', action='store_true', help='Report changes without saving')
+
+    def handle(self, *args, **options):
+        league_id = options.get('league_id')
+        dry_run = options.get('dry_run')
+        league = get_object_or_404(League, state=True, api_league_id=league_id)
+
+        original_goals = {
+            match_id: (goals_team_1, goals_team_2)
+            for match_id, goals_team_1, goals_team_2 in MatchResult.objects.filter(
+                state=True,
+                original_result=True,
+                match__round__league=league,
+                match__match_state=Match.FINALIZED_MATCH,
+                goals_team_1__isnull=False,
+                goals_team_2__isnull=False,
+            ).values_list('match_id', 'goals_team_1', 'goals_team_2')
+        }
+
+        rows = list(MatchResult.objects.filter(
+            state=True,
+            original_result=False,
+            match_id__in=original_goals.keys(),
+        ).values_list('id', 'match_id', 'goals_team_1', 'goals_team_2', 'points', 'is_exact'))
+
+        if not rows:
+            self.stdout.write(f'No predictions to re-score for {league}')
+            return
+
+        ids, match_ids, goals_team_1, goals_team_2, points, is_exact = zip(*rows)
+        goals_team_1, null_mask_team_1 = goals_to_array(goals_team_1)
+        goals_team_2, null_mask_team_2 = goals_to_array(goals_team_2)
+        original_goals_team_1 = np.array([original_goals[match_id][0] for match_id in match_ids])
+        original_goals_team_2 = np.array([original_goals[match_id][1] for match_id in match_ids])
+
+        new_points, new_is_exact = score_predictions(
+            predicted_goals_team_1=goals_team_1,
+            predicted_goals_team_2=goals_team_2,
+            original_goals_team_1=original_goals_team_1,
+            original_goals_team_2=original_goals_team_2,
+            null_mask=null_mask_team_1 | null_mask_team_2,
+        )
+        changed = np.flatnonzero(
+            (new_points != np.array(points)) | (new_is_exact != np.array(is_exact))
+        )
+        self.stdout.write(f'{len(changed)} of {len(rows)} predictions changed for {league}')
+
+        if dry_run or not len(changed):
+            return
+
+        changed_match_results = [
+            MatchResult(id=ids[i], points=int(new_points[i]), is_exact=bool(new_is_exact[i]))
+            for i in changed
+        ]
+        round_ids = set(
+            Match.objects.filter(
+                id__in={match_ids[i] for i in changed}
+            ).values_list('round_id', flat=True)
+        )
+        with transaction.atomic():
+            lock_round_standings(round_ids=round_ids)
+            MatchResult.objects.bulk_update(
+                changed_match_results, ['points', 'is_exact'], batch_size=1000
+            )
+            update_round_standings(round_ids=round_ids)
+
+        self.stdout.write(self.style.SUCCESS(f'{len(changed)} predictions re-scored'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.shortcuts import get_object_or_404
+from django.utils.timezone import now
+from apps.league.models import League
+from apps.match.models import Match
+from apps.match.tasks import schedule_match_tasks
+
+class Command(BaseCommand):
+    """
+        Enqueue the kickoff tasks of the upcoming matches of a league that are due soon, the
+        schedule_kickoff_tasks beat task enqueues the rest as their start gets close
+    """
+    def add_arguments(self, parser):
+        parser.add_argument('league_id', type=int)
+
+    def handle(self, *args, **options):
+        league = get_object_or_404(League, state=True, api_league_id=options.get('league_id'))
+        matches = Match.objects.filter(
+            state=True,
+            round__league=league,
+            match_state=Match.NOT_STARTED_MATCH,
+            start_date__gt=now(),
+        )
+
+        for match in matches:
+            schedule_match_tasks(match)
+
+        self.stdout.write(self.style.SUCCESS(f'Kickoff tasks scheduled for {len(matches)} matches of {league}'))
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+from django.db.models import Case, Count, IntegerField, Value, When
+
+
+def dedupe_match_results(apps, schema_editor):
+    """
+        Keep one MatchResult per (bet_round, match) before the constraint is added, the one
+        with a submitted prediction and the latest one among them
+    """
+    MatchResult = apps.get_model('match', 'MatchResult')
+
+    duplicates = MatchResult.objects.filter(bet_round__isnull=False).values(
+        'bet_round_id', 'match_id'
+    ).annotate(count=Count('id')).filter(count__gt=1).order_by()
+    for duplicate in duplicates.iterator():
+        match_result_ids = list(MatchResult.objects.filter(
+            bet_round_id=duplicate['bet_round_id'], match_id=duplicate['match_id']
+        ).order_by(
+            Case(
+                When(goals_team_1__isnull=False, goals_team_2__isnull=False, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField()
+            ),
+            '-id'
+        ).values_list('id', flat=True))
+        MatchResult.objects.filter(id__in=match_result_ids[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0015_add_paid_bet_round_fk'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_match_results, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='matchresult',
+            constraint=models.UniqueConstraint(fields=('bet_round', 'match'), name='matchresult_bet_round_match_unique'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.9 on 2026-10-18 14:02
+
+from django.db import migrations
+from django.utils.timezone import now
+
+TASK_NAME = 'Schedule kickoff tasks'
+
+
+def add_schedule_kickoff_tasks(apps, schema_editor):
+    """Run schedule_kickoff_tasks every 10 minutes, it enqueues the kickoff tasks within its horizon"""
+    IntervalSchedule = apps.get_model('django_celery_beat', 'IntervalSchedule')
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTasks = apps.get_model('django_celery_beat', 'PeriodicTasks')
+
+    interval, _ = IntervalSchedule.objects.get_or_create(every=10, period='minutes')
+    PeriodicTask.objects.update_or_create(
+        name=TASK_NAME,
+        defaults={'task': 'apps.match.tasks.schedule_kickoff_tasks', 'interval': interval, 'enabled': True},
+    )
+    # The historical models skip the signals that tell beat to reload its schedule
+    PeriodicTasks.objects.update_or_create(ident=1, defaults={'last_update': now()})
+
+
+def remove_schedule_kickoff_tasks(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTasks = apps.get_model('django_celery_beat', 'PeriodicTasks')
+
+    PeriodicTask.objects.filter(name=TASK_NAME).delete()
+    PeriodicTasks.objects.update_or_create(ident=1, defaults={'last_update': now()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0016_matchresult_bet_round_match_unique'),
+        ('django_celery_beat', '0019_alter_periodictasks_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_schedule_kickoff_tasks, remove_schedule_kickoff_tasks),
+    ]
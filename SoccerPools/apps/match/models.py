@@ -66,4 +66,8 @@ class MatchResult(BaseModel):
     
     class Meta:
         verbose_name = 'Match Result'
-        verbose_name_plural = 'Match results'
\ No newline at end of file
+        verbose_name_plural = 'Match results'
+        constraints = [
+            # Predictions are created when submitted, upserting on the bet round and match
+            models.UniqueConstraint(fields=['bet_round', 'match'], name='matchresult_bet_round_match_unique'),
+        ]
\ No newline at end of file
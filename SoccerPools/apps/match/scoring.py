@@ -0,0 +1,58 @@
+import numpy as np
+
+EXACT_RESULT_POINTS = 3
+OUTCOME_POINTS = 1
+
+def goals_to_array(goals):
+    """
+        Convert a sequence of goals that may contain None into a columnar int array and its
+        null mask
+
+        Return:
+        goals_array -> int16 array with 0 in the null positions
+        null_mask -> bool array, True where the goal was None
+    """
+    null_mask = np.fromiter((goal is None for goal in goals), dtype=bool, count=len(goals))
+    goals_array = np.fromiter(
+        (0 if goal is None else goal for goal in goals), dtype=np.int16, count=len(goals)
+    )
+    return goals_array, null_mask
+
+
+def score_predictions(predicted_goals_team_1, predicted_goals_team_2, original_goals_team_1,
+    original_goals_team_2, null_mask=None):
+    """
+        Vectorized version of apps.match.utils.get_match_result_points
+
+        The original goals can be scalars (one match) or arrays aligned with the predictions
+        (a batch of matches). null_mask marks the predictions with any goal missing, which
+        always score 0 points
+
+        Return:
+        points -> uint8 array with 3 for exact results, 1 for the same outcome and 0 otherwise
+        is_exact -> bool array, True where points is 3
+    """
+    predicted_goals_team_1 = np.asarray(predicted_goals_team_1, dtype=np.int16)
+    predicted_goals_team_2 = np.asarray(predicted_goals_team_2, dtype=np.int16)
+    original_goals_team_1 = np.asarray(original_goals_team_1, dtype=np.int16)
+    original_goals_team_2 = np.asarray(original_goals_team_2, dtype=np.int16)
+
+    is_exact = (
+        (predicted_goals_team_1 == original_goals_team_1) &
+        (predicted_goals_team_2 == original_goals_team_2)
+    )
+    same_outcome = (
+        np.sign(predicted_goals_team_1 - predicted_goals_team_2) ==
+        np.sign(original_goals_team_1 - original_goals_team_2)
+    )
+
+    points = np.where(
+        is_exact, EXACT_RESULT_POINTS, np.where(same_outcome, OUTCOME_POINTS, 0)
+    ).astype(np.uint8)
+
+    if null_mask is not None:
+        null_mask = np.asarray(null_mask, dtype=bool)
+        points[null_mask] = 0
+        is_exact = is_exact & ~null_mask
+
+    return points, is_exact
@@ -13,6 +13,8 @@ class MatchSerializer(serializers.ModelSerializer):
 
 class MatchResultSerializer(serializers.ModelSerializer):
     match = MatchSerializer(read_only=True)
+    # Identifies the predictions without a MatchResult yet (id None) when they are submitted
+    match_id = serializers.IntegerField(read_only=True)
     class Meta:
         model = MatchResult
-        fields = ('id', 'goals_team_1', 'goals_team_2', 'match', 'points')
\ No newline at end of file
+        fields = ('id', 'goals_team_1', 'goals_team_2', 'match', 'match_id', 'points')
\ No newline at end of file
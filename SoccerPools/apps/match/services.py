@@ -0,0 +1,372 @@
+import logging
+from collections import defaultdict
+from dateutil.parser import parse as parse_date
+from django.db import transaction
+from django.db.models import (
+    Case, When, Value, Q, F, OuterRef, Subquery, BooleanField, PositiveSmallIntegerField
+)
+from django.db.models.functions import Coalesce
+from django.utils.timezone import localtime, now
+from sentry_sdk import capture_message
+from apps.league.models import Round, Team
+from apps.bet.models import BetRound
+from apps.bet.services import apply_standings_deltas, lock_round_standings
+from .models import Match, MatchResult
+from .utils import get_match_result_points
+
+logger = logging.getLogger(__name__)
+
+def get_outcome_filter(goals_team_1, goals_team_2):
+    """
+        Return the Q filter for the MatchResults that predict the same outcome (home win,
+        draw or away win) as the received goals
+    """
+    if goals_team_1 > goals_team_2:
+        return Q(goals_team_1__gt=F('goals_team_2'))
+    if goals_team_1 < goals_team_2:
+        return Q(goals_team_1__lt=F('goals_team_2'))
+    return Q(goals_team_1=F('goals_team_2'))
+
+
+def score_match_results(original_match_results):
+    """
+        Update points and is_exact of every user MatchResult of the received original results
+        matches in a single UPDATE, following the rules of get_match_result_points:
+        exact result -> 3, same outcome -> 1, otherwise or any null goal -> 0
+
+        Returns the number of MatchResults updated
+    """
+    exact_whens = []
+    outcome_whens = []
+    match_ids = []
+    for original_match_result in original_match_results:
+        goals_team_1 = original_match_result.goals_team_1
+        goals_team_2 = original_match_result.goals_team_2
+        if goals_team_1 is None or goals_team_2 is None:
+            logger.warning(
+                'Original result of match %s has no goals, skipping scoring',
+                original_match_result.match_id
+            )
+            continue
+
+        match_filter = Q(match_id=original_match_result.match_id)
+        exact_whens.append(
+            When(match_filter & Q(goals_team_1=goals_team_1, goals_team_2=goals_team_2), then=Value(3))
+        )
+        outcome_whens.append(
+            When(match_filter & get_outcome_filter(goals_team_1, goals_team_2), then=Value(1))
+        )
+        match_ids.append(original_match_result.match_id)
+
+    if not match_ids:
+        return 0
+
+    # Null predicted goals never satisfy a comparison, so they fall to the default 0 points
+    return MatchResult.objects.filter(
+        match_id__in=match_ids,
+        original_result=False,
+        state=True,
+    ).update(
+        points=Case(
+            *exact_whens, *outcome_whens,
+            default=Value(0),
+            output_field=PositiveSmallIntegerField()
+        ),
+        is_exact=Case(
+            *[When(exact_when.condition, then=Value(True)) for exact_when in exact_whens],
+            default=Value(False),
+            output_field=BooleanField()
+        ),
+    )
+
+
+def get_bet_round_match_results(bet_round):
+    """
+        Predictions are only stored once a user submits them. Return the MatchResults of
+        bet_round for every match of its round ordered by start_date, with an unsaved empty
+        MatchResult (id None) for the matches that have no prediction yet
+    """
+    matches = Match.objects.filter(
+        round_id=bet_round.round_id, state=True
+    ).select_related('team_1', 'team_2', 'round__league').order_by('start_date', 'id')
+    predictions = {
+        match_result.match_id: match_result
+        for match_result in MatchResult.objects.filter(bet_round=bet_round, state=True)
+    }
+
+    match_results = []
+    for match in matches:
+        match_result = predictions.get(match.id) or MatchResult(match=match, bet_round=bet_round)
+        match_result.match = match
+        match_results.append(match_result)
+    return match_results
+
+
+def materialize_match_results(bet_round, matches):
+    """
+        Create the empty MatchResults of bet_round for the received matches that do not
+        have one yet, for the paid rounds that address their predictions by id
+    """
+    MatchResult.objects.bulk_create(
+        [MatchResult(bet_round=bet_round, match=match) for match in matches],
+        ignore_conflicts=True,
+    )
+
+
+def create_match_results(user, new_goals):
+    """
+        Create the MatchResults of the user for {match_id: (goals_team_1, goals_team_2)} of
+        matches that have not started, in the BetRounds of the user for their rounds.
+        A prediction submitted twice at the same time updates the existing MatchResult.
+        Matches that already started are skipped like the updates of existing predictions
+
+        Return:
+        Ids of the received matches that do not exist or are not in a BetRound of the user
+    """
+    matches = Match.objects.filter(id__in=new_goals, state=True).only('id', 'round_id', 'start_date')
+    bet_round_ids = dict(BetRound.objects.filter(
+        round_id__in={match.round_id for match in matches},
+        bet_league__user=user,
+        state=True
+    ).values_list('round_id', 'id'))
+    user_matches = [match for match in matches if match.round_id in bet_round_ids]
+
+    match_results = [
+        MatchResult(
+            bet_round_id=bet_round_ids[match.round_id],
+            match_id=match.id,
+            goals_team_1=new_goals[match.id][0],
+            goals_team_2=new_goals[match.id][1],
+        )
+        for match in user_matches if match.start_date and match.start_date > now()
+    ]
+    MatchResult.objects.bulk_create(
+        match_results,
+        update_conflicts=True,
+        unique_fields=['bet_round', 'match'],
+        update_fields=['goals_team_1', 'goals_team_2'],
+    )
+
+    user_match_ids = {match.id for match in user_matches}
+    return [match_id for match_id in new_goals if match_id not in user_match_ids]
+
+
+RESCORE_BATCH_SIZE = 1000
+
+def get_changed_points_filter(old_goals, new_goals):
+    """
+        Return the Q filter for the MatchResults whose points can change when the official
+        result of their match goes from old_goals to new_goals, both (goals_team_1,
+        goals_team_2). When the outcome changes every prediction of the old and the new
+        outcome changes, otherwise only the exact predictions of the old and the new score
+    """
+    if None in old_goals:
+        # Nothing was scored with the old result
+        return Q(goals_team_1__isnull=False, goals_team_2__isnull=False)
+    if None in new_goals:
+        return Q(points__gt=0)
+
+    (old_goals_team_1, old_goals_team_2), (new_goals_team_1, new_goals_team_2) = old_goals, new_goals
+    # -1 away win, 0 draw, 1 home win
+    old_outcome = (old_goals_team_1 > old_goals_team_2) - (old_goals_team_1 < old_goals_team_2)
+    new_outcome = (new_goals_team_1 > new_goals_team_2) - (new_goals_team_1 < new_goals_team_2)
+    if old_outcome != new_outcome:
+        return (
+            get_outcome_filter(old_goals_team_1, old_goals_team_2) |
+            get_outcome_filter(new_goals_team_1, new_goals_team_2)
+        )
+    return (
+        Q(goals_team_1=old_goals_team_1, goals_team_2=old_goals_team_2) |
+        Q(goals_team_1=new_goals_team_1, goals_team_2=new_goals_team_2)
+    )
+
+
+def rescore_corrected_match(match_id, old_goals, new_goals):
+    """
+        Rescore the MatchResults of a finalized match whose official result was corrected
+        from old_goals to new_goals. Only the predictions selected by
+        get_changed_points_filter are read, the ones whose points or exact flag changed are
+        written back and their deltas are added to the stored standings
+
+        Return:
+        Number of MatchResults rescored
+    """
+    match_results = MatchResult.objects.filter(
+        get_changed_points_filter(old_goals, new_goals),
+        match_id=match_id,
+        original_result=False,
+        state=True,
+    ).values_list('id', 'bet_round_id', 'goals_team_1', 'goals_team_2', 'points', 'is_exact')
+
+    changed_match_results = []
+    bet_round_deltas = defaultdict(lambda: (0, 0))
+    for match_result_id, bet_round_id, goals_team_1, goals_team_2, points, is_exact in match_results.iterator(
+        chunk_size=RESCORE_BATCH_SIZE
+    ):
+        new_points = 0 if None in new_goals else get_match_result_points(
+            goals_team_1, goals_team_2, *new_goals
+        )
+        new_is_exact = new_points == 3
+        if new_points == points and new_is_exact == is_exact:
+            continue
+
+        changed_match_results.append(
+            MatchResult(id=match_result_id, points=new_points, is_exact=new_is_exact)
+        )
+        if bet_round_id is not None:
+            points_delta, exact_results_delta = bet_round_deltas[bet_round_id]
+            bet_round_deltas[bet_round_id] = (
+                points_delta + new_points - points,
+                exact_results_delta + new_is_exact - is_exact,
+            )
+
+    MatchResult.objects.bulk_update(
+        changed_match_results, ['points', 'is_exact'], batch_size=RESCORE_BATCH_SIZE
+    )
+    apply_standings_deltas(bet_round_deltas=bet_round_deltas)
+    return len(changed_match_results)
+
+
+def correct_match_result(match, goals_team_1, goals_team_2):
+    """
+        Correct the official result of a match (a wrong score, an awarded match). For a
+        finalized match only the predictions whose points change are rescored and the
+        stored standings are moved by their deltas. Winners and coins prizes of a finalized
+        round are not given again, the correction is reported so they can be reviewed
+
+        Return:
+        Number of MatchResults rescored
+    """
+    with transaction.atomic():
+        original_match_result = MatchResult.objects.select_for_update().get(
+            match=match, original_result=True, state=True
+        )
+        old_goals = (original_match_result.goals_team_1, original_match_result.goals_team_2)
+        new_goals = (goals_team_1, goals_team_2)
+        if old_goals == new_goals:
+            return 0
+
+        original_match_result.goals_team_1 = goals_team_1
+        original_match_result.goals_team_2 = goals_team_2
+        original_match_result.save(update_fields=['goals_team_1', 'goals_team_2', 'updating_date'])
+
+        if match.match_state != Match.FINALIZED_MATCH:
+            # It is scored with the corrected result when it is finalized
+            return 0
+        lock_round_standings(round_ids=[match.round_id])
+        match_results_count = rescore_corrected_match(match.id, old_goals, new_goals)
+
+    if match.round.round_state == Round.FINALIZED_ROUND:
+        capture_message(
+            f'Result of match {match} corrected from {old_goals} to {new_goals} after its round '
+            'was finalized, review its winners and prizes',
+            level="warning"
+        )
+    return match_results_count
+
+
+# Fixture statuses that can still be bet on
+SYNCABLE_FIXTURE_STATUSES = ('TBD', 'NS')
+MATCH_SYNC_FIELDS = ('round_id', 'team_1_id', 'team_2_id', 'start_date')
+
+def sync_league_fixtures(league, fixture_responses):
+    """
+        Create or update the Matches of the league from API-Football /fixtures responses.
+        The rounds, teams and existing matches of the league are loaded once, every fixture
+        is compared against them in memory and the changes are written with one bulk_create
+        and one bulk_update in a single transaction. Fixtures that already started, whose
+        round or teams do not exist, or that move a match with predictions to another round,
+        are skipped. The start_date of the rounds that gain or lose matches is updated
+
+        Return:
+        {
+            'created': [Match], 'updated': [Match], -> updated with the changed fields
+            'unchanged': int, 'skipped': [(fixture_id, reason)]
+        }
+    """
+    rounds = {
+        round.api_round_name: round
+        for round in Round.objects.filter(state=True, league=league, api_round_name__isnull=False)
+    }
+    teams = {
+        team.api_team_id: team
+        for team in Team.objects.filter(state=True, leagues=league, api_team_id__isnull=False)
+    }
+    fixture_ids = [
+        fixture_response.get('fixture').get('id') for fixture_response in fixture_responses
+    ]
+    existing_matches = Match.objects.in_bulk(fixture_ids, field_name='api_match_id')
+    # Predictions belong to the BetRounds of the round of their match, they can not follow it
+    predicted_match_ids = set(MatchResult.objects.filter(
+        match__in=existing_matches.values(), original_result=False, state=True
+    ).values_list('match_id', flat=True).distinct()) if existing_matches else set()
+
+    summary = {'created': [], 'updated': [], 'unchanged': 0, 'skipped': []}
+    changed_round_ids = set()
+    for fixture_response in fixture_responses:
+        fixture_data = fixture_response.get('fixture')
+        fixture_id = fixture_data.get('id')
+        if fixture_data.get('status').get('short') not in SYNCABLE_FIXTURE_STATUSES:
+            continue
+
+        round = rounds.get(fixture_response.get('league').get('round'))
+        teams_data = fixture_response.get('teams')
+        team_1 = teams.get(teams_data.get('home').get('id'))
+        team_2 = teams.get(teams_data.get('away').get('id'))
+        if round is None:
+            summary['skipped'].append((fixture_id, f'Round {fixture_response.get("league").get("round")} does not exist'))
+            continue
+        if team_1 is None or team_2 is None:
+            summary['skipped'].append((fixture_id, 'Team does not exist'))
+            continue
+
+        values = {
+            'round_id': round.id,
+            'team_1_id': team_1.id,
+            'team_2_id': team_2.id,
+            'start_date': parse_date(fixture_data.get('date')) if fixture_data.get('date') else None,
+        }
+        match = existing_matches.get(fixture_id)
+        if match is None:
+            summary['created'].append(Match(api_match_id=fixture_id, **values))
+            changed_round_ids.add(round.id)
+            continue
+
+        changed_fields = [field for field in MATCH_SYNC_FIELDS if getattr(match, field) != values[field]]
+        if not changed_fields:
+            summary['unchanged'] += 1
+            continue
+        if 'round_id' in changed_fields and match.id in predicted_match_ids:
+            summary['skipped'].append((fixture_id, f'Match with predictions moved to round {round}'))
+            continue
+        if 'round_id' in changed_fields or 'start_date' in changed_fields:
+            changed_round_ids.update([match.round_id, round.id])
+        for field in changed_fields:
+            setattr(match, field, values[field])
+        match.updating_date = localtime().date()
+        summary['updated'].append(match)
+
+    with transaction.atomic():
+        Match.objects.bulk_create(summary['created'])
+        Match.objects.bulk_update(summary['updated'], list(MATCH_SYNC_FIELDS) + ['updating_date'])
+        update_rounds_start_date(round_ids=changed_round_ids)
+
+    return summary
+
+
+def update_rounds_start_date(round_ids):
+    """
+        Round.update_start_date of the received rounds in a single UPDATE, the rounds without
+        a dated match keep their start_date
+    """
+    if not round_ids:
+        return
+    earliest_match = Match.objects.filter(
+        round=OuterRef('pk'),
+        match_state__in=[Match.NOT_STARTED_MATCH, Match.PENDING_MATCH, Match.FINALIZED_MATCH],
+        start_date__isnull=False,
+        state=True,
+    ).order_by('start_date').values('start_date')[:1]
+    Round.objects.filter(id__in=round_ids).update(
+        start_date=Coalesce(Subquery(earliest_match), F('start_date'))
+    )
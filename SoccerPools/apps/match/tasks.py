@@ -1,11 +1,8 @@
-from celery import shared_task
-from decouple import config
+from celery import chord, shared_task
 from sentry_sdk import capture_message
 from dateutil import parser
-from time import sleep
 import logging
-import requests
-import json
+from django.core.cache import cache
 from django.db import transaction
 from django.db.models import Q
 from django.utils.timezone import now, timedelta
@@ -13,21 +10,38 @@ from django.utils.timezone import localtime
 from django.core.mail import mail_admins
 from apps.notification.utils import send_push_nots_match
 from apps.league.models import Round
+from apps.league.tasks import finalize_pending_rounds
+from apps.bet.services import lock_round_standings, update_round_standings
 from apps.match.models import Match, MatchResult
-from apps.match.utils import get_match_result_points
+from apps.api.quota import HIGH_PRIORITY, LOW_PRIORITY, has_quota
+from apps.match.api_football import fetch_fixtures
+from apps.match.services import score_match_results
 
 logger = logging.getLogger(__name__)
 
+PENDING_BEFORE_KICKOFF = timedelta(minutes=20)
+# Regular time, half time and stoppage time
+RESULT_CHECK_AFTER_KICKOFF = timedelta(minutes=110)
+# Seconds between the result checks of a match that is not finished yet, extra time and
+# penalties are usually over by the third one
+RESULT_CHECK_BACKOFF = (5 * 60, 10 * 60, 15 * 60, 30 * 60, 60 * 60, 60 * 60)
+# The Redis broker redelivers the tasks that are not acknowledged within its visibility
+# timeout (1 hour), so the kickoff tasks are enqueued with an ETA at most this far ahead
+KICKOFF_SCHEDULE_HORIZON = timedelta(minutes=30)
+# Seconds a kickoff task is remembered as enqueued, past its ETA in any case
+KICKOFF_TASK_KEY_TIMEOUT = 6 * 60 * 60
+
 @shared_task
 def check_upcoming_matches():
     """
-        Check if any NOT STARTED match start_date is within 20 minutes but hasn't started yet and 
-        sets its state to pending
+        Fallback of mark_match_pending: set to pending the NOT STARTED matches that are past
+        their start_date, the ones whose kickoff task was missed. Like in
+        check_suspended_matches, matches that started more than 2 days ago are left out
     """
-    start_time = now() + timedelta(minutes=20)
     matches = Match.objects.filter(
-        start_date__gte=now(), 
-        start_date__lte=start_time,
+        state=True,
+        start_date__gte=now() - timedelta(days=2),
+        start_date__lte=now(),
         match_state=Match.NOT_STARTED_MATCH
     )
     
@@ -39,85 +53,213 @@ def check_upcoming_matches():
 @shared_task
 def finalize_matches():
     """
-        Check if any match pending match is already finished, change its state to
-        FINALIZED and update the match result points
+        Fallback of check_match_result: check if any pending match that should have been
+        checked by its kickoff task is already finished and fan out one
+        finalize_pending_match task per finished match, so they are scored in parallel and
+        a failing match does not hold back the rest. finalize_pending_rounds runs once all
+        of them are done
     """
-    TIMEZONE = 'America/Argentina/Ushuaia'
     pending_matches = Match.objects.filter(
         state=True, 
-        match_state=Match.PENDING_MATCH
+        match_state=Match.PENDING_MATCH,
+        api_match_id__isnull=False,
+        start_date__lte=now() - RESULT_CHECK_AFTER_KICKOFF,
     ).select_related('round__league', 'team_1', 'team_2')
-    base_url = f'https://v3.football.api-sports.io/fixtures?&timezone={TIMEZONE}'
-    headers = {
-        'x-apisports-key': config('API_FOOTBALL_KEY')
-    }
+    fixtures = fetch_fixtures((match.api_match_id for match in pending_matches), priority=HIGH_PRIORITY)
+
+    finalize_tasks = []
     for match in pending_matches:
-        if match.api_match_id:
-            url = f'{base_url}&id={match.api_match_id}'
-            response = requests.get(url, headers=headers)
-            response_obj = json.loads(response.text)
-            try:
-                match_response = response_obj.get('response')[0]
-            except IndexError:
-                capture_message(
-                    f'Error getting match {match} for api_match_id {match.api_match_id}, {response.status_code}: {response_obj}', 
-                    level="error"
-                )
-                continue
-            goals_home = match_response.get('goals').get('home')
-            goals_away = match_response.get('goals').get('away')
-            fixture_status = match_response.get('fixture').get('status')
-            long = fixture_status.get('long')
-
-            if long == 'Match Finished':
-                # try:
-                    # Send push notifications to inform about the finalized match
-                #     send_push_nots_match(
-                #         team_1_name=match.team_1.name, 
-                #         team_2_name=match.team_2.name, 
-                #         goals_home=goals_home, 
-                #         goals_away=goals_away, 
-                #         league=match.round.league
-                #     )
-                # except Exception as err:
-                #     capture_message(f'Error sending push nots: {str(err)}', level="error")
-                original_match_result, was_created = MatchResult.objects.get_or_create(
-                    original_result=True,
-                    match=match,
-                    defaults={
-                        'goals_team_1': goals_home,
-                        'goals_team_2': goals_away
-                    }
-                )
-                user_match_results = MatchResult.objects.filter(
-                    state=True,
-                    match=match,
-                    original_result=False
-                )
-
-                with transaction.atomic(): 
-                    for match_result in user_match_results:
-                        points = get_match_result_points(
-                            user_goals_team_1=match_result.goals_team_1,
-                            user_goals_team_2=match_result.goals_team_2,
-                            original_goals_team_1=original_match_result.goals_team_1,
-                            original_goals_team_2=original_match_result.goals_team_2
-                        )
-                        match_result.points = points
-                        if points == 3:
-                            match_result.is_exact = True
-                        match_result.save()
-                    match.match_state = Match.FINALIZED_MATCH
-                    match.save()
+        match_response = fixtures.get(match.api_match_id)
+        if match_response is None:
+            capture_message(
+                f'Error getting match {match} for api_match_id {match.api_match_id}', 
+                level="error"
+            )
+            continue
+        if is_fixture_finished(match_response):
+            finalize_tasks.append(finalize_pending_match.si(match.id, match_response))
+
+    if finalize_tasks:
+        chord(finalize_tasks)(finalize_pending_rounds.si())
+
+
+@shared_task
+def finalize_pending_match(match_id, match_response):
+    """
+        Finalize a pending match with the fixture response fetched by finalize_matches.
+        Errors are reported and swallowed, so the chord callback still runs for the other
+        matches
+
+        Return:
+        True if the match was finalized
+    """
+    match = Match.objects.filter(id=match_id, state=True, match_state=Match.PENDING_MATCH).first()
+    if match is None:
+        return False
+
+    try:
+        return finalize_match(match=match, match_response=match_response)
+    except Exception as err:
+        logger.exception('Error finalizing match %s', match_id)
+        capture_message(f'Error finalizing match {match}: {str(err)}', level="error")
+        return False
+
+
+def is_fixture_finished(match_response):
+    return match_response.get('fixture').get('status').get('long') == 'Match Finished'
+
+
+def finalize_match(match, match_response):
+    """
+        Finalize the match and score its match results if the fixture response says it is
+        finished
+
+        Return:
+        True if the match was finalized
+    """
+    if not is_fixture_finished(match_response):
+        return False
+    goals_home = match_response.get('goals').get('home')
+    goals_away = match_response.get('goals').get('away')
+
+    # try:
+        # Send push notifications to inform about the finalized match
+    #     send_push_nots_match(
+    #         team_1_name=match.team_1.name, 
+    #         team_2_name=match.team_2.name, 
+    #         goals_home=goals_home, 
+    #         goals_away=goals_away, 
+    #         league=match.round.league
+    #     )
+    # except Exception as err:
+    #     capture_message(f'Error sending push nots: {str(err)}', level="error")
+    with transaction.atomic(): 
+        # The match is finalized from the beat fan out and from check_match_result, only the
+        # first one to lock it while it is still pending creates its original result
+        is_pending = Match.objects.select_for_update().filter(
+            id=match.id, match_state=Match.PENDING_MATCH
+        ).values_list('id', flat=True).first()
+        if is_pending is None:
+            return False
+
+        original_match_result, was_created = MatchResult.objects.get_or_create(
+            original_result=True,
+            match=match,
+            defaults={
+                'goals_team_1': goals_home,
+                'goals_team_2': goals_away
+            }
+        )
+
+        # Matches of the same round are finalized by parallel tasks, their standings are
+        # rewritten one at a time
+        lock_round_standings(round_ids=[match.round_id])
+        score_match_results(original_match_results=[original_match_result])
+        match.match_state = Match.FINALIZED_MATCH
+        match.save()
+        update_round_standings(round_ids=[match.round_id])
+    return True
+
+
+def schedule_match_tasks(match):
+    """
+        Enqueue the kickoff tasks of a match once the current transaction is committed:
+        mark_match_pending PENDING_BEFORE_KICKOFF before its start_date and check_match_result
+        RESULT_CHECK_AFTER_KICKOFF after it. Only the tasks due within
+        KICKOFF_SCHEDULE_HORIZON are enqueued, the later ones are enqueued by the
+        schedule_kickoff_tasks beat task, and each one only once per start_date.
+        The tasks receive the start_date they were scheduled for and do nothing if it
+        changed, the new start_date has its own tasks
+    """
+    if match.start_date is None:
+        return
+
+    start_date = match.start_date.isoformat()
+    kickoff_tasks = []
+    if match.start_date > now():
+        kickoff_tasks.append((mark_match_pending, match.start_date - PENDING_BEFORE_KICKOFF))
+    if match.api_match_id:
+        kickoff_tasks.append((check_match_result, match.start_date + RESULT_CHECK_AFTER_KICKOFF))
+
+    def schedule():
+        horizon = now() + KICKOFF_SCHEDULE_HORIZON
+        for task, eta in kickoff_tasks:
+            key = f'kickoff_task:{task.name}:{match.id}:{start_date}'
+            if eta <= horizon and cache.add(key, 1, timeout=KICKOFF_TASK_KEY_TIMEOUT):
+                task.apply_async(args=[match.id, start_date], eta=eta)
+
+    transaction.on_commit(schedule)
+
+
+@shared_task
+def schedule_kickoff_tasks():
+    """
+        Enqueue the kickoff tasks of the matches that are due within KICKOFF_SCHEDULE_HORIZON.
+        It is run by beat every 10 minutes, its PeriodicTask is added by the match 0017
+        migration, so every task is enqueued before its ETA
+    """
+    matches = Match.objects.filter(
+        state=True,
+        match_state__in=[Match.NOT_STARTED_MATCH, Match.PENDING_MATCH],
+        start_date__gte=now() - RESULT_CHECK_AFTER_KICKOFF,
+        start_date__lte=now() + PENDING_BEFORE_KICKOFF + KICKOFF_SCHEDULE_HORIZON,
+    )
+    for match in matches:
+        schedule_match_tasks(match)
+
+
+def _get_scheduled_match(match_id, start_date, match_state):
+    """Return the match if it still has the scheduled start_date and match_state, else None"""
+    match = Match.objects.filter(
+        id=match_id, state=True, match_state=match_state
+    ).select_related('round__league', 'team_1', 'team_2').first()
+    if match is None or match.start_date is None or match.start_date != parser.parse(start_date):
+        return None
+    return match
+
+
+@shared_task
+def mark_match_pending(match_id, start_date):
+    """Set a NOT STARTED match to pending, scheduled by schedule_match_tasks before kickoff"""
+    match = _get_scheduled_match(match_id, start_date, Match.NOT_STARTED_MATCH)
+    if match is not None:
+        match.match_state = Match.PENDING_MATCH
+        match.save()
+
+
+@shared_task
+def check_match_result(match_id, start_date, attempt=0):
+    """
+        Finalize a pending match if API-Football reports it finished, scheduled by
+        schedule_match_tasks after kickoff. Otherwise check again after the next
+        RESULT_CHECK_BACKOFF delay, the finalize_matches beat task takes over once the
+        backoff is over
+    """
+    match = _get_scheduled_match(match_id, start_date, Match.PENDING_MATCH)
+    if match is None:
+        return
+
+    match_response = fetch_fixtures([match.api_match_id], priority=HIGH_PRIORITY).get(match.api_match_id)
+    if match_response is not None and finalize_match(match=match, match_response=match_response):
+        finalize_pending_rounds.delay()
+        return
+
+    if attempt < len(RESULT_CHECK_BACKOFF):
+        check_match_result.apply_async(
+            args=[match_id, start_date, attempt + 1], countdown=RESULT_CHECK_BACKOFF[attempt]
+        )
 
 
 @shared_task
 def update_matches_start_date():
     """
         Update any changes in the NOT_STARTED matches start dates and update 
-        Round start_date based on this
+        Round start_date based on this. It is low priority work, deferred to the next run
+        when the API-Football budget runs low
     """
-    TIMEZONE = 'America/Argentina/Ushuaia'
+    if not has_quota(LOW_PRIORITY):
+        logger.info('API-Football budget running low, start dates update deferred')
+        return
 
     # Not started matches with None start_date or that would start in up to 1 month
     up_to_one_month = now() + timedelta(days=30)
@@ -127,28 +269,14 @@ def update_matches_start_date():
         state=True,
         match_state=Match.NOT_STARTED_MATCH,
     )
+    fixtures = fetch_fixtures((match.api_match_id for match in matches), priority=LOW_PRIORITY)
 
-    base_url = f'https://v3.football.api-sports.io/fixtures?timezone={TIMEZONE}'
+    # The responses are fetched concurrently first and applied with a single update
+    changed_matches = []
     for match in matches:
-        url = f'{base_url}&id={match.api_match_id}'
-        headers = {
-            'x-apisports-key': config('API_FOOTBALL_KEY')
-        }
-        response = requests.get(url, headers=headers)
-        response_obj = json.loads(response.text)
-
-        try:
-            match_response = response_obj.get('response')[0]
-        except Exception as err:
-            errors = response_obj.get('errors')
-            if errors.get('rateLimit'):
-                logger.info('Reached 300 requests, sleeping 60 seconds to respect rate limit')
-                sleep(60)
-            else:
-                logger.error(
-                    'Error (%s) while updating %s, %s match: %s ... %s %s', 
-                    url, match, match.api_match_id, err, response.status_code, response_obj
-                )
+        match_response = fixtures.get(match.api_match_id)
+        if match_response is None:
+            logger.error('Fixture of %s, %s match not found', match, match.api_match_id)
             continue
 
         fixture_data = match_response.get('fixture')
@@ -157,7 +285,11 @@ def update_matches_start_date():
         
         if start_date != match_start_date:
             match.start_date = start_date
-            match.save()
+            match.updating_date = localtime().date()
+            changed_matches.append(match)
+    Match.objects.bulk_update(changed_matches, ['start_date', 'updating_date'])
+    for match in changed_matches:
+        schedule_match_tasks(match)
 
     rounds = Round.objects.filter(matches__in=matches).distinct()
     for round in rounds:
@@ -171,7 +303,6 @@ def check_suspended_matches():
         It is not good idea to directly set the match state to cancelled, because the match could be in a 
         short period of time
     """
-    TIMEZONE = 'America/Argentina/Ushuaia'
     three_hours_before = now() - timedelta(hours=3)
     two_days_before = now() - timedelta(days=2)
     matches = Match.objects.filter(
@@ -180,22 +311,13 @@ def check_suspended_matches():
         start_date__gte=two_days_before,
         start_date__lte=three_hours_before,
     )
+    fixtures = fetch_fixtures(match.api_match_id for match in matches)
 
-    base_url = f'https://v3.football.api-sports.io/fixtures?timezone={TIMEZONE}'
     for match in matches:
-        url = f'{base_url}&id={match.api_match_id}'
-        headers = {
-            'x-apisports-key': config('API_FOOTBALL_KEY')
-        }
-
-        try:
-            response = requests.get(url, headers=headers)
-            response_obj = json.loads(response.text)
-        except Exception as err:
-            capture_message(f'Error getting api response: {str(err)}', level="error")
+        match_response = fixtures.get(match.api_match_id)
+        if match_response is None:
             continue
 
-        match_response = response_obj.get('response')[0]
         fixture_data = match_response.get('fixture')
         fixture_status = fixture_data.get('status')
         short = fixture_status.get('short')
@@ -0,0 +1,55 @@
+from io import StringIO
+from contextlib import redirect_stdout
+from unittest.mock import patch
+from django.test import TestCase
+from django.core.management import call_command
+from apps.app_user.factories import AppUserFactory
+from apps.league.factories import LeagueFactory, RoundFactory
+from apps.match.factories import MatchFactory
+from apps.bet.factories import BetRoundFactory, BetLeagueFactory
+from apps.payment.factories import PaidBetRoundFactory
+from apps.match.models import MatchResult
+
+
+class AddMatchResultsExistingLeagueTest(TestCase):
+    def setUp(self):
+        self.league = LeagueFactory(api_league_id=128)
+        self.round = RoundFactory(league=self.league)
+        self.match = MatchFactory(round=self.round)
+        self.paid_user = AppUserFactory()
+        self.paid_bet_round = BetRoundFactory(
+            round=self.round, bet_league=BetLeagueFactory(user=self.paid_user, league=self.league)
+        )
+        self.free_bet_round = BetRoundFactory(
+            round=self.round, bet_league=BetLeagueFactory(league=self.league)
+        )
+        self.paid_round = PaidBetRoundFactory(user=self.paid_user, round=self.round)
+
+    @patch('apps.match.management.commands.add_match_results_existing_league.send_push_new_round_available')
+    def test_only_paid_bet_rounds(self, mock_send_push):
+        """Test that the empty MatchResults are only created for the paid BetRounds"""
+        with redirect_stdout(StringIO()):
+            call_command('add_match_results_existing_league', self.league.api_league_id)
+
+        match_result = MatchResult.objects.get(match=self.match)
+        self.assertEqual(match_result.bet_round, self.paid_bet_round)
+        self.assertEqual(match_result.paid_bet_round, self.paid_round)
+
+
+class FinalizeMatchCommandTest(TestCase):
+    def setUp(self):
+        self.round = RoundFactory()
+        self.match = MatchFactory(round=self.round)
+        MatchResult.objects.create(
+            match=self.match, original_result=True, goals_team_1=1, goals_team_2=0
+        )
+
+    @patch('apps.match.management.commands.finalize_match.send_push_nots_match')
+    @patch('apps.match.management.commands.finalize_match.lock_round_standings')
+    def test_locks_round_standings(self, mock_lock, mock_send_push):
+        """Test that the rounds of the matches are locked before their standings are rewritten"""
+        call_command('finalize_match', self.match.id, stdout=StringIO())
+
+        mock_lock.assert_called_once_with(round_ids={self.round.id})
+        self.match.refresh_from_db()
+        self.assertEqual(self.match.match_state, self.match.FINALIZED_MATCH)
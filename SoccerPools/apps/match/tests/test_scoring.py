@@ -0,0 +1,44 @@
+import unittest
+from itertools import product
+import numpy as np
+from apps.match.scoring import goals_to_array, score_predictions
+from apps.match.utils import get_match_result_points
+
+class ScoringTests(unittest.TestCase):
+    def test_score_predictions_matches_scalar(self):
+        """Test that every combination of goals scores the same as get_match_result_points"""
+        goals_choices = [None, 0, 1, 2, 3, 4]
+        original_choices = [0, 1, 2, 3]
+        rows = list(product(goals_choices, goals_choices, original_choices, original_choices))
+        user_goals_team_1, user_goals_team_2, goals_team_1, goals_team_2 = zip(*rows)
+
+        predicted_team_1, null_mask_team_1 = goals_to_array(user_goals_team_1)
+        predicted_team_2, null_mask_team_2 = goals_to_array(user_goals_team_2)
+        points, is_exact = score_predictions(
+            predicted_goals_team_1=predicted_team_1,
+            predicted_goals_team_2=predicted_team_2,
+            original_goals_team_1=goals_team_1,
+            original_goals_team_2=goals_team_2,
+            null_mask=null_mask_team_1 | null_mask_team_2,
+        )
+
+        expected_points = [get_match_result_points(*row) for row in rows]
+        self.assertEqual(points.tolist(), expected_points)
+        self.assertEqual(is_exact.tolist(), [expected == 3 for expected in expected_points])
+
+    def test_score_predictions_single_match(self):
+        """Test that scalar original goals are broadcast to every prediction"""
+        points, is_exact = score_predictions(
+            predicted_goals_team_1=[2, 1, 0, 3],
+            predicted_goals_team_2=[1, 0, 0, 1],
+            original_goals_team_1=2,
+            original_goals_team_2=1,
+        )
+        self.assertEqual(points.tolist(), [3, 1, 0, 1])
+        self.assertEqual(is_exact.tolist(), [True, False, False, False])
+
+    def test_goals_to_array(self):
+        goals_array, null_mask = goals_to_array([1, None, 3])
+        self.assertEqual(goals_array.tolist(), [1, 0, 3])
+        self.assertEqual(null_mask.tolist(), [False, True, False])
+        self.assertEqual(goals_array.dtype, np.int16)
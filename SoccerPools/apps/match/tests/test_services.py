@@ -0,0 +1,230 @@
+from itertools import product
+from django.test import TestCase
+from django.utils.timezone import now, timedelta
+from apps.app_user.factories import AppUserFactory
+from apps.bet.factories import BetLeagueFactory, BetRoundFactory
+from apps.bet.models import BetLeague, BetRound
+from apps.bet.services import update_round_standings
+from apps.league.factories import LeagueFactory, RoundFactory, TeamFactory
+from apps.match.models import Match, MatchResult
+from apps.match.factories import MatchFactory, MatchResultFactory
+from apps.match.services import correct_match_result, score_match_results, sync_league_fixtures
+from apps.match.utils import get_match_result_points
+
+
+class ScoreMatchResultsTest(TestCase):
+    def setUp(self):
+        self.league = LeagueFactory()
+        self.round = RoundFactory(league=self.league)
+        self.goals_choices = [None, 0, 1, 2, 3]
+        self.original_match_results = []
+        for goals_team_1, goals_team_2 in [(0, 0), (1, 0), (0, 2), (2, 1)]:
+            match = MatchFactory(round=self.round)
+            self.original_match_results.append(MatchResultFactory(
+                match=match,
+                bet_round=None,
+                original_result=True,
+                goals_team_1=goals_team_1,
+                goals_team_2=goals_team_2,
+            ))
+            for user_goals_team_1, user_goals_team_2 in product(self.goals_choices, repeat=2):
+                MatchResultFactory(
+                    match=match,
+                    bet_round=None,
+                    goals_team_1=user_goals_team_1,
+                    goals_team_2=user_goals_team_2,
+                )
+
+    def test_score_match_results(self):
+        """
+            Test that a batch of matches is scored in one query with the same points as
+            get_match_result_points
+        """
+        with self.assertNumQueries(1):
+            n_updated = score_match_results(original_match_results=self.original_match_results)
+
+        self.assertEqual(n_updated, len(self.original_match_results) * len(self.goals_choices) ** 2)
+        for original_match_result in self.original_match_results:
+            match_results = MatchResult.objects.filter(
+                match=original_match_result.match, original_result=False
+            )
+            for match_result in match_results:
+                expected_points = get_match_result_points(
+                    user_goals_team_1=match_result.goals_team_1,
+                    user_goals_team_2=match_result.goals_team_2,
+                    original_goals_team_1=original_match_result.goals_team_1,
+                    original_goals_team_2=original_match_result.goals_team_2
+                )
+                self.assertEqual(match_result.points, expected_points)
+                self.assertEqual(match_result.is_exact, expected_points == 3)
+
+    def test_original_result_without_goals(self):
+        """Test that matches whose original result has no goals are not scored"""
+        original_match_result = self.original_match_results[0]
+        original_match_result.goals_team_2 = None
+
+        with self.assertNumQueries(0):
+            n_updated = score_match_results(original_match_results=[original_match_result])
+        self.assertEqual(n_updated, 0)
+
+
+class CorrectMatchResultTest(TestCase):
+    def setUp(self):
+        self.league = LeagueFactory()
+        self.round = RoundFactory(league=self.league)
+        self.general_round = RoundFactory(league=self.league, is_general_round=True)
+        self.match = MatchFactory(round=self.round, match_state=Match.FINALIZED_MATCH)
+        other_match = MatchFactory(round=self.round, match_state=Match.FINALIZED_MATCH)
+        original_match_results = [
+            MatchResultFactory(match=self.match, bet_round=None, original_result=True, goals_team_1=1, goals_team_2=0),
+            MatchResultFactory(match=other_match, bet_round=None, original_result=True, goals_team_1=2, goals_team_2=2),
+        ]
+
+        self.predictions = {}
+        for i, goals in enumerate([(1, 0), (2, 0), (0, 0), (0, 1), (None, None)]):
+            bet_league = BetLeagueFactory(league=self.league, user=AppUserFactory(username=f'user_{i}'))
+            BetRoundFactory(round=self.general_round, bet_league=bet_league)
+            bet_round = BetRoundFactory(round=self.round, bet_league=bet_league)
+            self.predictions[goals] = MatchResultFactory(
+                match=self.match, bet_round=bet_round, goals_team_1=goals[0], goals_team_2=goals[1]
+            )
+            MatchResultFactory(match=other_match, bet_round=bet_round, goals_team_1=i, goals_team_2=i)
+
+        score_match_results(original_match_results=original_match_results)
+        update_round_standings(round_ids=[self.round.id])
+
+    def get_standings(self):
+        return (
+            sorted(BetRound.objects.values_list('id', 'total_points', 'total_exact_results', 'rank')),
+            sorted(BetLeague.objects.values_list('id', 'total_points', 'total_exact_results')),
+        )
+
+    def assert_standings_recalculated(self):
+        standings = self.get_standings()
+        update_round_standings(round_ids=[self.round.id])
+        self.assertEqual(standings, self.get_standings())
+
+    def get_points(self):
+        return {
+            goals: MatchResult.objects.get(id=match_result.id).points
+            for goals, match_result in self.predictions.items()
+        }
+
+    def test_correct_exact_result(self):
+        """Test that a correction keeping the outcome only rescores the exact predictions"""
+        match_results_count = correct_match_result(self.match, 2, 0)
+
+        self.assertEqual(match_results_count, 2)
+        self.assertEqual(
+            self.get_points(),
+            {(1, 0): 1, (2, 0): 3, (0, 0): 0, (0, 1): 0, (None, None): 0}
+        )
+        self.assertTrue(MatchResult.objects.get(id=self.predictions[(2, 0)].id).is_exact)
+        self.assert_standings_recalculated()
+
+    def test_correct_outcome(self):
+        """Test that a correction changing the outcome moves the standings by the deltas"""
+        match_results_count = correct_match_result(self.match, 0, 0)
+
+        self.assertEqual(match_results_count, 3)
+        self.assertEqual(
+            self.get_points(),
+            {(1, 0): 0, (2, 0): 0, (0, 0): 3, (0, 1): 0, (None, None): 0}
+        )
+        self.assertEqual(
+            list(BetRound.objects.with_matches_points(round_slug=self.round.slug).values_list(
+                'bet_league__user__username', flat=True
+            ))[:1],
+            ['user_2']
+        )
+        self.assert_standings_recalculated()
+
+    def test_correct_not_finalized_match(self):
+        Match.objects.filter(id=self.match.id).update(match_state=Match.PENDING_MATCH)
+        self.match.refresh_from_db()
+
+        self.assertEqual(correct_match_result(self.match, 0, 3), 0)
+        original_match_result = MatchResult.objects.get(match=self.match, original_result=True)
+        self.assertEqual((original_match_result.goals_team_1, original_match_result.goals_team_2), (0, 3))
+        self.assertEqual(self.get_points()[(1, 0)], 3)
+
+
+class SyncLeagueFixturesTest(TestCase):
+    def setUp(self):
+        self.league = LeagueFactory()
+        self.rounds = [
+            RoundFactory(league=self.league, api_round_name=f'Regular Season - {i}') for i in range(1, 5)
+        ]
+        self.teams = [TeamFactory(leagues=[self.league], api_team_id=100 + i) for i in range(6)]
+        self.start_date = (now() + timedelta(days=3)).replace(microsecond=0)
+
+    def fixture(self, fixture_id, round_number, home, away, short='NS', start_date=None):
+        return {
+            'fixture': {
+                'id': fixture_id,
+                'date': (start_date or self.start_date).isoformat(),
+                'status': {'short': short},
+            },
+            'league': {'round': f'Regular Season - {round_number}'},
+            'teams': {'home': {'id': 100 + home}, 'away': {'id': 100 + away}},
+        }
+
+    def season_fixtures(self):
+        return [
+            self.fixture(round_number * 10 + i, round_number, i * 2, i * 2 + 1)
+            for round_number in range(1, 5) for i in range(3)
+        ]
+
+    def test_sync_creates_season(self):
+        """Test that a whole season is created with a constant number of queries"""
+        with self.assertNumQueries(7):
+            summary = sync_league_fixtures(league=self.league, fixture_responses=self.season_fixtures())
+
+        self.assertEqual(len(summary['created']), 12)
+        self.assertEqual(Match.objects.filter(round__league=self.league).count(), 12)
+        match = Match.objects.get(api_match_id=41)
+        self.assertEqual(match.round, self.rounds[3])
+        self.assertEqual((match.team_1, match.team_2), (self.teams[2], self.teams[3]))
+        self.assertEqual(match.start_date, self.start_date)
+
+    def test_sync_diff(self):
+        """Test that existing matches are only updated when a synced field changed"""
+        sync_league_fixtures(league=self.league, fixture_responses=self.season_fixtures())
+        new_start_date = self.start_date + timedelta(hours=2)
+        fixtures = self.season_fixtures()
+        fixtures[0] = self.fixture(10, 1, 0, 1, start_date=new_start_date)
+        fixtures.append(self.fixture(50, 5, 0, 1))
+        fixtures.append(self.fixture(51, 1, 0, 9))
+        fixtures.append(self.fixture(52, 1, 0, 1, short='FT'))
+
+        summary = sync_league_fixtures(league=self.league, fixture_responses=fixtures)
+
+        self.assertEqual(summary['created'], [])
+        self.assertEqual([match.api_match_id for match in summary['updated']], [10])
+        self.assertEqual(summary['unchanged'], 11)
+        self.assertEqual([fixture_id for fixture_id, _ in summary['skipped']], [50, 51])
+        self.assertEqual(Match.objects.get(api_match_id=10).start_date, new_start_date)
+        self.assertFalse(Match.objects.filter(api_match_id=52).exists())
+
+    def test_sync_round_change(self):
+        """Test that a match moves round only without predictions, updating both start dates"""
+        sync_league_fixtures(league=self.league, fixture_responses=self.season_fixtures())
+        for round in self.rounds:
+            round.refresh_from_db()
+        self.assertEqual(self.rounds[0].start_date, self.start_date)
+        MatchResultFactory(
+            match=Match.objects.get(api_match_id=11), bet_round=BetRoundFactory(round=self.rounds[0])
+        )
+        earlier_start_date = self.start_date - timedelta(days=1)
+        fixtures = self.season_fixtures()
+        fixtures[0] = self.fixture(10, 2, 0, 1, start_date=earlier_start_date)
+        fixtures[1] = self.fixture(11, 2, 2, 3)
+
+        summary = sync_league_fixtures(league=self.league, fixture_responses=fixtures)
+
+        self.assertEqual([match.api_match_id for match in summary['updated']], [10])
+        self.assertEqual([fixture_id for fixture_id, _ in summary['skipped']], [11])
+        self.assertEqual(Match.objects.get(api_match_id=10).round, self.rounds[1])
+        self.assertEqual(Match.objects.get(api_match_id=11).round, self.rounds[0])
+        self.rounds[1].refresh_from_db()
+        self.assertEqual(self.rounds[1].start_date, earlier_start_date)
@@ -1,14 +1,24 @@
-from unittest.mock import patch, MagicMock
+import asyncio
+import json
+from unittest.mock import patch
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.utils.timezone import now, timedelta
 from django.core import mail
+from django.core.cache import cache
 from apps.league.factories import LeagueFactory, RoundFactory, TeamFactory
 from apps.bet.factories import BetRoundFactory, BetLeagueFactory
+from apps.league.models import Round
 from apps.match.models import MatchResult, Match
 from apps.match.factories import MatchResultFactory, MatchFactory
+from apps.match.api_football import (
+    FINISHED_FIXTURE_CACHE_TIMEOUT, LIVE_FIXTURE_CACHE_TIMEOUT, fetch_fixtures, fetch_fixtures_async,
+    fixture_cache_key, get_fixture_cache_stats
+)
 from apps.match.tasks import (
-    check_upcoming_matches, finalize_matches, update_matches_start_date, check_suspended_matches
+    check_upcoming_matches, finalize_matches, update_matches_start_date, check_suspended_matches,
+    schedule_match_tasks, schedule_kickoff_tasks, mark_match_pending, check_match_result, finalize_match,
+    PENDING_BEFORE_KICKOFF, RESULT_CHECK_AFTER_KICKOFF, RESULT_CHECK_BACKOFF
 )
 
 User = get_user_model()
@@ -25,7 +35,7 @@ class UpcomingMatchesTest(TestCase):
             team_2=self.team_2, 
             match_state=Match.NOT_STARTED_MATCH,
             round=self.round,
-            start_date=now()+timedelta(minutes=15)
+            start_date=now()-timedelta(minutes=15)
         )
         self.match_2 = MatchFactory(
             team_1=self.team_3, 
@@ -46,11 +56,11 @@ class UpcomingMatchesTest(TestCase):
             team_2=self.team_3, 
             match_state=Match.NOT_STARTED_MATCH,
             round=self.round,
-            start_date=now()+timedelta(seconds=30)
+            start_date=now()-timedelta(days=3)
         )
 
     def test_update_matches_state(self):
-        """Test that not started matches with start date within 20 minutes change its state"""
+        """Test that only the not started matches past their recent kickoff change its state"""
         check_upcoming_matches()
         self.match_1.refresh_from_db()
         self.match_2.refresh_from_db()
@@ -59,11 +69,12 @@ class UpcomingMatchesTest(TestCase):
         self.assertEqual(self.match_1.match_state, Match.PENDING_MATCH)
         self.assertEqual(self.match_2.match_state, Match.NOT_STARTED_MATCH)
         self.assertEqual(self.match_3.match_state, Match.PENDING_MATCH)
-        self.assertEqual(self.match_4.match_state, Match.PENDING_MATCH)
+        self.assertEqual(self.match_4.match_state, Match.NOT_STARTED_MATCH)
 
 
 class FinalizeMatchesTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.league = LeagueFactory(name='Finalize Testing')
         self.team_1 = TeamFactory(leagues=[self.league])
         self.team_2 = TeamFactory(leagues=[self.league])
@@ -75,6 +86,7 @@ class FinalizeMatchesTest(TestCase):
             team_2=self.team_2, 
             match_state=Match.PENDING_MATCH,
             round=self.round,
+            start_date=now() - timedelta(hours=3),
         )
         self.match_2 = MatchFactory(
             team_1=self.team_3, 
@@ -124,12 +136,12 @@ class FinalizeMatchesTest(TestCase):
         )
         self.match_result_5 = MatchResultFactory(
             goals_team_1=2, goals_team_2=None,
-            bet_round=self.bet_round_2,
+            bet_round=BetRoundFactory(round=self.round),
             match=self.match_2
         )
 
-    @patch('apps.match.tasks.requests.get')
-    def test_finalize_matches(self, mock_requests_get):
+    @patch('apps.match.api_football.api_football_get_async')
+    def test_finalize_matches(self, mock_api_football_get_async):
         """
         Test that finalize_matches correctly updates match states when API reports 
         finished matches
@@ -141,22 +153,20 @@ class FinalizeMatchesTest(TestCase):
 
         # Create a mock API response
         fake_api_response = """{
+            "errors": [],
             "response": [{
                 "goals": {"home": 2, "away": 1}, 
-                "fixture": {"status": {"long": "Match Finished"}} 
+                "fixture": {"id": 423423, "status": {"long": "Match Finished"}} 
             }]
         }"""
 
         # Configure the mock response
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.get.return_value.text = fake_api_response
-        mock_requests_get.return_value.text = fake_api_response 
+        mock_api_football_get_async.return_value = (200, json.loads(fake_api_response))
 
         finalize_matches()
 
         # Debugging: Check if the mock was called
-        mock_requests_get.assert_called()
+        mock_api_football_get_async.assert_called()
 
         # Refresh all instances
         self.match_1.refresh_from_db()
@@ -179,9 +189,85 @@ class FinalizeMatchesTest(TestCase):
         self.assertEqual(self.match_result_3.is_exact, False)
         self.assertEqual(self.match_result_4.is_exact, False)
 
+        # The round standings are updated with the new points
+        self.bet_round_1.refresh_from_db()
+        self.bet_round_2.refresh_from_db()
+        self.assertEqual(self.bet_round_1.total_points, 3)
+        self.assertEqual(self.bet_round_1.total_exact_results, 1)
+        self.assertEqual(self.bet_round_1.rank, 1)
+        self.assertEqual(self.bet_round_2.total_points, 1)
+        self.assertEqual(self.bet_round_2.rank, 2)
+
+
+class FinalizeMatchesFanOutTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.round = RoundFactory(round_state=Round.PENDING_ROUND)
+        self.start_date = now() - timedelta(hours=3)
+        self.match_1 = MatchFactory(
+            round=self.round, match_state=Match.PENDING_MATCH, api_match_id=1, start_date=self.start_date
+        )
+        self.match_2 = MatchFactory(
+            round=self.round, match_state=Match.PENDING_MATCH, api_match_id=2, start_date=self.start_date
+        )
+
+    def get_fixtures(self):
+        return {
+            api_match_id: {
+                'goals': {'home': 1, 'away': 1},
+                'fixture': {'id': api_match_id, 'status': {'long': 'Match Finished'}},
+            }
+            for api_match_id in [1, 2]
+        }
+
+    @patch('apps.league.tasks.send_push_finalized_round')
+    @patch('apps.league.tasks.update_round_winners_prizes')
+    @patch('apps.match.tasks.fetch_fixtures')
+    def test_round_finalized_after_matches(self, mock_fetch_fixtures, mock_winners_prizes, mock_push):
+        """Test that the chord callback finalizes the round once all its matches are finalized"""
+        mock_fetch_fixtures.return_value = self.get_fixtures()
+
+        finalize_matches()
+
+        self.round.refresh_from_db()
+        self.assertEqual(
+            set(Match.objects.filter(round=self.round).values_list('match_state', flat=True)),
+            {Match.FINALIZED_MATCH}
+        )
+        self.assertEqual(self.round.round_state, Round.FINALIZED_ROUND)
+
+    @patch('apps.match.tasks.fetch_fixtures')
+    def test_failing_match_does_not_block_others(self, mock_fetch_fixtures):
+        fixtures = self.get_fixtures()
+        fixtures[1]['goals'] = None
+        mock_fetch_fixtures.return_value = fixtures
+
+        finalize_matches()
+
+        self.match_1.refresh_from_db()
+        self.match_2.refresh_from_db()
+        self.round.refresh_from_db()
+        self.assertEqual(self.match_1.match_state, Match.PENDING_MATCH)
+        self.assertEqual(self.match_2.match_state, Match.FINALIZED_MATCH)
+        self.assertEqual(self.round.round_state, Round.PENDING_ROUND)
+
+
+    @patch('apps.match.tasks.fetch_fixtures')
+    def test_skips_matches_in_play(self, mock_fetch_fixtures):
+        """Test that the matches still covered by their check_match_result task are not polled"""
+        mock_fetch_fixtures.return_value = self.get_fixtures()
+        Match.objects.filter(id=self.match_1.id).update(start_date=now() - timedelta(minutes=30))
+
+        finalize_matches()
+
+        self.assertEqual(list(mock_fetch_fixtures.call_args.args[0]), [2])
+        self.match_1.refresh_from_db()
+        self.assertEqual(self.match_1.match_state, Match.PENDING_MATCH)
+
 
 class UpdateMatchesStartDate(TestCase):
     def setUp(self):
+        cache.clear()
         self.tomorrow = now() + timedelta(days=1)
         self.in_12_hs = now() + timedelta(hours=12)
         self.two_hs_less = now() - timedelta(hours=2)
@@ -196,14 +282,16 @@ class UpdateMatchesStartDate(TestCase):
             team_1=self.team_1, 
             team_2=self.team_2, 
             start_date=None,
-            match_state=Match.NOT_STARTED_MATCH
+            match_state=Match.NOT_STARTED_MATCH,
+            api_match_id=1
         )
         self.match_2 = MatchFactory(
             round=self.round, 
             team_1=self.team_3, 
             team_2=self.team_4,
             start_date=self.in_12_hs,
-            match_state=Match.NOT_STARTED_MATCH
+            match_state=Match.NOT_STARTED_MATCH,
+            api_match_id=2
         )
         self.match_3 = MatchFactory(
             round=self.round,
@@ -220,8 +308,8 @@ class UpdateMatchesStartDate(TestCase):
             match_state=Match.PENDING_MATCH
         )
 
-    @patch('apps.match.tasks.requests.get')
-    def test_update_matches_start_date(self, mock_requests_get):
+    @patch('apps.match.api_football.api_football_get_async')
+    def test_update_matches_start_date(self, mock_api_football_get_async):
         """
             Test that matches start dates and round start dates are updated successfully
         """
@@ -229,21 +317,21 @@ class UpdateMatchesStartDate(TestCase):
         
         # Create a mock API response
         fake_api_response = f"""{{
-            "response": [{{
-                "fixture": {{"date": "{new_start_date}"}} 
-            }}]
+            "errors": [],
+            "response": [
+                {{"fixture": {{"id": 1, "date": "{new_start_date}"}}}},
+                {{"fixture": {{"id": 2, "date": "{new_start_date}"}}}}
+            ]
         }}"""
 
         # Configure the mock response
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.get.return_value.text = fake_api_response
-        mock_requests_get.return_value.text = fake_api_response 
+        mock_api_football_get_async.return_value = (200, json.loads(fake_api_response))
 
         update_matches_start_date()
 
-        # Debugging: Check if the mock was called
-        mock_requests_get.assert_called()
+        # Both matches are fetched with a single multi-id request
+        mock_api_football_get_async.assert_called_once()
+        self.assertEqual(mock_api_football_get_async.call_args.kwargs['params']['ids'], '1-2')
 
         # Refresh all instances
         self.match_1.refresh_from_db()
@@ -258,9 +346,20 @@ class UpdateMatchesStartDate(TestCase):
         self.assertEqual(self.match_1.start_date, new_start_date)
         self.assertEqual(self.match_4.start_date, self.in_12_hs)
 
+    @patch('apps.match.tasks.has_quota', return_value=False)
+    @patch('apps.match.api_football.api_football_get_async')
+    def test_update_matches_start_date_deferred(self, mock_api_football_get_async, mock_has_quota):
+        """Test that the update is deferred when the low priority budget is used"""
+        update_matches_start_date()
+
+        mock_api_football_get_async.assert_not_called()
+        self.match_2.refresh_from_db()
+        self.assertEqual(self.match_2.start_date, self.in_12_hs)
+
 
 class CheckSuspendedMatchesTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.league = LeagueFactory(name='Suspended Matches Testing')
         self.team_1 = TeamFactory(leagues=[self.league])
         self.team_2 = TeamFactory(leagues=[self.league])
@@ -284,15 +383,17 @@ class CheckSuspendedMatchesTest(TestCase):
             api_match_id=2
         )
 
-    @patch('apps.match.tasks.requests.get')
-    def test_sends_email_for_suspended_match(self, mock_requests_get):
+    @patch('apps.match.api_football.api_football_get_async')
+    def test_sends_email_for_suspended_match(self, mock_api_football_get_async):
         """
             Test that an email is sent when a match is suspended
         """
         # Create a mock API response
         fake_api_response = f"""{{
+            "errors": [],
             "response": [{{
                 "fixture": {{
+                    "id": 1,
                     "status": {{
                         "short": "SUSP"
                     }}
@@ -301,10 +402,7 @@ class CheckSuspendedMatchesTest(TestCase):
         }}"""
 
         # Configure the mock response
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.get.return_value.text = fake_api_response
-        mock_requests_get.return_value.text = fake_api_response 
+        mock_api_football_get_async.return_value = (200, json.loads(fake_api_response))
 
         check_suspended_matches()
 
@@ -314,15 +412,17 @@ class CheckSuspendedMatchesTest(TestCase):
         self.assertIn('Reported Status: SUSP', email.body)
 
 
-    @patch('apps.match.tasks.requests.get')
-    def test_no_email_sent_for_non_suspended_match(self, mock_requests_get):
+    @patch('apps.match.api_football.api_football_get_async')
+    def test_no_email_sent_for_non_suspended_match(self, mock_api_football_get_async):
         """
             Test that no email is sent when a match is not suspended
         """
         # Create a mock API response
         fake_api_response = f"""{{
+            "errors": [],
             "response": [{{
                 "fixture": {{
+                    "id": 1,
                     "status": {{
                         "short": "FT"
                     }}
@@ -331,11 +431,220 @@ class CheckSuspendedMatchesTest(TestCase):
         }}"""
 
         # Configure the mock response
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.get.return_value.text = fake_api_response
-        mock_requests_get.return_value.text = fake_api_response 
+        mock_api_football_get_async.return_value = (200, json.loads(fake_api_response))
 
         check_suspended_matches()
 
-        self.assertEqual(len(mail.outbox), 0)
\ No newline at end of file
+        self.assertEqual(len(mail.outbox), 0)
+
+class KickoffSchedulingTest(TestCase):
+    def setUp(self):
+        self.round = RoundFactory()
+        self.start_date = (now() + timedelta(days=1)).replace(microsecond=0)
+        self.match = MatchFactory(
+            round=self.round,
+            start_date=self.start_date,
+            match_state=Match.NOT_STARTED_MATCH,
+            api_match_id=10
+        )
+        self.bet_round = BetRoundFactory(round=self.round)
+        self.match_result = MatchResultFactory(
+            goals_team_1=1, goals_team_2=0, bet_round=self.bet_round, match=self.match
+        )
+        cache.clear()
+
+    @patch('apps.match.tasks.check_match_result.apply_async')
+    @patch('apps.match.tasks.mark_match_pending.apply_async')
+    def test_schedule_match_tasks(self, mock_mark_pending, mock_check_result):
+        """Test that only the kickoff tasks due soon are enqueued, after the commit and once"""
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_match_tasks(self.match)
+        mock_mark_pending.assert_not_called()
+
+        start_date = (now() + timedelta(minutes=30)).replace(microsecond=0)
+        self.match.start_date = start_date
+        self.match.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_match_tasks(self.match)
+            mock_mark_pending.assert_not_called()
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_match_tasks(self.match)
+
+        args = [self.match.id, start_date.isoformat()]
+        mock_mark_pending.assert_called_once_with(args=args, eta=start_date - PENDING_BEFORE_KICKOFF)
+        mock_check_result.assert_not_called()
+
+    @patch('apps.match.tasks.check_match_result.apply_async')
+    @patch('apps.match.tasks.mark_match_pending.apply_async')
+    def test_schedule_kickoff_tasks(self, mock_mark_pending, mock_check_result):
+        """Test that the beat task enqueues the result check of a match in play"""
+        start_date = (now() - RESULT_CHECK_AFTER_KICKOFF + timedelta(minutes=10)).replace(microsecond=0)
+        self.match.start_date = start_date
+        self.match.match_state = Match.PENDING_MATCH
+        self.match.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_kickoff_tasks()
+
+        mock_mark_pending.assert_not_called()
+        mock_check_result.assert_called_once_with(
+            args=[self.match.id, start_date.isoformat()], eta=start_date + RESULT_CHECK_AFTER_KICKOFF
+        )
+
+    def test_finalize_match_once(self):
+        """Test that a match finalized in between is not finalized again"""
+        match_response = {
+            'goals': {'home': 1, 'away': 0},
+            'fixture': {'id': 10, 'status': {'long': 'Match Finished'}},
+        }
+        self.match.match_state = Match.PENDING_MATCH
+        self.match.save()
+        stale_match = Match.objects.get(id=self.match.id)
+
+        self.assertTrue(finalize_match(match=self.match, match_response=match_response))
+        self.assertFalse(finalize_match(match=stale_match, match_response=match_response))
+
+        self.assertEqual(MatchResult.objects.filter(match=self.match, original_result=True).count(), 1)
+        self.bet_round.refresh_from_db()
+        self.assertEqual(self.bet_round.total_points, 3)
+
+    def test_mark_match_pending(self):
+        mark_match_pending(self.match.id, self.start_date.isoformat())
+
+        self.match.refresh_from_db()
+        self.assertEqual(self.match.match_state, Match.PENDING_MATCH)
+
+    def test_mark_match_pending_rescheduled(self):
+        """Test that a task scheduled for an old start date does nothing"""
+        old_start_date = self.start_date - timedelta(hours=2)
+
+        mark_match_pending(self.match.id, old_start_date.isoformat())
+
+        self.match.refresh_from_db()
+        self.assertEqual(self.match.match_state, Match.NOT_STARTED_MATCH)
+
+    @patch('apps.match.tasks.fetch_fixtures')
+    def test_check_match_result_finalizes(self, mock_fetch_fixtures):
+        self.match.match_state = Match.PENDING_MATCH
+        self.match.save()
+        mock_fetch_fixtures.return_value = {10: {
+            'goals': {'home': 1, 'away': 0},
+            'fixture': {'id': 10, 'status': {'long': 'Match Finished'}},
+        }}
+
+        check_match_result(self.match.id, self.start_date.isoformat())
+
+        self.match.refresh_from_db()
+        self.match_result.refresh_from_db()
+        self.assertEqual(self.match.match_state, Match.FINALIZED_MATCH)
+        self.assertEqual(self.match_result.points, 3)
+
+    @patch('apps.match.tasks.check_match_result.apply_async')
+    @patch('apps.match.tasks.fetch_fixtures')
+    def test_check_match_result_backoff(self, mock_fetch_fixtures, mock_check_result):
+        """Test that a match still in play is checked again after the next backoff delay"""
+        self.match.match_state = Match.PENDING_MATCH
+        self.match.save()
+        mock_fetch_fixtures.return_value = {10: {
+            'goals': {'home': 1, 'away': 0},
+            'fixture': {'id': 10, 'status': {'long': 'Second Half'}},
+        }}
+
+        check_match_result(self.match.id, self.start_date.isoformat(), attempt=1)
+
+        self.match.refresh_from_db()
+        self.assertEqual(self.match.match_state, Match.PENDING_MATCH)
+        mock_check_result.assert_called_once_with(
+            args=[self.match.id, self.start_date.isoformat(), 2], countdown=RESULT_CHECK_BACKOFF[1]
+        )
+
+
+class FetchFixturesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @patch('apps.match.api_football.api_football_get_async')
+    def test_fetch_fixtures_in_chunks(self, mock_api_football_get_async):
+        """Test that the ids are requested in chunks and the fixtures are mapped by id"""
+        async def fake_get(session, path, params, priority):
+            ids = params['ids'].split('-')
+            return 200, {
+                'errors': [],
+                'response': [{'fixture': {'id': int(api_match_id)}} for api_match_id in ids],
+            }
+        mock_api_football_get_async.side_effect = fake_get
+
+        with patch('apps.match.api_football.FIXTURE_IDS_CHUNK_SIZE', 2):
+            fixtures = fetch_fixtures([1, 2, None, 3, 2])
+
+        self.assertEqual(mock_api_football_get_async.call_count, 2)
+        self.assertEqual(sorted(fixtures), [1, 2, 3])
+        self.assertEqual(fixtures[3], {'fixture': {'id': 3}})
+
+    @patch('apps.match.api_football.api_football_get_async')
+    def test_fetch_fixtures_concurrency(self, mock_api_football_get_async):
+        """Test that the chunks are requested concurrently up to the concurrency limit"""
+        in_flight = []
+        max_in_flight = []
+
+        async def fake_get(session, path, params, priority):
+            in_flight.append(params['ids'])
+            max_in_flight.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(params['ids'])
+            return 200, {'errors': [], 'response': []}
+        mock_api_football_get_async.side_effect = fake_get
+
+        with patch('apps.match.api_football.FIXTURE_IDS_CHUNK_SIZE', 1):
+            asyncio.run(fetch_fixtures_async(range(1, 8), concurrency=3))
+
+        self.assertEqual(mock_api_football_get_async.call_count, 7)
+        self.assertEqual(max(max_in_flight), 3)
+
+    @patch('apps.match.api_football.api_football_get_async')
+    def test_fetch_fixtures_api_errors(self, mock_api_football_get_async):
+        """Test that a chunk with errors is skipped"""
+        mock_api_football_get_async.return_value = (200, {
+            'errors': {'token': 'Error/Missing application key.'},
+            'response': [],
+        })
+
+        self.assertEqual(fetch_fixtures([1, 2]), {})
+
+    @patch('apps.match.api_football.api_football_get_async')
+    def test_fetch_fixtures_cache(self, mock_api_football_get_async):
+        """Test that cached fixtures are not requested again and the hits and misses are counted"""
+        mock_api_football_get_async.return_value = (200, {'errors': [], 'response': [
+            {'fixture': {'id': 1, 'status': {'short': 'FT'}}},
+            {'fixture': {'id': 2, 'status': {'short': '2H'}}},
+        ]})
+        fetch_fixtures([1, 2])
+
+        mock_api_football_get_async.return_value = (200, {'errors': [], 'response': [
+            {'fixture': {'id': 3, 'status': {'short': 'NS'}}},
+        ]})
+        fixtures = fetch_fixtures([1, 2, 3])
+
+        self.assertEqual(mock_api_football_get_async.call_count, 2)
+        self.assertEqual(mock_api_football_get_async.call_args.kwargs['params']['ids'], '3')
+        self.assertEqual(sorted(fixtures), [1, 2, 3])
+        self.assertEqual(get_fixture_cache_stats(), {'hits': 2, 'misses': 3})
+
+    @patch('apps.match.api_football.cache.set_many')
+    @patch('apps.match.api_football.api_football_get_async')
+    def test_fetch_fixtures_cache_timeout(self, mock_api_football_get_async, mock_set_many):
+        """Test that finished fixtures are cached longer than live ones"""
+        mock_api_football_get_async.return_value = (200, {'errors': [], 'response': [
+            {'fixture': {'id': 1, 'status': {'short': 'FT'}}},
+            {'fixture': {'id': 2, 'status': {'short': '2H'}}},
+        ]})
+
+        fetch_fixtures([1, 2])
+
+        timeouts = {
+            tuple(call.args[0]): call.args[1] for call in mock_set_many.call_args_list
+        }
+        self.assertEqual(timeouts, {
+            (fixture_cache_key(1),): FINISHED_FIXTURE_CACHE_TIMEOUT,
+            (fixture_cache_key(2),): LIVE_FIXTURE_CACHE_TIMEOUT,
+        })
@@ -42,6 +42,19 @@ class MatchResultsListCreateTest(APITestCase):
         self.assertEqual(len(response.data), 2)
         self.assertEqual(response.data[0]['id'], self.match_result_1.id)
 
+    def test_get_match_results_without_predictions(self):
+        """Test that the matches without a stored prediction are returned empty"""
+        match_3 = MatchFactory(round=self.round, team_1=self.team_2, team_2=self.team_3)
+
+        response = self.client.get(self.url, {'round_id': self.bet_round.round.id})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response.data[2]['id'], None)
+        self.assertEqual(response.data[2]['match']['id'], match_3.id)
+        self.assertEqual(response.data[2]['goals_team_1'], None)
+        self.assertEqual(MatchResult.objects.count(), 2)
+
 
 class MatchResultsUpdateTest(APITestCase):
     def setUp(self):
@@ -121,6 +134,66 @@ class MatchResultsUpdateTest(APITestCase):
         )
         self.assertEqual(self.match_result_3.goals_team_2, None)
 
+    def test_create_results(self):
+        """Test that the predictions without a MatchResult are created in the user BetRound"""
+        match_4 = MatchFactory(
+            round=self.round,
+            team_1=self.team_2,
+            team_2=self.team_1,
+            start_date=timezone.now() + timezone.timedelta(hours=3)
+        )
+        other_bet_round = BetRoundFactory(round=self.round)
+        MatchResultFactory(bet_round=other_bet_round, match=match_4, goals_team_1=0, goals_team_2=0)
+        matchResults = [
+            {'id': None, 'match_id': match_4.id, 'goals_team_1': 2, 'goals_team_2': None},
+            {'id': None, 'match_id': self.match_already_started.id, 'goals_team_1': 1, 'goals_team_2': 1},
+        ]
+        self.match_result_3.delete()
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.post(self.url, {'matchResults': matchResults}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(self.url, {'matchResults': matchResults}, format='json')
+
+        match_result = MatchResult.objects.get(bet_round=self.bet_round, match=match_4)
+        self.assertEqual((match_result.goals_team_1, match_result.goals_team_2), (2, 0))
+        self.assertFalse(
+            MatchResult.objects.filter(bet_round=self.bet_round, match=self.match_already_started).exists()
+        )
+        self.assertEqual(MatchResult.objects.filter(match=match_4).count(), 2)
+
+    def test_create_results_from_listed_predictions(self):
+        """Test that the predictions are created as the list endpoint returns them"""
+        self.client.force_authenticate(user=self.user)
+        match_4 = MatchFactory(
+            round=self.round, start_date=timezone.now() + timezone.timedelta(hours=3)
+        )
+        listed = self.client.get('/api/matches/match_results/', {'round_id': self.round.id}).data
+        placeholder = next(result for result in listed if result['match']['id'] == match_4.id)
+        self.assertEqual((placeholder['id'], placeholder['match_id']), (None, match_4.id))
+
+        nested = dict(placeholder, goals_team_1=1, goals_team_2=0)
+        del nested['match_id']
+        response = self.client.post(self.url, {'matchResults': [nested]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(MatchResult.objects.filter(bet_round=self.bet_round, match=match_4).exists())
+
+    def test_create_results_unsaved(self):
+        """Test that the predictions that can not be created are reported"""
+        self.client.force_authenticate(user=self.user)
+        other_match = MatchFactory(start_date=timezone.now() + timezone.timedelta(hours=3))
+        matchResults = [
+            {'id': None, 'goals_team_1': 1, 'goals_team_2': 1},
+            {'id': None, 'match_id': other_match.id, 'goals_team_1': 2, 'goals_team_2': 0},
+        ]
+
+        response = self.client.post(self.url, {'matchResults': matchResults}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['unsaved'], matchResults)
+        self.assertFalse(MatchResult.objects.filter(match=other_match).exists())
+
 
 class MatchResultOriginalTest(APITestCase):
     def setUp(self):
@@ -31,4 +31,34 @@ def get_match_result_points(user_goals_team_1, user_goals_team_2, original_goals
             )
         ):
             return 1
-    return 0
\ No newline at end of file
+    return 0
+
+
+def get_submitted_goals(result_data):
+    """
+        Return:
+        (goals_team_1, goals_team_2) of a submitted prediction, or None if it has no goals.
+        In the case one of the team scores is an Integer and the other None, the latter
+        will be set to 0
+    """
+    goals_team_1 = result_data.get('goals_team_1')
+    goals_team_2 = result_data.get('goals_team_2')
+    if type(goals_team_1) == int and type(goals_team_2) == int:
+        return goals_team_1, goals_team_2
+    elif type(goals_team_1) == int and not goals_team_2:
+        return goals_team_1, 0
+    elif type(goals_team_2) == int and not goals_team_1:
+        return 0, goals_team_2
+    return None
+
+
+def get_submitted_match_id(result_data):
+    """
+        Return:
+        Id of the match of a submitted prediction, from its match_id or from its nested match
+        as the match results are listed, or None if it has none
+    """
+    match_id = result_data.get('match_id')
+    if match_id is None and isinstance(result_data.get('match'), dict):
+        match_id = result_data['match'].get('id')
+    return match_id if type(match_id) == int else None
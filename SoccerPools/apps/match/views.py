@@ -4,31 +4,50 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from apps.bet.models import BetRound
 from .serializers import MatchResultSerializer
 from .models import MatchResult, Match
+from .services import create_match_results, get_bet_round_match_results
+from .utils import get_submitted_goals, get_submitted_match_id
 
 logger = logging.getLogger(__name__)
 class MatchResultsListCreateApiView(generics.ListCreateAPIView):
     permission_class = (permissions.IsAuthenticated,)
     serializer_class = MatchResultSerializer
 
-    def get_queryset(self):
-        round_id = self.request.query_params.get('round_id')
-        match_results = MatchResult.objects.filter(
-            bet_round__round__id=round_id,
-            bet_round__bet_league__user=self.request.user,
+    def list(self, request, *args, **kwargs):
+        """
+            MatchResults of the user for every match of the round, the matches without a
+            prediction yet are returned with a null id and goals
+        """
+        bet_round = BetRound.objects.filter(
+            round_id=request.query_params.get('round_id'),
+            bet_league__user=request.user,
             state=True
-        ).order_by('match__start_date')
-        return match_results
+        ).first()
+        match_results = get_bet_round_match_results(bet_round) if bet_round else []
+        serializer = self.get_serializer(match_results, many=True)
+        return Response(serializer.data)
     
 
 class MatchResultsUpdateApiView(APIView):
     permission_class = (permissions.IsAuthenticated,)
 
     def post(self, request):
+        """
+            Update the submitted predictions of matches that have not started. Predictions
+            with a null id have no MatchResult yet, they are identified by their match_id,
+            or the id of their nested match as the list endpoint returns them, and created
+            in the BetRound of the user.
+            Predictions with a null id that can not be saved, without a match or for a match
+            out of the rounds of the user, are returned in unsaved with a 400, the rest of
+            the predictions are saved
+        """
         match_results_data = request.data.get('matchResults')
 
-        match_results_ids = [match_result['id'] for match_result in match_results_data]
+        match_results_ids = [
+            match_result['id'] for match_result in match_results_data if match_result.get('id')
+        ]
         match_results = MatchResult.objects.select_related('match').filter(
             id__in=match_results_ids, 
             match__start_date__gt=timezone.now(),
@@ -39,25 +58,38 @@ class MatchResultsUpdateApiView(APIView):
         match_result_map = {match_result.id: match_result for match_result in match_results}
 
         # Update the fields in bulk
+        new_goals = {}
+        new_results_data = {}
+        unsaved = []
         for result_data in match_results_data:
-            match_result = match_result_map.get(result_data['id'])
+            goals = get_submitted_goals(result_data)
+            if goals is None:
+                continue
+            match_result = match_result_map.get(result_data.get('id'))
             if match_result:
-                goals_team_1 = result_data['goals_team_1']
-                goals_team_2 = result_data['goals_team_2']
-
-                # In the case one of the team scores is an Integer and the other None,
-                # the latter will be set to 0
-                if type(goals_team_1) == int and type(goals_team_2) == int:
-                    match_result.goals_team_1 = goals_team_1
-                    match_result.goals_team_2 = goals_team_2
-                elif type(goals_team_1) == int and not goals_team_2:
-                    match_result.goals_team_1 = goals_team_1
-                    match_result.goals_team_2 = 0
-                elif type(goals_team_2) == int and not goals_team_1:
-                    match_result.goals_team_1 = 0
-                    match_result.goals_team_2 = goals_team_2
+                match_result.goals_team_1, match_result.goals_team_2 = goals
+            elif not result_data.get('id'):
+                match_id = get_submitted_match_id(result_data)
+                if match_id is None:
+                    unsaved.append(result_data)
+                    continue
+                new_goals[match_id] = goals
+                new_results_data[match_id] = result_data
 
         MatchResult.objects.bulk_update(match_results, ['goals_team_1', 'goals_team_2'])
+        if new_goals:
+            unsaved_match_ids = create_match_results(user=request.user, new_goals=new_goals)
+            unsaved += [new_results_data[match_id] for match_id in unsaved_match_ids]
+
+        if unsaved:
+            logger.warning(
+                'User %s submitted %s match results that were not saved',
+                request.user.username, len(unsaved)
+            )
+            return Response({
+                'error': 'Some match results could not be saved',
+                'unsaved': unsaved,
+            }, status=status.HTTP_400_BAD_REQUEST)
 
         logger.info('User %s updated match results', request.user.username)
         return Response({'success': 'Match results updated successfully!'})
@@ -0,0 +1,6 @@
+from rest_framework.pagination import LimitOffsetPagination
+
+class LeaderboardLimitOffsetPagination(LimitOffsetPagination):
+    """Leaderboards are only paginated when the client sends a limit"""
+    default_limit = None
+    max_limit = 100
@@ -1,11 +1,15 @@
 import logging
 from decimal import Decimal
 from django.db import transaction
-from django.db.models import Sum, F
+from django.db.models import Case, Count, Q, Sum, F, Value, When, Window
+from django.db.models.functions import Coalesce, RowNumber
 from django.utils import timezone
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.core.mail import mail_admins
 from apps.league.models import Round
 from apps.match.models import Match, MatchResult
+from apps.match.services import materialize_match_results
 from apps.bet.models import BetLeague, BetRound
 from .models import (
     PaidLeagueConfig, Payment, PaidBetRound, PaidPrizePool, PaidWinner,
@@ -19,6 +23,9 @@ FIRST_PLACE_PERCENTAGE = Decimal('0.70')
 SECOND_PLACE_PERCENTAGE = Decimal('0.20')
 THIRD_PLACE_PERCENTAGE = Decimal('0.10')
 
+# Leaderboards are refreshed constantly on match days, a short cache absorbs the bursts
+LEADERBOARD_CACHE_TIMEOUT = 30
+
 def calculate_payment_amounts(gross_amount, fee_percentage):
     """Calculate platform fee and prize pool contribution"""
     fee_rate = fee_percentage / Decimal('100')
@@ -212,14 +219,8 @@ def _create_round_bet_records(payment):
         defaults={'state': True}
     )
 
-    # If BetRound was just created, create MatchResult records
-    if bet_round_created:
-        matches = Match.objects.filter(round=round_obj, state=True)
-        for match in matches:
-            MatchResult.objects.create(
-                bet_round=bet_round,
-                match=match,
-            )
+    # Free predictions are created when submitted, paid ones are addressed by id
+    materialize_match_results(bet_round, Match.objects.filter(round=round_obj, state=True))
 
     # Create PaidBetRound
     paid_bet_round = PaidBetRound.objects.create(
@@ -280,15 +281,10 @@ def _create_league_bet_records(payment):
             defaults={'state': True}
         )
 
-        # If BetRound was just created, create MatchResult records
         if bet_round_created:
             auto_registered_count += 1
-            matches = Match.objects.filter(round=round_obj, state=True)
-            for match in matches:
-                MatchResult.objects.create(
-                    bet_round=bet_round,
-                    match=match,
-                )
+        # Free predictions are created when submitted, paid ones are addressed by id
+        materialize_match_results(bet_round, Match.objects.filter(round=round_obj, state=True))
 
         # Create PaidBetRound
         paid_bet_round = PaidBetRound.objects.create(
@@ -361,84 +357,79 @@ def _update_league_prize_pool(payment):
 
 
 def distribute_round_prizes(round):
-    """Distribute prizes for a finalized round"""
-    try:
-        prize_pool = PaidPrizePool.objects.filter(
-            round=round,
-            is_league_pool=False,
-            distributed=False,
-            state=True,
-        ).first()
-
-        if not prize_pool:
-            logger.info('No undistributed prize pool for round %s', round.name)
-            return True
-
-        if prize_pool.effective_pool_ars <= 0:
-            prize_pool.distributed = True
-            prize_pool.save()
-            return True
-
-        paid_bet_rounds = PaidBetRound.objects.filter(
-            round=round,
-            state=True,
-        )
+    """
+        Distribute prizes for a finalized round
 
-        # Calculate points for each bet using MatchResult
-        bet_points = []
-        for bet in paid_bet_rounds:
-            points = MatchResult.objects.filter(
-                paid_bet_round=bet,
-                state=True
-            ).aggregate(total=Sum('points'))['total'] or 0
-            bet_points.append((bet, points))
+        The podium follows the free mode leaderboard ordering: points, then exact results,
+        then the lowest PaidBetRound id (the earliest entry) for users tied on both. The
+        prize pool row is locked while distributing, so concurrent calls for the same round
+        wait and then find it already distributed
+    """
+    try:
+        with transaction.atomic():
+            prize_pool = PaidPrizePool.objects.select_for_update().filter(
+                round=round,
+                is_league_pool=False,
+                distributed=False,
+                state=True,
+            ).first()
+
+            if not prize_pool:
+                logger.info('No undistributed prize pool for round %s', round.name)
+                return True
+
+            if prize_pool.effective_pool_ars <= 0:
+                prize_pool.distributed = True
+                prize_pool.save()
+                return True
+
+            # The fourth row tells whether a tie decided the last podium spot
+            ranked_bets = list(
+                _rank_leaderboard(
+                    PaidBetRound.objects.filter(round=round, state=True).select_related('user'),
+                    tie_breaker='id',
+                )[:4]
+            )
 
-        # Sort by points descending
-        bet_points.sort(key=lambda x: x[1], reverse=True)
+            if len(ranked_bets) < 3:
+                logger.warning(
+                    'Not enough participants for round %s (need 3, have %d)',
+                    round.name, len(ranked_bets)
+                )
+                return False
 
-        if len(bet_points) < 3:
-            logger.warning(
-                'Not enough participants for round %s (need 3, have %d)',
-                round.name, len(bet_points)
-            )
-            return False
+            _log_podium_ties(round, ranked_bets)
 
-        with transaction.atomic():
             # Calculate prize amounts
             total = prize_pool.effective_pool_ars
-            first_prize = total * FIRST_PLACE_PERCENTAGE
-            second_prize = total * SECOND_PLACE_PERCENTAGE
-            third_prize = total * THIRD_PLACE_PERCENTAGE
-
-            # Create winner records
             winners_data = [
-                (bet_points[0][0], 1, first_prize),
-                (bet_points[1][0], 2, second_prize),
-                (bet_points[2][0], 3, third_prize),
+                (ranked_bets[0], 1, total * FIRST_PLACE_PERCENTAGE),
+                (ranked_bets[1], 2, total * SECOND_PLACE_PERCENTAGE),
+                (ranked_bets[2], 3, total * THIRD_PLACE_PERCENTAGE),
             ]
 
-            for bet, position, prize in winners_data:
-                bet_round = bet
-                if position == 1:
-                    bet_round.winner_first = True
-                elif position == 2:
-                    bet_round.winner_second = True
-                else:
-                    bet_round.winner_third = True
-                bet_round.save()
-
-                PaidWinner.objects.create(
+            PaidBetRound.objects.filter(id__in=[bet.id for bet, _, _ in winners_data]).update(
+                winner_first=Case(When(id=ranked_bets[0].id, then=Value(True)), default=F('winner_first')),
+                winner_second=Case(When(id=ranked_bets[1].id, then=Value(True)), default=F('winner_second')),
+                winner_third=Case(When(id=ranked_bets[2].id, then=Value(True)), default=F('winner_third')),
+            )
+            PaidWinner.objects.bulk_create([
+                PaidWinner(
                     user=bet.user,
                     prize_pool=prize_pool,
                     position=position,
                     prize_amount_ars=prize.quantize(Decimal('0.01')),
                 )
+                for bet, position, prize in winners_data
+            ])
 
             prize_pool.distributed = True
             prize_pool.save()
 
-            _notify_admins_of_winners(round, winners_data)
+            transaction.on_commit(lambda: _notify_admins_of_winners(round, winners_data))
 
+        # The winner flags changed
+        cache.delete(round_leaderboard_cache_key(round))
         logger.info('Distributed prizes for round %s', round.name)
         return True
 
@@ -447,6 +438,18 @@ def distribute_round_prizes(round):
         return False
 
 
+def _log_podium_ties(round, ranked_bets):
+    """Log the podium positions decided by entry order because of a tie on points and exact results"""
+    for position, (bet, next_bet) in enumerate(zip(ranked_bets, ranked_bets[1:]), start=1):
+        if (bet.total_points, bet.exact_results_count) == (next_bet.total_points, next_bet.exact_results_count):
+            logger.warning(
+                'Round %s: %s and %s tied for position %d with %d points and %d exact results, '
+                'the earliest entry ranks first',
+                round.name, bet.user.username, next_bet.user.username, position,
+                bet.total_points, bet.exact_results_count
+            )
+
+
 def _notify_admins_of_winners(round, winners_data):
     """Send email notification to admins about winners"""
     subject = f'[Soccer Pools] Winners for {round.name}'
@@ -471,6 +474,92 @@ def _notify_admins_of_winners(round, winners_data):
     mail_admins(subject, '\n'.join(message_lines))
 
 
+def _rank_leaderboard(paid_bet_rounds, tie_breaker):
+    """
+        Annotate the points and exact results summed over the active match results of the
+        grouped PaidBetRounds, and the position the database assigns over them
+    """
+    active_match_results = Q(match_results__state=True)
+    return paid_bet_rounds.annotate(
+        total_points=Coalesce(Sum('match_results__points', filter=active_match_results), Value(0)),
+        exact_results_count=Count(
+            'match_results', filter=active_match_results & Q(match_results__is_exact=True)
+        ),
+    ).annotate(
+        rank=Window(
+            expression=RowNumber(),
+            order_by=[
+                F('total_points').desc(), F('exact_results_count').desc(), F(tie_breaker).asc()
+            ],
+        ),
+    ).order_by('rank')
+
+
+def _leaderboard_entry(row, winner_first=False, winner_second=False, winner_third=False):
+    return {
+        'rank': row['rank'],
+        'username': row['user__username'],
+        'profile_image': default_storage.url(row['user__profile_image']) if row['user__profile_image'] else None,
+        'points': row['total_points'],
+        'exact_results': row['exact_results_count'],
+        'winner_first': winner_first,
+        'winner_second': winner_second,
+        'winner_third': winner_third,
+    }
+
+
+def round_leaderboard_cache_key(round):
+    return f'paid_leaderboard:round:{round.id}'
+
+
+def league_leaderboard_cache_key(league):
+    return f'paid_leaderboard:league:{league.id}'
+
+
+def get_round_leaderboard(round):
+    """
+        Ranked leaderboard entries of the PaidBetRounds of a round, computed with one
+        grouped query and cached for LEADERBOARD_CACHE_TIMEOUT seconds
+    """
+    def build():
+        rows = _rank_leaderboard(
+            PaidBetRound.objects.filter(round=round, state=True),
+            tie_breaker='id',
+        ).values(
+            'rank', 'user__username', 'user__profile_image', 'total_points',
+            'exact_results_count', 'winner_first', 'winner_second', 'winner_third',
+        )
+        return [
+            _leaderboard_entry(
+                row,
+                winner_first=row['winner_first'],
+                winner_second=row['winner_second'],
+                winner_third=row['winner_third'],
+            )
+            for row in rows
+        ]
+
+    return cache.get_or_set(round_leaderboard_cache_key(round), build, LEADERBOARD_CACHE_TIMEOUT)
+
+
+def get_league_leaderboard(league):
+    """
+        Ranked leaderboard entries of the paying users of a league with their PaidBetRounds
+        grouped per user, computed with one grouped query and cached for
+        LEADERBOARD_CACHE_TIMEOUT seconds
+    """
+    def build():
+        rows = _rank_leaderboard(
+            PaidBetRound.objects.filter(round__league=league, state=True).values(
+                'user_id', 'user__username', 'user__profile_image'
+            ),
+            tie_breaker='user_id',
+        )
+        return [_leaderboard_entry(row) for row in rows]
+
+    return cache.get_or_set(league_leaderboard_cache_key(league), build, LEADERBOARD_CACHE_TIMEOUT)
+
+
 def get_payment_by_reference(external_reference):
     return Payment.objects.filter(external_reference=external_reference).first()
 
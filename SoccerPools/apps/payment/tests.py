@@ -3,6 +3,7 @@ from unittest.mock import patch, MagicMock
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.test import TestCase
+from django.core.cache import cache
 from apps.app_user.models import AppUser
 from apps.app_user.factories import AppUserFactory
 from apps.bet.models import BetLeague, BetRound
@@ -250,6 +251,43 @@ class PrizeDistributionTest(TestCase):
         self.assertTrue(self.paid_bet_rounds[1].winner_second)
         self.assertTrue(self.paid_bet_rounds[2].winner_third)
 
+    def test_distribute_round_prizes_queries(self):
+        """Test that the number of queries does not grow with the participants"""
+        for i in range(10):
+            user = AppUserFactory(username=f'participant_{i}')
+            paid_bet_round = PaidBetRoundFactory(
+                user=user, round=self.round,
+                payment=PaymentFactory(user=user, league=self.league, round=self.round),
+            )
+            MatchResult.objects.create(paid_bet_round=paid_bet_round, match=self.match, points=0)
+
+        # Savepoint, locked prize pool, ranking, winner flags, winners, prize pool, release
+        with self.assertNumQueries(7):
+            self.assertTrue(distribute_round_prizes(self.round))
+
+        winners = PaidWinner.objects.filter(prize_pool=self.prize_pool).order_by('position')
+        self.assertEqual([winner.user for winner in winners], self.users)
+
+    def test_distribute_round_prizes_tie(self):
+        """Test that users tied on points and exact results are ranked by entry order"""
+        MatchResult.objects.filter(paid_bet_round=self.paid_bet_rounds[2]).update(points=2)
+        MatchResult.objects.filter(paid_bet_round=self.paid_bet_rounds[0]).update(
+            points=2, is_exact=False
+        )
+
+        with self.assertLogs('apps.payment.services', level='WARNING'):
+            self.assertTrue(distribute_round_prizes(self.round))
+
+        winners = PaidWinner.objects.filter(prize_pool=self.prize_pool).order_by('position')
+        self.assertEqual([winner.user for winner in winners], self.users)
+
+    def test_distribute_round_prizes_twice(self):
+        """Test that a second distribution of the same round does not create new winners"""
+        self.assertTrue(distribute_round_prizes(self.round))
+        self.assertTrue(distribute_round_prizes(self.round))
+
+        self.assertEqual(PaidWinner.objects.filter(prize_pool=self.prize_pool).count(), 3)
+
 
 class PaymentAPITest(APITestCase):
     """Test payment API endpoints"""
@@ -318,6 +356,7 @@ class PaymentAPITest(APITestCase):
 
     def test_round_leaderboard(self):
         """Test round leaderboard endpoint"""
+        cache.clear()
         payment = PaymentFactory(user=self.user, league=self.league, round=self.round)
         bet_round = PaidBetRoundFactory(user=self.user, round=self.round, payment=payment)
 
@@ -329,6 +368,98 @@ class PaymentAPITest(APITestCase):
         self.assertEqual(response.data[0]['username'], self.user.username)
 
 
+class PaidLeaderboardTest(APITestCase):
+    """Test the aggregated paid leaderboards"""
+
+    def setUp(self):
+        cache.clear()
+        self.league = LeagueFactory()
+        self.round_1 = RoundFactory(league=self.league, is_general_round=False)
+        self.round_2 = RoundFactory(league=self.league, is_general_round=False)
+        self.matches = [MatchFactory(round=self.round_1), MatchFactory(round=self.round_1)]
+        self.match_round_2 = MatchFactory(round=self.round_2)
+        self.users = [AppUserFactory(username=f'player_{i}') for i in range(4)]
+        # (points, is_exact) of each user for the two matches of round 1
+        predictions = [
+            [(1, False), (1, False)],
+            [(3, True), (0, False)],
+            [(0, False), (0, False)],
+            [(3, True), (1, False)],
+        ]
+        for user, user_predictions in zip(self.users, predictions):
+            paid_bet_round = PaidBetRoundFactory(
+                user=user, round=self.round_1,
+                payment=PaymentFactory(user=user, league=self.league, round=self.round_1),
+            )
+            for match, (points, is_exact) in zip(self.matches, user_predictions):
+                MatchResult.objects.create(
+                    paid_bet_round=paid_bet_round, match=match, points=points, is_exact=is_exact
+                )
+        # A removed prediction does not count
+        MatchResult.objects.filter(paid_bet_round__user=self.users[2]).update(points=3, state=False)
+
+        self.client.force_authenticate(user=self.users[0])
+
+    def test_round_leaderboard(self):
+        """Test that the entries are ranked by points, then exact results, in a single query"""
+        url = f'/api/payments/leaderboard/round/{self.round_1.slug}/'
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(entry['rank'], entry['username'], entry['points'], entry['exact_results']) for entry in response.data],
+            [
+                (1, self.users[3].username, 4, 1),
+                (2, self.users[1].username, 3, 1),
+                (3, self.users[0].username, 2, 0),
+                (4, self.users[2].username, 0, 0),
+            ]
+        )
+        self.assertTrue(response.data[0]['profile_image'])
+
+        # The second request is served from the cache
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+    def test_round_leaderboard_pagination(self):
+        """Test that the pages keep the rank assigned over the whole leaderboard"""
+        url = f'/api/payments/leaderboard/round/{self.round_1.slug}/'
+        response = self.client.get(url, {'limit': 2, 'offset': 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(
+            [(entry['rank'], entry['username']) for entry in response.data['results']],
+            [(3, self.users[0].username), (4, self.users[2].username)]
+        )
+
+    def test_league_leaderboard(self):
+        """Test that the PaidBetRounds of the league are grouped per user"""
+        paid_bet_round = PaidBetRoundFactory(
+            user=self.users[0], round=self.round_2,
+            payment=PaymentFactory(user=self.users[0], league=self.league, round=self.round_2),
+        )
+        MatchResult.objects.create(
+            paid_bet_round=paid_bet_round, match=self.match_round_2, points=3, is_exact=True
+        )
+
+        url = f'/api/payments/leaderboard/league/{self.league.slug}/'
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(entry['rank'], entry['username'], entry['points'], entry['exact_results']) for entry in response.data],
+            [
+                (1, self.users[0].username, 5, 1),
+                (2, self.users[3].username, 4, 1),
+                (3, self.users[1].username, 3, 1),
+                (4, self.users[2].username, 0, 0),
+            ]
+        )
+
+
 class PaidMatchResultUpdateTest(APITestCase):
     """Test updating match predictions"""
 
@@ -3,7 +3,6 @@ import hmac
 import logging
 from django.conf import settings as django_settings
 from django.shortcuts import get_object_or_404
-from django.db.models import Sum
 from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -19,8 +18,9 @@ from .serializers import (
 )
 from .services import (
     create_round_payment, create_league_payment, get_payment_by_reference,
-    update_payment_from_webhook,
+    update_payment_from_webhook, get_round_leaderboard, get_league_leaderboard,
 )
+from .pagination import LeaderboardLimitOffsetPagination
 
 logger = logging.getLogger(__name__)
 
@@ -297,105 +297,32 @@ class BulkUpdatePaidMatchResultsView(APIView):
         return Response(response_data)
 
 
+def paginate_leaderboard(leaderboard, request, view):
+    paginator = LeaderboardLimitOffsetPagination()
+    page = paginator.paginate_queryset(leaderboard, request, view=view)
+    if page is None:
+        return Response(LeaderboardEntrySerializer(leaderboard, many=True).data)
+    return paginator.get_paginated_response(LeaderboardEntrySerializer(page, many=True).data)
+
+
 class RoundLeaderboardView(APIView):
-    """Get leaderboard for a paid round"""
+    """Get leaderboard for a paid round, paginated with limit and offset when received"""
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, round_slug):
         round_obj = get_object_or_404(Round, slug=round_slug, state=True)
-
-        bet_rounds = PaidBetRound.objects.filter(
-            round=round_obj,
-            state=True,
-        ).select_related('user')
-
-        # Calculate points for each bet round using MatchResult
-        leaderboard = []
-        for bet_round in bet_rounds:
-            results = MatchResult.objects.filter(
-                paid_bet_round=bet_round,
-                state=True
-            ).aggregate(
-                total_points=Sum('points'),
-            )
-
-            exact_count = MatchResult.objects.filter(
-                paid_bet_round=bet_round,
-                is_exact=True,
-                state=True
-            ).count()
-
-            leaderboard.append({
-                'username': bet_round.user.username,
-                'profile_image': bet_round.user.profile_image.url if bet_round.user.profile_image else None,
-                'points': results['total_points'] or 0,
-                'exact_results': exact_count,
-                'winner_first': bet_round.winner_first,
-                'winner_second': bet_round.winner_second,
-                'winner_third': bet_round.winner_third,
-            })
-
-        # Sort by points descending, then by exact results
-        leaderboard.sort(key=lambda x: (-x['points'], -x['exact_results']))
-
-        # Add rank
-        for i, entry in enumerate(leaderboard):
-            entry['rank'] = i+1
-
-        serializer = LeaderboardEntrySerializer(leaderboard, many=True)
-        return Response(serializer.data)
+        leaderboard = get_round_leaderboard(round_obj)
+        return paginate_leaderboard(leaderboard, request, view=self)
 
 
 class LeagueLeaderboardView(APIView):
-    """Get aggregated leaderboard for a paid league"""
+    """Get aggregated leaderboard for a paid league, paginated with limit and offset when received"""
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, league_slug):
         league = get_object_or_404(League, slug=league_slug, state=True)
-        bet_rounds = PaidBetRound.objects.filter(
-            round__league=league,
-            state=True,
-        ).select_related('user', 'round')
-
-        # Aggregate points per user using MatchResult
-        user_stats = {}
-        for bet_round in bet_rounds:
-            user_id = bet_round.user.id
-            if user_id not in user_stats:
-                user_stats[user_id] = {
-                    'username': bet_round.user.username,
-                    'profile_image': bet_round.user.profile_image.url if bet_round.user.profile_image else None,
-                    'points': 0,
-                    'exact_results': 0,
-                    'winner_first': False,
-                    'winner_second': False,
-                    'winner_third': False,
-                }
-
-            points = MatchResult.objects.filter(
-                paid_bet_round=bet_round,
-                state=True
-            ).aggregate(total=Sum('points'))['total'] or 0
-
-            exact_results = MatchResult.objects.filter(
-                paid_bet_round=bet_round,
-                is_exact=True,
-                state=True
-            ).count()
-
-            user_stats[user_id]['points'] += points
-            user_stats[user_id]['exact_results'] += exact_results
-
-        # Convert to list and sort
-        leaderboard = list(user_stats.values())
-        leaderboard.sort(key=lambda x: (-x['points'], -x['exact_results']))
-
-        # Add rank
-        for i, entry in enumerate(leaderboard):
-            entry['rank'] = i+1
-
-        serializer = LeaderboardEntrySerializer(leaderboard, many=True)
-        return Response(serializer.data)
+        leaderboard = get_league_leaderboard(league)
+        return paginate_leaderboard(leaderboard, request, view=self)
 
 
 class RoundPrizePoolView(APIView):
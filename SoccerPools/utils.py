@@ -1,6 +1,7 @@
 import string
 import random
 from decouple import config
+from django.db.models import Q
 from django.utils.text import slugify
 
 def get_settings_env():
@@ -56,4 +57,65 @@ def generate_unique_field_value(model, field_name, value):
         unique_code = ''.join(random.choices(characters, k=unique_code_length))
         unique_value = f"{base_value}-{unique_code}"
 
-    return unique_value
\ No newline at end of file
+    return unique_value
+
+def generate_unique_field_values(model, field_name, values):
+    """
+    Batch version of generate_unique_field_value, for bulk_create.
+
+    Parameters:
+    - model: The Django model to check uniqueness against.
+    - field_name: The field to check for uniqueness.
+    - values: The initial values to be slugified and checked.
+
+    Returns:
+    - A list with a unique field value for every value, in the same order. The existing
+      values are read with a single prefix query and the collisions, also between the
+      received values, are resolved in memory. Values with an empty slug (e.g. only
+      symbols) get a random code, checked with their own query, since an empty prefix
+      would read the whole table.
+    """
+    base_values = [slugify(value) for value in values]
+    prefixes_filter = Q()
+    for base_value in set(base_values):
+        if base_value:
+            prefixes_filter |= Q(**{f'{field_name}__startswith': base_value})
+
+    taken_values = set()
+    if prefixes_filter:
+        taken_values = set(model.objects.filter(prefixes_filter).values_list(field_name, flat=True))
+
+    characters = string.ascii_letters + string.digits
+    unique_code_length = 6
+
+    def random_code():
+        return ''.join(random.choices(characters, k=unique_code_length))
+
+    unique_values = []
+    random_indexes = []
+    for index, base_value in enumerate(base_values):
+        if not base_value:
+            unique_value = random_code()
+            while unique_value in taken_values:
+                unique_value = random_code()
+            random_indexes.append(index)
+        else:
+            unique_value = base_value
+            while unique_value in taken_values:
+                unique_value = f"{base_value}-{random_code()}"
+        taken_values.add(unique_value)
+        unique_values.append(unique_value)
+
+    while random_indexes:
+        clashing_values = set(model.objects.filter(**{
+            f'{field_name}__in': [unique_values[index] for index in random_indexes]
+        }).values_list(field_name, flat=True))
+        random_indexes = [index for index in random_indexes if unique_values[index] in clashing_values]
+        for index in random_indexes:
+            unique_value = random_code()
+            while unique_value in taken_values:
+                unique_value = random_code()
+            taken_values.add(unique_value)
+            unique_values[index] = unique_value
+
+    return unique_values